@@ -1,87 +1,2021 @@
 // analyzer.cpp
+#ifdef _WIN32
+#ifndef NOMINMAX
+#define NOMINMAX
+#endif
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
 #include <pybind11/pybind11.h>
-#include <pybind11/stl.h> // Needed for converting std::map to Python dict
+#include <pybind11/stl.h> // Needed for converting std::vector and std::unordered_map arguments
+#include <pybind11/numpy.h>
 #include <string>
+#include <unordered_map>
+#include <memory>
+#include <fstream>
 #include <sstream>
 #include <vector>
-#include <set>
+#include <deque>
+#include <thread>
+#include <atomic>
+#include <mutex>
+#include <system_error>
 #include <algorithm>
-#include <cctype>
+#include <cstring>
+#include <cstddef>
+#include <cstdint>
+#include <cstdlib>
+#include <cerrno>
+#include <cmath>
+#include <bitset>
+
+#if defined(__x86_64__) || defined(_M_X64)
+#define TEXT_ANALYZER_X86 1
+#include <immintrin.h>
+#ifdef _MSC_VER
+#include <intrin.h>
+#endif
+#else
+#define TEXT_ANALYZER_X86 0
+#endif
+
+// Functions using AVX2 are compiled for it individually and only called
+// after a runtime CPU check, so the module still loads on older CPUs.
+#if defined(__GNUC__) || defined(__clang__)
+#define TARGET_AVX2 __attribute__((target("avx2")))
+#else
+#define TARGET_AVX2
+#endif
 
 namespace py = pybind11;
 
-// A very basic text analysis function
-std::map<std::string, double> analyze_text(const std::string& text) {
-    if (text.empty()) {
-        return {
-            {"word_count", 0},
-            {"sentence_count", 0},
-            {"readability_score", 0},
-            {"sentiment_score", 0.5}
-        };
+namespace {
+
+// Exposed as text_analyzer.__version__. Bump it whenever the metrics for a
+// given text change, so callers that cache results can tell them apart.
+const char* const VERSION = "1.3";
+
+// Set by setup.py for the build variant; see build_info().
+#ifndef TEXT_ANALYZER_BUILD_VARIANT
+#define TEXT_ANALYZER_BUILD_VARIANT "default"
+#endif
+#ifndef TEXT_ANALYZER_BUILD_FLAGS
+#define TEXT_ANALYZER_BUILD_FLAGS ""
+#endif
+
+// Longest word we keep a normalized copy of. Anything longer cannot be in
+// the sentiment lexicon, so we only need to know that it overflowed.
+const std::size_t KEY_MAX = 64;
+
+// Built-in lexicon used until load_lexicon() is called; it holds the same
+// terms as the sentiment_lexicon.tsv file shipped with the app.
+const char* const DEFAULT_POSITIVE_WORDS[] = {"good", "great", "excellent", "amazing", "love", "happy", "success", "beautiful", "perfect"};
+const char* const DEFAULT_NEGATIVE_WORDS[] = {"bad", "terrible", "awful", "hate", "sad", "negative", "failure", "wrong", "problem"};
+
+// Character classes match the "C" locale used by std::stringstream, ::tolower
+// and ::ispunct, so results are identical to the old multi-pass version.
+inline bool is_space(unsigned char c) {
+    return c == ' ' || (c >= '\t' && c <= '\r');
+}
+
+inline bool is_terminator(unsigned char c) {
+    return c == '.' || c == '!' || c == '?';
+}
+
+inline bool is_punct(unsigned char c) {
+    return (c >= 33 && c <= 47) || (c >= 58 && c <= 64) || (c >= 91 && c <= 96) || (c >= 123 && c <= 126);
+}
+
+inline unsigned char to_lower(unsigned char c) {
+    return (c >= 'A' && c <= 'Z') ? static_cast<unsigned char>(c + ('a' - 'A')) : c;
+}
+
+// --- Syllables ---
+// The readability formulas need syllable and letter counts. They are taken
+// from the normalized word the scanner already builds for the lexicon
+// lookup, so they cost a short loop over a word that is still in L1.
+
+inline bool is_vowel(unsigned char c) {
+    return c == 'a' || c == 'e' || c == 'i' || c == 'o' || c == 'u' || c == 'y';
+}
+
+inline bool is_consonant(unsigned char c) {
+    return c >= 'a' && c <= 'z' && !is_vowel(c);
+}
+
+struct WordShape {
+    int syllables;
+    int letters;
+};
+
+// Estimates the syllables of a lowercased, punctuation-free word as its
+// vowel groups (a leading 'y' is a consonant), less a silent final "e" and
+// "-ed"/"-es" endings that don't add one: "made", "jumped" and "makes" have
+// one syllable, "table", "wanted" and "wishes" two. Any word with a letter
+// has at least one. Letters are ASCII letters plus non-ASCII characters,
+// counted once per UTF-8 lead byte.
+WordShape word_shape(const char* key, std::size_t length) {
+    const unsigned char* w = reinterpret_cast<const unsigned char*>(key);
+    int syllables = 0;
+    int letters = 0;
+    bool after_vowel = false;
+    for (std::size_t i = 0; i < length; ++i) {
+        const unsigned char c = w[i];
+        const bool vowel = is_vowel(c) && (c != 'y' || i > 0);
+        if (vowel && !after_vowel) {
+            syllables++;
+        }
+        after_vowel = vowel;
+        if ((c >= 'a' && c <= 'z') || c >= 0xC0) {
+            letters++;
+        }
+    }
+    // Two vowel groups need at least three bytes
+    if (syllables > 1) {
+        const unsigned char last = w[length - 1], before = w[length - 2], third = w[length - 3];
+        const bool consonant_le = before == 'l' && is_consonant(third);
+        if (last == 'e' && is_consonant(before) && !consonant_le) {
+            syllables--;
+        } else if (last == 'd' && before == 'e' && is_consonant(third) && third != 't' && third != 'd') {
+            syllables--;
+        } else if (last == 's' && before == 'e' && is_consonant(third) && std::strchr("sxzcgh", third) == nullptr &&
+                   !(third == 'l' && length >= 4 && is_consonant(w[length - 4]))) {
+            syllables--;
+        }
+    }
+    if (syllables == 0 && letters > 0) {
+        syllables = 1;
+    }
+    return {syllables, letters};
+}
+
+// --- Block classification ---
+// With SIMD available the scanner classifies the input 64 bytes at a time:
+// one bit per byte for whitespace, sentence terminators and punctuation, plus
+// the block lowercased. Word and sentence counts then come from popcounts and
+// words are cut out with bit scans instead of a branch per byte. The byte
+// loop in Scanner::feed_bytes() is the scalar fallback and handles the tail.
+const std::size_t BLOCK_SIZE = 64;
+
+struct BlockClasses {
+    std::uint64_t space;
+    std::uint64_t terminator;
+    std::uint64_t punct;
+    unsigned char lower[BLOCK_SIZE];
+};
+
+typedef void (*ClassifyFn)(const unsigned char* block, BlockClasses& classes);
+
+inline int popcount64(std::uint64_t x) {
+#if defined(__GNUC__) || defined(__clang__)
+    return __builtin_popcountll(x);
+#else
+    return static_cast<int>(std::bitset<64>(x).count());
+#endif
+}
+
+// Index of the lowest set bit; x must not be 0.
+inline int ctz64(std::uint64_t x) {
+#if defined(__GNUC__) || defined(__clang__)
+    return __builtin_ctzll(x);
+#elif defined(_MSC_VER) && defined(_M_X64)
+    unsigned long index;
+    _BitScanForward64(&index, x);
+    return static_cast<int>(index);
+#else
+    int index = 0;
+    while ((x & 1) == 0) {
+        x >>= 1;
+        ++index;
+    }
+    return index;
+#endif
+}
+
+#if TEXT_ANALYZER_X86
+
+// Signed byte compares: bytes >= 0x80 are negative and never fall in the
+// ASCII ranges tested here, just like in the scalar character classes.
+inline __m128i in_range_sse2(__m128i v, char low, char high) {
+    return _mm_and_si128(_mm_cmpgt_epi8(v, _mm_set1_epi8(static_cast<char>(low - 1))),
+                         _mm_cmplt_epi8(v, _mm_set1_epi8(static_cast<char>(high + 1))));
+}
+
+void classify_sse2(const unsigned char* block, BlockClasses& classes) {
+    classes.space = classes.terminator = classes.punct = 0;
+    for (std::size_t i = 0; i < BLOCK_SIZE; i += 16) {
+        __m128i v = _mm_loadu_si128(reinterpret_cast<const __m128i*>(block + i));
+        __m128i space = _mm_or_si128(_mm_cmpeq_epi8(v, _mm_set1_epi8(' ')), in_range_sse2(v, '\t', '\r'));
+        __m128i terminator = _mm_or_si128(_mm_or_si128(_mm_cmpeq_epi8(v, _mm_set1_epi8('.')), _mm_cmpeq_epi8(v, _mm_set1_epi8('!'))),
+                                          _mm_cmpeq_epi8(v, _mm_set1_epi8('?')));
+        __m128i punct = _mm_or_si128(_mm_or_si128(in_range_sse2(v, 33, 47), in_range_sse2(v, 58, 64)),
+                                     _mm_or_si128(in_range_sse2(v, 91, 96), in_range_sse2(v, 123, 126)));
+        __m128i upper = in_range_sse2(v, 'A', 'Z');
+        _mm_storeu_si128(reinterpret_cast<__m128i*>(classes.lower + i), _mm_or_si128(v, _mm_and_si128(upper, _mm_set1_epi8(0x20))));
+        classes.space |= static_cast<std::uint64_t>(static_cast<std::uint16_t>(_mm_movemask_epi8(space))) << i;
+        classes.terminator |= static_cast<std::uint64_t>(static_cast<std::uint16_t>(_mm_movemask_epi8(terminator))) << i;
+        classes.punct |= static_cast<std::uint64_t>(static_cast<std::uint16_t>(_mm_movemask_epi8(punct))) << i;
+    }
+}
+
+TARGET_AVX2 inline __m256i in_range_avx2(__m256i v, char low, char high) {
+    return _mm256_and_si256(_mm256_cmpgt_epi8(v, _mm256_set1_epi8(static_cast<char>(low - 1))),
+                            _mm256_cmpgt_epi8(_mm256_set1_epi8(static_cast<char>(high + 1)), v));
+}
+
+TARGET_AVX2 void classify_avx2(const unsigned char* block, BlockClasses& classes) {
+    classes.space = classes.terminator = classes.punct = 0;
+    for (std::size_t i = 0; i < BLOCK_SIZE; i += 32) {
+        __m256i v = _mm256_loadu_si256(reinterpret_cast<const __m256i*>(block + i));
+        __m256i space = _mm256_or_si256(_mm256_cmpeq_epi8(v, _mm256_set1_epi8(' ')), in_range_avx2(v, '\t', '\r'));
+        __m256i terminator = _mm256_or_si256(_mm256_or_si256(_mm256_cmpeq_epi8(v, _mm256_set1_epi8('.')), _mm256_cmpeq_epi8(v, _mm256_set1_epi8('!'))),
+                                             _mm256_cmpeq_epi8(v, _mm256_set1_epi8('?')));
+        __m256i punct = _mm256_or_si256(_mm256_or_si256(in_range_avx2(v, 33, 47), in_range_avx2(v, 58, 64)),
+                                        _mm256_or_si256(in_range_avx2(v, 91, 96), in_range_avx2(v, 123, 126)));
+        __m256i upper = in_range_avx2(v, 'A', 'Z');
+        _mm256_storeu_si256(reinterpret_cast<__m256i*>(classes.lower + i), _mm256_or_si256(v, _mm256_and_si256(upper, _mm256_set1_epi8(0x20))));
+        classes.space |= static_cast<std::uint64_t>(static_cast<std::uint32_t>(_mm256_movemask_epi8(space))) << i;
+        classes.terminator |= static_cast<std::uint64_t>(static_cast<std::uint32_t>(_mm256_movemask_epi8(terminator))) << i;
+        classes.punct |= static_cast<std::uint64_t>(static_cast<std::uint32_t>(_mm256_movemask_epi8(punct))) << i;
+    }
+}
+
+bool cpu_has_avx2() {
+#if defined(_MSC_VER)
+    int info[4];
+    __cpuid(info, 0);
+    if (info[0] < 7) {
+        return false;
     }
+    __cpuid(info, 1);
+    const bool os_saves_avx = (info[2] & (1 << 27)) != 0 && (info[2] & (1 << 28)) != 0 && (_xgetbv(0) & 6) == 6;
+    if (!os_saves_avx) {
+        return false;
+    }
+    __cpuidex(info, 7, 0);
+    return (info[1] & (1 << 5)) != 0;
+#else
+    return __builtin_cpu_supports("avx2");
+#endif
+}
+
+#endif // TEXT_ANALYZER_X86
+
+// Instruction sets the scanner can use, best last.
+const char* const SIMD_LEVELS[] = {"scalar", "sse2", "avx2"};
 
-    // 1. Word Count
-    std::stringstream ss(text);
-    std::string word;
-    int word_count = 0;
-    while (ss >> word) {
-        word_count++;
+int best_simd_level() {
+#if TEXT_ANALYZER_X86
+    return cpu_has_avx2() ? 2 : 1;
+#else
+    return 0;
+#endif
+}
+
+ClassifyFn classifier_for(int level) {
+#if TEXT_ANALYZER_X86
+    if (level == 2) return classify_avx2;
+    if (level == 1) return classify_sse2;
+#endif
+    return nullptr;
+}
+
+// Selected at import time (see set_simd_level()); scans read it when they
+// start, possibly on worker threads.
+std::atomic<int> active_simd_level(0);
+
+// FNV-1a: short words hash in a handful of multiply-xors.
+inline std::uint64_t hash_word(const char* data, std::size_t size) {
+    std::uint64_t hash = 14695981039346656037ULL;
+    for (std::size_t i = 0; i < size; ++i) {
+        hash = (hash ^ static_cast<unsigned char>(data[i])) * 1099511628211ULL;
+    }
+    return hash;
+}
+
+// Lowercases and strips punctuation the same way the scanner does, so a
+// lexicon term matches the words it was written for.
+std::string normalize_word(const std::string& word) {
+    std::string key;
+    for (unsigned char c : word) {
+        if (!is_punct(c)) {
+            key.push_back(static_cast<char>(to_lower(c)));
+        }
     }
+    return key;
+}
+
+// Sentiment terms and their weights in a flat open-addressing hash table.
+// A lookup costs one hash of the word plus a probe or two, however many
+// terms are loaded. Most words in running text are not terms; a bitmap of
+// term lengths per first letter rejects nearly all of them before hashing.
+class Lexicon {
+public:
+    explicit Lexicon(const std::unordered_map<std::string, double>& terms) {
+        std::size_t capacity = 16;
+        while (capacity < terms.size() * 2) {
+            capacity <<= 1;
+        }
+        slots_.assign(capacity, Slot());
+        mask_ = capacity - 1;
+        std::fill(lengths_by_first_, lengths_by_first_ + 256, 0);
+        for (const auto& term : terms) {
+            const std::string& word = term.first;
+            if (word.empty() || word.size() > KEY_MAX) {
+                continue; // The scanner never produces these keys
+            }
+            std::uint64_t hash = hash_word(word.data(), word.size());
+            std::size_t i = static_cast<std::size_t>(hash) & mask_;
+            while (slots_[i].length != 0) {
+                i = (i + 1) & mask_;
+            }
+            slots_[i].hash = hash;
+            slots_[i].offset = static_cast<std::uint32_t>(words_.size());
+            slots_[i].length = static_cast<std::uint32_t>(word.size());
+            slots_[i].weight = term.second;
+            words_ += word;
+            size_++;
+            lengths_by_first_[static_cast<unsigned char>(word[0])] |= std::uint64_t(1) << (word.size() - 1);
+        }
+    }
+
+    // Returns the weight of a normalized word, or nullptr if it isn't listed.
+    const double* find(const char* key, std::size_t length) const {
+        if (length == 0 || ((lengths_by_first_[static_cast<unsigned char>(key[0])] >> (length - 1)) & 1) == 0) {
+            return nullptr;
+        }
+        const std::uint64_t hash = hash_word(key, length);
+        for (std::size_t i = static_cast<std::size_t>(hash) & mask_; slots_[i].length != 0; i = (i + 1) & mask_) {
+            const Slot& slot = slots_[i];
+            if (slot.hash == hash && slot.length == length && std::memcmp(words_.data() + slot.offset, key, length) == 0) {
+                return &slot.weight;
+            }
+        }
+        return nullptr;
+    }
+
+    std::size_t size() const { return size_; }
+
+private:
+    struct Slot {
+        std::uint64_t hash = 0;
+        std::uint32_t offset = 0;
+        std::uint32_t length = 0; // 0 marks an empty slot
+        double weight = 0;
+    };
+
+    std::vector<Slot> slots_;
+    std::string words_;
+    std::size_t mask_ = 0;
+    std::size_t size_ = 0;
+    std::uint64_t lengths_by_first_[256]; // Bit n - 1 set: some term of length n starts with this byte
+};
 
-    // 2. Sentence Count (simple approach)
-    int sentence_count = 0;
-    for (char c : text) {
-        if (c == '.' || c == '!' || c == '?') {
-            sentence_count++;
+std::shared_ptr<const Lexicon> default_lexicon() {
+    std::unordered_map<std::string, double> terms;
+    for (const char* word : DEFAULT_POSITIVE_WORDS) terms[word] = 1.0;
+    for (const char* word : DEFAULT_NEGATIVE_WORDS) terms[word] = -1.0;
+    return std::make_shared<const Lexicon>(terms);
+}
+
+// Reads "<word> <weight>" lines into terms; later entries override earlier
+// ones. Blank lines and lines starting with '#' are ignored.
+void read_lexicon_file(const std::string& path, std::unordered_map<std::string, double>& terms) {
+    std::ifstream file(path);
+    if (!file) {
+        PyErr_SetFromErrnoWithFilename(PyExc_OSError, path.c_str());
+        throw py::error_already_set();
+    }
+    std::string line;
+    for (int line_no = 1; std::getline(file, line); ++line_no) {
+        std::istringstream fields(line);
+        std::string word, weight, extra;
+        if (!(fields >> word) || word[0] == '#') {
+            continue;
+        }
+        char* end = nullptr;
+        double value = 0;
+        if (fields >> weight) {
+            value = std::strtod(weight.c_str(), &end);
+        }
+        if (end == nullptr || *end != '\0' || (fields >> extra)) {
+            throw py::value_error(path + ":" + std::to_string(line_no) + ": expected '<word> <weight>'");
+        }
+        std::string key = normalize_word(word);
+        if (!key.empty()) {
+            terms[key] = value;
+        }
+    }
+}
+
+// The active lexicon. Only read or replaced with the GIL held; scans take a
+// reference to it first, so a lexicon swapped out mid-scan stays alive.
+std::shared_ptr<const Lexicon> active_lexicon;
+
+// Builds a Lexicon from a word -> weight mapping, normalizing the words the
+// way lexicon files are read.
+std::shared_ptr<Lexicon> make_lexicon(const std::unordered_map<std::string, double>& words) {
+    std::unordered_map<std::string, double> terms;
+    for (const auto& word : words) {
+        std::string key = normalize_word(word.first);
+        if (!key.empty()) {
+            terms[key] = word.second;
+        }
+    }
+    return std::make_shared<Lexicon>(terms);
+}
+
+// The lexicon a call asked for, or the active one if it passed None.
+std::shared_ptr<const Lexicon> lexicon_or_active(const std::shared_ptr<Lexicon>& lexicon) {
+    if (lexicon) {
+        return lexicon;
+    }
+    return active_lexicon;
+}
+
+// Built-in stop words used until load_stop_words() is called; the same list
+// as the stop_words.txt file shipped with the app.
+const char* const DEFAULT_STOP_WORDS[] = {
+    "a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "as", "at",
+    "be", "because", "been", "before", "being", "below", "between", "both", "but", "by", "can", "could",
+    "did", "do", "does", "doing", "down", "during", "each", "few", "for", "from", "further", "had", "has",
+    "have", "having", "he", "her", "here", "hers", "herself", "him", "himself", "his", "how", "i", "if", "in",
+    "into", "is", "it", "its", "itself", "just", "me", "more", "most", "my", "myself", "no", "nor", "not",
+    "now", "of", "off", "on", "once", "only", "or", "other", "our", "ours", "ourselves", "out", "over", "own",
+    "same", "she", "should", "so", "some", "such", "than", "that", "the", "their", "theirs", "them",
+    "themselves", "then", "there", "these", "they", "this", "those", "through", "to", "too", "under", "until",
+    "up", "very", "was", "we", "were", "what", "when", "where", "which", "while", "who", "whom", "why",
+    "will", "with", "would", "you", "your", "yours", "yourself", "yourselves", "im", "ive", "id", "ill",
+    "youre", "youve", "youll", "hes", "shes", "theyre", "theyve", "thats", "theres", "whats", "lets", "dont",
+    "doesnt", "didnt", "isnt", "arent", "wasnt", "werent", "cant", "couldnt", "wont", "wouldnt", "shouldnt",
+    "hasnt", "havent", "hadnt", "also"
+};
+
+// Stop words as a Lexicon: membership is all that matters, the weights are 0.
+std::shared_ptr<const Lexicon> default_stop_words() {
+    std::unordered_map<std::string, double> words;
+    for (const char* word : DEFAULT_STOP_WORDS) words[word] = 0.0;
+    return std::make_shared<const Lexicon>(words);
+}
+
+// Reads one word per line into words. Blank lines and lines starting with
+// '#' are ignored.
+void read_word_list_file(const std::string& path, std::unordered_map<std::string, double>& words) {
+    std::ifstream file(path);
+    if (!file) {
+        PyErr_SetFromErrnoWithFilename(PyExc_OSError, path.c_str());
+        throw py::error_already_set();
+    }
+    std::string line;
+    for (int line_no = 1; std::getline(file, line); ++line_no) {
+        std::istringstream fields(line);
+        std::string word, extra;
+        if (!(fields >> word) || word[0] == '#') {
+            continue;
+        }
+        if (fields >> extra) {
+            throw py::value_error(path + ":" + std::to_string(line_no) + ": expected one word per line");
+        }
+        std::string key = normalize_word(word);
+        if (!key.empty()) {
+            words[key] = 0.0;
         }
     }
-    if (sentence_count == 0 && word_count > 0) {
+}
+
+// Active stop words, under the same rules as active_lexicon.
+std::shared_ptr<const Lexicon> active_stop_words;
+
+// --- Rule-based sentiment ---
+// In "rules" mode sentiment follows the VADER heuristics (Hutto & Gilbert,
+// 2014) instead of summing lexicon weights: a term is scaled by intensifiers
+// and dampeners and flipped by negations among the three words before it,
+// boosted when written in ALL CAPS in a mixed-case sentence, weighted down
+// before and up after "but", and each sentence's score is pushed further
+// from neutral by '!' and '?'. The constants are VADER's.
+const double BOOSTER_INCREMENT = 0.293;
+const double CAPS_INCREMENT = 0.733;
+const double NEGATION_SCALAR = -0.74;
+const double WINDOW_DECAY[] = {1.0, 0.95, 0.9}; // Modifier one, two and three words back
+const double BEFORE_BUT_SCALAR = 0.5;
+const double AFTER_BUT_SCALAR = 1.5;
+const double EXCLAMATION_INCREMENT = 0.292;
+const int MAX_EXCLAMATIONS = 4;
+const double QUESTION_INCREMENT = 0.18;
+const double MAX_QUESTION_EMPHASIS = 0.96;
+// Sentiment terms held per sentence; a longer "sentence" is scored in parts
+// so memory stays bounded on text without terminators.
+const std::size_t MAX_SENTENCE_HITS = 4096;
+
+const char* const NEGATION_WORDS[] = {
+    "aint", "arent", "cannot", "cant", "couldnt", "darent", "didnt", "doesnt", "dont", "hadnt", "hasnt",
+    "havent", "isnt", "mightnt", "mustnt", "neither", "never", "none", "nope", "nor", "not", "nothing",
+    "nowhere", "oughtnt", "shant", "shouldnt", "wasnt", "werent", "without", "wont", "wouldnt", "rarely",
+    "seldom", "despite"
+};
+const char* const INTENSIFIER_WORDS[] = {
+    "absolutely", "amazingly", "awfully", "completely", "considerably", "decidedly", "deeply", "enormously",
+    "entirely", "especially", "exceptionally", "extremely", "fabulously", "fully", "greatly", "highly",
+    "hugely", "incredibly", "intensely", "majorly", "more", "most", "particularly", "purely", "quite",
+    "really", "remarkably", "so", "substantially", "thoroughly", "totally", "tremendously", "uber",
+    "unbelievably", "unusually", "utterly", "very"
+};
+const char* const DAMPENER_WORDS[] = {
+    "almost", "barely", "hardly", "less", "little", "marginally", "occasionally", "partly", "scarcely",
+    "slightly", "somewhat"
+};
+
+// Modifier words as a Lexicon: negations map to NEGATION_SCALAR, the others
+// to the increment they add to the next terms.
+std::shared_ptr<const Lexicon> sentiment_modifiers() {
+    std::unordered_map<std::string, double> words;
+    for (const char* word : INTENSIFIER_WORDS) words[word] = BOOSTER_INCREMENT;
+    for (const char* word : DAMPENER_WORDS) words[word] = -BOOSTER_INCREMENT;
+    for (const char* word : NEGATION_WORDS) words[word] = NEGATION_SCALAR;
+    return std::make_shared<const Lexicon>(words);
+}
+
+// Built at import time and never replaced.
+std::shared_ptr<const Lexicon> active_modifiers;
+
+// Sentiment scoring modes, see set_sentiment_mode().
+const char* const SENTIMENT_MODES[] = {"lexicon", "rules"};
+const int RULES_MODE = 1;
+std::atomic<int> active_sentiment_mode(0);
+
+// Scores one sentence at a time under the rules above. The Scanner hands it
+// every word; a sentence's terms can only be resolved at its end, once it is
+// known whether it holds "but", mixed case, '!' or '?'.
+class SentimentRules {
+public:
+    explicit SentimentRules(const Lexicon* modifiers) : modifiers_(modifiers) {}
+
+    // key is the normalized word, or null if it is too long to be a term;
+    // weight its lexicon weight, or null if it is not a term.
+    void add_word(const char* key, std::size_t length, const double* weight, bool all_caps,
+                  int exclamations, int questions) {
+        exclamations_ += exclamations;
+        questions_ += questions;
+        if (!all_caps) {
+            mixed_case_ = true;
+        }
+        const double* modifier = key != nullptr ? modifiers_->find(key, length) : nullptr;
+        // Intensifiers and dampeners only modify other terms
+        const bool booster = modifier != nullptr && *modifier != NEGATION_SCALAR;
+        if (weight != nullptr && *weight != 0 && !booster) {
+            double valence = *weight;
+            double caps = all_caps ? (*weight > 0 ? CAPS_INCREMENT : -CAPS_INCREMENT) : 0.0;
+            for (int i = 0; i < 3; ++i) {
+                if (window_[i] == NEGATION_SCALAR) {
+                    valence *= NEGATION_SCALAR;
+                    caps *= NEGATION_SCALAR;
+                } else if (window_[i] != 0) {
+                    valence += (valence < 0 ? -window_[i] : window_[i]) * WINDOW_DECAY[i];
+                }
+            }
+            hits_.push_back(Hit{valence, caps, but_seen_});
+        }
+        window_[2] = window_[1];
+        window_[1] = window_[0];
+        window_[0] = modifier != nullptr ? *modifier : 0.0;
+        if (length == 3 && key != nullptr && std::memcmp(key, "but", 3) == 0) {
+            but_seen_ = true;
+        }
+    }
+
+    bool full() const { return hits_.size() >= MAX_SENTENCE_HITS; }
+
+    // Forgets the current sentence; the hit buffer keeps its capacity.
+    void reset() {
+        hits_.clear();
+        window_[0] = window_[1] = window_[2] = 0.0;
+        but_seen_ = mixed_case_ = false;
+        exclamations_ = questions_ = 0;
+    }
+
+    // Resolves the sentence so far into positive and negative scores (both
+    // >= 0) and starts a new one.
+    void end_sentence(double& positive, double& negative) {
+        double sum = 0;
+        for (const Hit& hit : hits_) {
+            double value = hit.valence + (mixed_case_ ? hit.caps : 0.0);
+            if (but_seen_) {
+                value *= hit.after_but ? AFTER_BUT_SCALAR : BEFORE_BUT_SCALAR;
+            }
+            if (value > 0) positive += value;
+            if (value < 0) negative -= value;
+            sum += value;
+        }
+        double emphasis = std::min(exclamations_, MAX_EXCLAMATIONS) * EXCLAMATION_INCREMENT;
+        if (questions_ > 1) {
+            emphasis += questions_ <= 3 ? questions_ * QUESTION_INCREMENT : MAX_QUESTION_EMPHASIS;
+        }
+        if (sum > 0) positive += emphasis;
+        if (sum < 0) negative += emphasis;
+        hits_.clear();
+        window_[0] = window_[1] = window_[2] = 0.0;
+        but_seen_ = mixed_case_ = false;
+        exclamations_ = questions_ = 0;
+    }
+
+private:
+    struct Hit {
+        double valence;
+        double caps;    // Added if the sentence is not all caps
+        bool after_but;
+    };
+
+    const Lexicon* modifiers_;
+    std::vector<Hit> hits_;
+    double window_[3] = {0.0, 0.0, 0.0}; // Modifier weight of the previous three words, 0 if none
+    bool but_seen_ = false;
+    bool mixed_case_ = false;
+    int exclamations_ = 0;
+    int questions_ = 0;
+};
+
+// Counters kept per n-gram size. Texts with fewer distinct n-grams than this
+// are counted exactly.
+const std::size_t TERM_COUNTERS = 8192;
+
+// Most frequent strings of a stream, found with the Space-Saving algorithm:
+// a fixed number of counters. Until they are all in use counting is exact and
+// a hash lookup per string. After that the counters are kept in a min-heap
+// and an unseen string takes over the smallest one, so memory stays bounded
+// however large the text. Frequent strings are always kept; their counts may
+// be overestimated by at most (strings seen / counters).
+class TopCounter {
+public:
+    explicit TopCounter(std::size_t capacity) : capacity_(capacity) {}
+
+    void add(const std::string& term) {
+        auto found = counts_.find(term);
+        if (found != counts_.end()) {
+            found->second.count++;
+            if (!heap_.empty()) {
+                sift_down(found->second.heap_pos);
+            }
+            return;
+        }
+        if (counts_.size() < capacity_) {
+            counts_.emplace(term, Counter{1, 0});
+            return;
+        }
+        if (heap_.empty()) {
+            build_heap();
+        }
+        // Replace the least frequent term; the newcomer inherits its count
+        const std::int64_t count = heap_[0]->second.count + 1;
+        counts_.erase(heap_[0]->first);
+        heap_[0] = &*counts_.emplace(term, Counter{count, 0}).first;
+        sift_down(0);
+    }
+
+    // The k most frequent terms, most frequent first; ties in alphabetical order.
+    std::vector<std::pair<std::string, std::int64_t>> top(std::size_t k) const {
+        std::vector<std::pair<std::string, std::int64_t>> terms;
+        terms.reserve(counts_.size());
+        for (const Node& node : counts_) {
+            terms.emplace_back(node.first, node.second.count);
+        }
+        k = std::min(k, terms.size());
+        std::partial_sort(terms.begin(), terms.begin() + k, terms.end(),
+                          [](const std::pair<std::string, std::int64_t>& a, const std::pair<std::string, std::int64_t>& b) {
+                              return a.second != b.second ? a.second > b.second : a.first < b.first;
+                          });
+        terms.resize(k);
+        return terms;
+    }
+
+private:
+    struct Counter {
+        std::int64_t count;
+        std::size_t heap_pos;
+    };
+    typedef std::pair<const std::string, Counter> Node;
+
+    void build_heap() {
+        heap_.reserve(counts_.size());
+        for (Node& node : counts_) {
+            node.second.heap_pos = heap_.size();
+            heap_.push_back(&node);
+        }
+        for (std::size_t i = heap_.size() / 2; i-- > 0;) {
+            sift_down(i);
+        }
+    }
+
+    void sift_down(std::size_t i) {
+        for (;;) {
+            std::size_t smallest = i;
+            std::size_t left = 2 * i + 1, right = left + 1;
+            if (left < heap_.size() && heap_[left]->second.count < heap_[smallest]->second.count) smallest = left;
+            if (right < heap_.size() && heap_[right]->second.count < heap_[smallest]->second.count) smallest = right;
+            if (smallest == i) {
+                return;
+            }
+            swap_nodes(i, smallest);
+            i = smallest;
+        }
+    }
+
+    void swap_nodes(std::size_t a, std::size_t b) {
+        std::swap(heap_[a], heap_[b]);
+        heap_[a]->second.heap_pos = a;
+        heap_[b]->second.heap_pos = b;
+    }
+
+    std::size_t capacity_;
+    // Element pointers stay valid across rehashing, unlike iterators
+    std::unordered_map<std::string, Counter> counts_;
+    std::vector<Node*> heap_; // Empty until all counters are in use
+};
+
+// Top words, bigrams and trigrams of a text, fed by the Scanner with each
+// normalized word. Stop words, punctuation-only and over-long words are not
+// counted and break n-grams, as does the end of a sentence.
+class TermCollector {
+public:
+    explicit TermCollector(const Lexicon* stop_words)
+        : stop_words_(stop_words), words_(TERM_COUNTERS), bigrams_(TERM_COUNTERS), trigrams_(TERM_COUNTERS) {}
+
+    void add_word(const char* key, std::size_t length, bool ends_sentence) {
+        if (length == 0 || length > KEY_MAX || (stop_words_ != nullptr && stop_words_->find(key, length) != nullptr)) {
+            history_ = 0;
+            return;
+        }
+        previous_[1].swap(previous_[0]);
+        previous_[0].assign(key, length);
+        words_.add(previous_[0]);
+        if (history_ >= 1) {
+            // N-grams are built in a reused buffer to avoid an allocation per word
+            gram_.assign(previous_[1]).append(1, ' ').append(previous_[0]);
+            bigrams_.add(gram_);
+        }
+        if (history_ >= 2) {
+            gram_.assign(older_).append(1, ' ').append(previous_[1]).append(1, ' ').append(previous_[0]);
+            trigrams_.add(gram_);
+        }
+        older_.assign(previous_[1]);
+        history_ = ends_sentence ? 0 : std::min(history_ + 1, 2);
+    }
+
+    const TopCounter& words() const { return words_; }
+    const TopCounter& bigrams() const { return bigrams_; }
+    const TopCounter& trigrams() const { return trigrams_; }
+
+private:
+    const Lexicon* stop_words_;
+    TopCounter words_, bigrams_, trigrams_;
+    std::string previous_[2]; // Current word, then the one before it
+    std::string older_;       // The word before previous_[1]
+    std::string gram_;
+    int history_ = 0;         // Consecutive counted words, up to 2
+};
+
+struct TextStats {
+    long long bytes = 0;
+    long long word_count = 0;
+    long long sentence_count = 0;
+    long long syllable_count = 0;
+    long long complex_word_count = 0; // Words of three or more syllables
+    long long letter_count = 0;
+    double positive_score = 0;
+    double negative_score = 0;
+
+    // Adds a word's syllables and letters, and its weight if it is a
+    // sentiment term (weight is null otherwise).
+    void add_word(const WordShape& shape, const double* weight) {
+        syllable_count += shape.syllables;
+        letter_count += shape.letters;
+        if (shape.syllables >= 3) {
+            complex_word_count++;
+        }
+        if (weight != nullptr) {
+            if (*weight > 0) positive_score += *weight;
+            if (*weight < 0) negative_score -= *weight;
+        }
+    }
+};
+
+// One sentence: its first and past-the-end byte offsets and its counters.
+struct SentenceRow {
+    long long start;
+    long long end;
+    TextStats stats;
+};
+
+// Splits the words the scanner sees into sentences for per-sentence
+// metrics. A sentence ends after each word containing '.', '!' or '?'
+// ("e.g." included); words after the last one form a final sentence.
+class SentenceCollector {
+public:
+    void add_word(long long start, long long end, const WordShape& shape, const double* weight, bool ends_sentence) {
+        if (!open_) {
+            rows_.push_back(SentenceRow{start, start, TextStats()});
+            open_ = true;
+        }
+        SentenceRow& row = rows_.back();
+        row.end = end;
+        row.stats.bytes = end - row.start;
+        row.stats.word_count++;
+        row.stats.add_word(shape, weight);
+        if (ends_sentence) {
+            row.stats.sentence_count = 1;
+            open_ = false;
+        }
+    }
+
+    // Adds rule-based sentiment to the sentence of the last word.
+    void add_sentiment(double positive, double negative) {
+        if (!rows_.empty()) {
+            rows_.back().stats.positive_score += positive;
+            rows_.back().stats.negative_score += negative;
+        }
+    }
+
+    // Appends the rows of a collector that scanned the text starting at
+    // byte offset.
+    void append(const SentenceCollector& other, long long offset) {
+        for (SentenceRow row : other.rows_) {
+            row.start += offset;
+            row.end += offset;
+            rows_.push_back(row);
+        }
+    }
+
+    const std::vector<SentenceRow>& rows() const { return rows_; }
+
+private:
+    std::vector<SentenceRow> rows_;
+    bool open_ = false;
+};
+
+// The values a scan added to its positive and negative scores, in order.
+// Floating-point sums depend on the order of the additions, so the scans of
+// a split document replay these onto the totals of the pieces before them
+// to get exactly the serial result (see scan_parallel()).
+class ScoreLog {
+public:
+    void add(double positive, double negative) {
+        if (positive != 0) positive_.push_back(positive);
+        if (negative != 0) negative_.push_back(negative);
+    }
+
+    void replay(TextStats& stats) const {
+        for (double value : positive_) stats.positive_score += value;
+        for (double value : negative_) stats.negative_score += value;
+    }
+
+private:
+    std::vector<double> positive_;
+    std::vector<double> negative_;
+};
+
+// Streaming scanner: every byte is visited exactly once. Words are
+// whitespace-delimited; the lowercased, punctuation-free form of the current
+// word is built in a fixed buffer instead of a heap-allocated std::string,
+// then looked up in the lexicon.
+class Scanner {
+public:
+    // terms, if given, receives every word for top-term extraction,
+    // sentences every word with its offsets for per-sentence metrics, and
+    // scores every addition to the sentiment scores.
+    explicit Scanner(const Lexicon& lexicon, TermCollector* terms = nullptr, SentenceCollector* sentences = nullptr,
+                     ScoreLog* scores = nullptr)
+        : lexicon_(&lexicon), terms_(terms), sentences_(sentences), scores_(scores),
+          use_rules_(active_sentiment_mode.load(std::memory_order_relaxed) == RULES_MODE),
+          track_sentence_ends_(terms != nullptr || sentences != nullptr || use_rules_),
+          classify_(classifier_for(active_simd_level.load(std::memory_order_relaxed))),
+          rules_(active_modifiers.get()) {}
+
+    // Starts a new document as if newly constructed, but keeps the buffers
+    // grown for earlier ones, so a reused scanner stops allocating.
+    void reset(const Lexicon& lexicon, TermCollector* terms = nullptr, SentenceCollector* sentences = nullptr,
+               ScoreLog* scores = nullptr) {
+        SentimentRules rules = std::move(rules_);
+        rules.reset();
+        *this = Scanner(lexicon, terms, sentences, scores);
+        rules_ = std::move(rules);
+    }
+
+    void feed(const char* data, std::size_t size) {
+        const unsigned char* p = reinterpret_cast<const unsigned char*>(data);
+        const unsigned char* end = p + size;
+        chunk_ = p;
+        chunk_offset_ = stats_.bytes;
+        stats_.bytes += static_cast<long long>(size);
+        if (classify_ != nullptr) {
+            BlockClasses block;
+            for (; static_cast<std::size_t>(end - p) >= BLOCK_SIZE; p += BLOCK_SIZE) {
+                classify_(p, block);
+                scan_block(block, p);
+            }
+        }
+        feed_bytes(p, end);
+    }
+
+    const TextStats& finish() {
+        if (in_word_) {
+            end_word(stats_.bytes);
+        }
+        if (use_rules_) {
+            end_rules_sentence();
+        }
+        return stats_;
+    }
+
+private:
+    // Offset of p, a pointer into the chunk being fed, in the whole document.
+    long long offset_of(const unsigned char* p) const {
+        return chunk_offset_ + (p - chunk_);
+    }
+
+    void feed_bytes(const unsigned char* p, const unsigned char* end) {
+        for (; p != end; ++p) {
+            unsigned char c = *p;
+            if (is_space(c)) {
+                if (in_word_) {
+                    end_word(offset_of(p));
+                }
+                continue;
+            }
+            if (!in_word_) {
+                in_word_ = true;
+                word_start_ = offset_of(p);
+                stats_.word_count++;
+            }
+            if (is_terminator(c)) {
+                stats_.sentence_count++;
+                word_ends_sentence_ = true;
+            }
+            if (use_rules_) {
+                note_raw(p, 1, true);
+            }
+            if (is_punct(c)) {
+                continue;
+            }
+            if (key_len_ < KEY_MAX) {
+                key_[key_len_] = static_cast<char>(to_lower(c));
+            }
+            key_len_++;
+        }
+    }
+
+    void scan_block(const BlockClasses& block, const unsigned char* data) {
+        const std::uint64_t word = ~block.space;
+        stats_.sentence_count += popcount64(block.terminator);
+        // A word starts at each non-space byte that follows a space; the
+        // first byte continues a word left open by the previous block.
+        stats_.word_count += popcount64(word & ~((word << 1) | (in_word_ ? 1 : 0)));
+
+        std::size_t pos = 0;
+        while (pos < BLOCK_SIZE) {
+            if (!in_word_) {
+                const std::uint64_t rest = word >> pos;
+                if (rest == 0) {
+                    return;
+                }
+                pos += ctz64(rest);
+                in_word_ = true;
+                word_start_ = offset_of(data + pos);
+            }
+            const std::uint64_t rest = block.space >> pos;
+            const std::size_t stop = rest == 0 ? BLOCK_SIZE : pos + ctz64(rest);
+            append_key(block.lower + pos, block.punct >> pos, stop - pos);
+            const bool has_terminator = (block.terminator >> pos) != 0 &&
+                (stop == BLOCK_SIZE || ((block.terminator >> pos) & ((std::uint64_t(1) << (stop - pos)) - 1)) != 0);
+            if (use_rules_) {
+                note_raw(data + pos, stop - pos, has_terminator);
+            }
+            if (track_sentence_ends_ && has_terminator) {
+                word_ends_sentence_ = true;
+            }
+            if (stop == BLOCK_SIZE) {
+                return; // The word continues in the next block
+            }
+            end_word(offset_of(data + stop));
+            pos = stop;
+        }
+    }
+
+    // Adds length lowercased bytes to the current word, skipping those whose
+    // bit is set in punct.
+    void append_key(const unsigned char* chars, std::uint64_t punct, std::size_t length) {
+        if (length < BLOCK_SIZE) {
+            punct &= (std::uint64_t(1) << length) - 1;
+        }
+        const std::size_t kept = length - static_cast<std::size_t>(popcount64(punct));
+        if (key_len_ + kept <= KEY_MAX) {
+            if (punct == 0) {
+                std::memcpy(key_ + key_len_, chars, length);
+            } else {
+                char* out = key_ + key_len_;
+                for (std::size_t i = 0; i < length; ++i) {
+                    if (((punct >> i) & 1) == 0) {
+                        *out++ = static_cast<char>(chars[i]);
+                    }
+                }
+            }
+        }
+        key_len_ += kept;
+    }
+
+    // Rules mode: records the case of length raw bytes of the current word,
+    // and their '!' and '?' if they may hold terminators.
+    void note_raw(const unsigned char* p, std::size_t length, bool terminators) {
+        bool upper = false, lower = false;
+        for (std::size_t i = 0; i < length; ++i) {
+            upper |= static_cast<unsigned char>(p[i] - 'A') < 26;
+            lower |= static_cast<unsigned char>(p[i] - 'a') < 26;
+        }
+        word_has_upper_ |= upper;
+        word_has_lower_ |= lower;
+        if (terminators) {
+            for (std::size_t i = 0; i < length; ++i) {
+                word_exclamations_ += p[i] == '!';
+                word_questions_ += p[i] == '?';
+            }
+        }
+    }
+
+    void end_rules_sentence() {
+        double positive = 0, negative = 0;
+        rules_.end_sentence(positive, negative);
+        stats_.positive_score += positive;
+        stats_.negative_score += negative;
+        if (sentences_ != nullptr) {
+            sentences_->add_sentiment(positive, negative);
+        }
+        if (scores_ != nullptr) {
+            scores_->add(positive, negative);
+        }
+    }
+
+    // end is the offset just past the word.
+    void end_word(long long end) {
+        in_word_ = false;
+        if (terms_ != nullptr) {
+            terms_->add_word(key_, key_len_, word_ends_sentence_);
+        }
+        WordShape shape = {0, 0};
+        const double* weight = nullptr;
+        // Longer "words" (URLs, hashes, ...) add no syllables or letters
+        if (key_len_ <= KEY_MAX) {
+            shape = word_shape(key_, key_len_);
+            weight = lexicon_->find(key_, key_len_);
+            stats_.add_word(shape, use_rules_ ? nullptr : weight);
+            if (scores_ != nullptr && !use_rules_ && weight != nullptr) {
+                // TextStats::add_word() subtracts negative weights
+                scores_->add(*weight > 0 ? *weight : 0.0, *weight < 0 ? -*weight : 0.0);
+            }
+        }
+        if (sentences_ != nullptr) {
+            sentences_->add_word(word_start_, end, shape, use_rules_ ? nullptr : weight, word_ends_sentence_);
+        }
+        if (use_rules_) {
+            rules_.add_word(key_len_ <= KEY_MAX ? key_ : nullptr, key_len_, weight, word_has_upper_ && !word_has_lower_,
+                            word_exclamations_, word_questions_);
+            if (word_ends_sentence_ || rules_.full()) {
+                end_rules_sentence();
+            }
+            word_has_upper_ = word_has_lower_ = false;
+            word_exclamations_ = word_questions_ = 0;
+        }
+        word_ends_sentence_ = false;
+        key_len_ = 0;
+    }
+
+    const Lexicon* lexicon_;
+    TermCollector* terms_;
+    SentenceCollector* sentences_;
+    ScoreLog* scores_;
+    bool use_rules_;
+    bool track_sentence_ends_;
+    ClassifyFn classify_;
+    SentimentRules rules_;
+    const unsigned char* chunk_ = nullptr;
+    long long chunk_offset_ = 0;
+    long long word_start_ = 0;
+    bool in_word_ = false;
+    bool word_ends_sentence_ = false;
+    char key_[KEY_MAX] = {};
+    std::size_t key_len_ = 0;
+    bool word_has_upper_ = false;
+    bool word_has_lower_ = false;
+    int word_exclamations_ = 0;
+    int word_questions_ = 0;
+    TextStats stats_;
+};
+
+// Document-level metrics derived from the scan counters. Also the row type
+// of the "structured" batch output; see metrics_dtype().
+struct Metrics {
+    std::int64_t word_count;
+    std::int64_t sentence_count;
+    std::int64_t syllable_count;
+    double readability_score;
+    double sentiment_score;
+    double flesch_reading_ease;
+    double flesch_kincaid_grade;
+    double gunning_fog;
+    double smog_index;
+    double coleman_liau_index;
+};
+
+// Metric names and where each is stored, in output order.
+struct CountField {
+    const char* name;
+    std::int64_t Metrics::*member;
+    std::size_t offset;
+};
+
+struct ScoreField {
+    const char* name;
+    double Metrics::*member;
+    std::size_t offset;
+};
+
+const CountField COUNT_FIELDS[] = {
+    {"word_count", &Metrics::word_count, offsetof(Metrics, word_count)},
+    {"sentence_count", &Metrics::sentence_count, offsetof(Metrics, sentence_count)},
+    {"syllable_count", &Metrics::syllable_count, offsetof(Metrics, syllable_count)},
+};
+
+const ScoreField SCORE_FIELDS[] = {
+    {"readability_score", &Metrics::readability_score, offsetof(Metrics, readability_score)},
+    {"sentiment_score", &Metrics::sentiment_score, offsetof(Metrics, sentiment_score)},
+    {"flesch_reading_ease", &Metrics::flesch_reading_ease, offsetof(Metrics, flesch_reading_ease)},
+    {"flesch_kincaid_grade", &Metrics::flesch_kincaid_grade, offsetof(Metrics, flesch_kincaid_grade)},
+    {"gunning_fog", &Metrics::gunning_fog, offsetof(Metrics, gunning_fog)},
+    {"smog_index", &Metrics::smog_index, offsetof(Metrics, smog_index)},
+    {"coleman_liau_index", &Metrics::coleman_liau_index, offsetof(Metrics, coleman_liau_index)},
+};
+
+Metrics compute_metrics(const TextStats& stats) {
+    if (stats.bytes == 0) {
+        return {0, 0, 0, 0.0, 0.5, 0.0, 0.0, 0.0, 0.0, 0.0};
+    }
+
+    std::int64_t sentence_count = stats.sentence_count;
+    if (sentence_count == 0 && stats.word_count > 0) {
         sentence_count = 1; // Assume at least one sentence if there's text
     }
 
-    // 3. Simple Readability Score (based on average words per sentence)
-    double readability_score = 0.5;
-    if (sentence_count > 0) {
-        double avg_words_per_sentence = static_cast<double>(word_count) / sentence_count;
-        // Score is 1.0 for short sentences (<=5 words), 0.0 for long ones (>=25 words)
-        readability_score = std::max(0.0, std::min(1.0, (25.0 - avg_words_per_sentence) / 20.0));
+    Metrics metrics = {stats.word_count, sentence_count, stats.syllable_count, 0.5, 0.5, 0.0, 0.0, 0.0, 0.0, 0.0};
+
+    // Standard readability formulas. The Python fallback evaluates the same
+    // expressions in the same order, so results match to the last bit.
+    if (stats.word_count > 0) {
+        const double words = static_cast<double>(stats.word_count);
+        const double sentences = static_cast<double>(sentence_count);
+        const double words_per_sentence = words / sentences;
+        const double syllables_per_word = stats.syllable_count / words;
+        metrics.flesch_reading_ease = 206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word;
+        metrics.flesch_kincaid_grade = 0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59;
+        metrics.gunning_fog = 0.4 * (words_per_sentence + 100.0 * stats.complex_word_count / words);
+        metrics.smog_index = 1.0430 * std::sqrt(stats.complex_word_count * 30.0 / sentences) + 3.1291;
+        metrics.coleman_liau_index = 0.0588 * (100.0 * stats.letter_count / words) - 0.296 * (100.0 * sentences / words) - 15.8;
+        // Flesch Reading Ease on a 0-1 scale: 1.0 is very easy (100+), 0.0 very hard (0 or below)
+        metrics.readability_score = std::max(0.0, std::min(1.0, metrics.flesch_reading_ease / 100.0));
+    }
+
+    if (stats.positive_score + stats.negative_score > 0) {
+        metrics.sentiment_score = stats.positive_score / (stats.positive_score + stats.negative_score);
+    }
+    return metrics;
+}
+
+// The metrics of a result dictionary in key order, with their names as
+// Python strings created once at import; a result then only allocates the
+// dictionary and its values.
+struct ResultField {
+    const char* name;
+    const std::int64_t Metrics::*count; // Set for count metrics
+    const double Metrics::*score;       // Set for the others
+    PyObject* key;
+};
+
+std::vector<ResultField> result_fields;
+
+void init_result_fields() {
+    for (const CountField& field : COUNT_FIELDS) {
+        result_fields.push_back(ResultField{field.name, field.member, nullptr, nullptr});
+    }
+    for (const ScoreField& field : SCORE_FIELDS) {
+        result_fields.push_back(ResultField{field.name, nullptr, field.member, nullptr});
+    }
+    std::sort(result_fields.begin(), result_fields.end(), [](const ResultField& a, const ResultField& b) {
+        return std::strcmp(a.name, b.name) < 0;
+    });
+    for (ResultField& field : result_fields) {
+        field.key = PyUnicode_InternFromString(field.name); // Kept for the life of the process
+        if (field.key == nullptr) {
+            throw py::error_already_set();
+        }
+    }
+}
+
+// Builds the result dictionary for a scan; needs the GIL.
+py::dict make_result(const TextStats& stats) {
+    const Metrics metrics = compute_metrics(stats);
+    py::dict result;
+    for (const ResultField& field : result_fields) {
+        py::float_ value(field.count != nullptr ? static_cast<double>(metrics.*field.count) : metrics.*field.score);
+        if (PyDict_SetItem(result.ptr(), field.key, value.ptr()) != 0) {
+            throw py::error_already_set();
+        }
+    }
+    return result;
+}
+
+// UTF-8 text borrowed from a Python object without copying it: the cached
+// UTF-8 form of a str, or the memory of any contiguous buffer (bytes,
+// bytearray, memoryview, mmap, ...). Keeps the source alive and its buffer
+// exported until destroyed, which must happen with the GIL held.
+class TextSource {
+public:
+    explicit TextSource(py::handle obj) : owner_(py::reinterpret_borrow<py::object>(obj)) {
+        if (PyUnicode_Check(obj.ptr())) {
+            Py_ssize_t size = 0;
+            data_ = PyUnicode_AsUTF8AndSize(obj.ptr(), &size);
+            if (data_ == nullptr) {
+                throw py::error_already_set();
+            }
+            size_ = static_cast<std::size_t>(size);
+            return;
+        }
+        if (!PyObject_CheckBuffer(obj.ptr())) {
+            throw py::type_error("expected str or a bytes-like object, got " + std::string(Py_TYPE(obj.ptr())->tp_name));
+        }
+        if (PyObject_GetBuffer(obj.ptr(), &buffer_, PyBUF_SIMPLE) != 0) {
+            throw py::error_already_set();
+        }
+        has_buffer_ = true;
+        data_ = static_cast<const char*>(buffer_.buf);
+        size_ = static_cast<std::size_t>(buffer_.len);
+    }
+
+    ~TextSource() {
+        if (has_buffer_) {
+            PyBuffer_Release(&buffer_);
+        }
+    }
+
+    TextSource(const TextSource&) = delete;
+    TextSource& operator=(const TextSource&) = delete;
+
+    const char* data() const { return data_; }
+    std::size_t size() const { return size_; }
+
+private:
+    py::object owner_;
+    const char* data_ = nullptr;
+    std::size_t size_ = 0;
+    Py_buffer buffer_;
+    bool has_buffer_ = false;
+};
+
+// Below this size scanning takes a few microseconds, less than the cost of
+// handing the GIL over to another thread and waiting to get it back.
+const std::size_t GIL_RELEASE_MIN_BYTES = 16 * 1024;
+
+// Each thread scans whole texts with one scanner, reset between texts, so
+// steady-state analysis of small texts makes no heap allocations.
+Scanner& thread_scanner(const Lexicon& lexicon, TermCollector* terms, SentenceCollector* sentences) {
+    thread_local Scanner scanner(lexicon);
+    scanner.reset(lexicon, terms, sentences);
+    return scanner;
+}
+
+TextStats scan(const TextSource& source, const Lexicon& lexicon, TermCollector* terms = nullptr,
+               SentenceCollector* sentences = nullptr) {
+    Scanner& scanner = thread_scanner(lexicon, terms, sentences);
+    scanner.feed(source.data(), source.size());
+    return scanner.finish();
+}
+
+unsigned resolve_threads(int threads, std::size_t jobs) {
+    unsigned count = threads > 0 ? static_cast<unsigned>(threads) : std::thread::hardware_concurrency();
+    if (count == 0) {
+        count = 1;
+    }
+    return static_cast<unsigned>(std::min<std::size_t>(count, std::max<std::size_t>(jobs, 1)));
+}
+
+// Runs fn(i) for every i in [0, jobs) on up to `threads` native threads.
+// Work is handed out one index at a time so a few huge documents don't
+// leave the other workers idle. Must be called without the GIL.
+template <typename Fn>
+void parallel_for(std::size_t jobs, unsigned threads, Fn fn) {
+    if (threads <= 1 || jobs <= 1) {
+        for (std::size_t i = 0; i < jobs; ++i) {
+            fn(i);
+        }
+        return;
+    }
+    std::atomic<std::size_t> next(0);
+    auto worker = [&]() {
+        for (std::size_t i = next++; i < jobs; i = next++) {
+            fn(i);
+        }
+    };
+    std::vector<std::thread> pool;
+    pool.reserve(threads - 1);
+    try {
+        for (unsigned t = 1; t < threads; ++t) {
+            pool.emplace_back(worker);
+        }
+    } catch (const std::system_error&) {
+        // Out of threads: the workers we did get still drain the queue.
+    }
+    worker();
+    for (std::thread& thread : pool) {
+        thread.join();
+    }
+}
+
+// A document is only split into pieces of at least this size; smaller
+// pieces would cost more in thread start-up than they save.
+const std::size_t PARALLEL_MIN_PIECE_BYTES = std::size_t(1) << 20;
+
+// Ends of up to `pieces` roughly equal pieces of data, the last being size.
+// Each piece ends at whitespace, so no word spans two pieces; with
+// whole_sentences also after a word holding '.', '!' or '?', so neither does
+// a sentence. Text without such a point near a target is not split there.
+std::vector<std::size_t> split_points(const char* data, std::size_t size, std::size_t pieces, bool whole_sentences) {
+    const unsigned char* bytes = reinterpret_cast<const unsigned char*>(data);
+    std::vector<std::size_t> ends;
+    std::size_t previous = 0;
+    for (std::size_t i = 1; i < pieces; ++i) {
+        std::size_t pos = std::max(previous, size / pieces * i);
+        if (whole_sentences) {
+            while (pos < size && !is_terminator(bytes[pos])) ++pos;
+        }
+        while (pos < size && !is_space(bytes[pos])) ++pos;
+        if (pos >= size) {
+            break;
+        }
+        if (pos > previous) {
+            ends.push_back(pos);
+            previous = pos;
+        }
+    }
+    ends.push_back(size);
+    return ends;
+}
+
+// Scans data as pieces (see split_points()) on up to `threads` native
+// threads and merges them into exactly the serial result: counts are summed,
+// the sentiment additions of each piece are replayed in text order and the
+// sentence rows are concatenated. Sentences only stay whole when the
+// sentiment rules or sentences need them to. Must be called without the GIL.
+TextStats scan_parallel(const char* data, std::size_t size, const Lexicon& lexicon, unsigned threads,
+                        SentenceCollector* sentences) {
+    const bool use_rules = active_sentiment_mode.load(std::memory_order_relaxed) == RULES_MODE;
+    const std::vector<std::size_t> ends = split_points(data, size, threads, use_rules || sentences != nullptr);
+    const std::size_t pieces = ends.size();
+    std::vector<TextStats> stats(pieces);
+    std::vector<ScoreLog> scores(pieces);
+    std::vector<SentenceCollector> rows(sentences != nullptr ? pieces : 0);
+    parallel_for(pieces, threads, [&](std::size_t i) {
+        const std::size_t start = i == 0 ? 0 : ends[i - 1];
+        // The first piece's scores are already in serial order
+        Scanner scanner(lexicon, nullptr, sentences != nullptr ? &rows[i] : nullptr, i == 0 ? nullptr : &scores[i]);
+        scanner.feed(data + start, ends[i] - start);
+        stats[i] = scanner.finish();
+    });
+
+    TextStats total = stats[0];
+    for (std::size_t i = 1; i < pieces; ++i) {
+        total.bytes += stats[i].bytes;
+        total.word_count += stats[i].word_count;
+        total.sentence_count += stats[i].sentence_count;
+        total.syllable_count += stats[i].syllable_count;
+        total.complex_word_count += stats[i].complex_word_count;
+        total.letter_count += stats[i].letter_count;
+        scores[i].replay(total);
+    }
+    if (sentences != nullptr) {
+        for (std::size_t i = 0; i < pieces; ++i) {
+            sentences->append(rows[i], i == 0 ? 0 : static_cast<long long>(ends[i - 1]));
+        }
+    }
+    return total;
+}
+
+py::dtype metrics_dtype() {
+    py::list names, formats, offsets;
+    for (const CountField& field : COUNT_FIELDS) {
+        names.append(field.name); formats.append("i8"); offsets.append(field.offset);
+    }
+    for (const ScoreField& field : SCORE_FIELDS) {
+        names.append(field.name); formats.append("f8"); offsets.append(field.offset);
+    }
+    return py::dtype(names, formats, offsets, sizeof(Metrics));
+}
+
+// Runs scan_one(i) for every document on native worker threads with the GIL
+// released and returns the results in input order, either as a list of dicts
+// or, for analytics jobs, as NumPy arrays the workers write into directly
+// ("columns": one array per metric; "structured": one record array). NumPy is
+// only imported for the array outputs. scan_one must not touch Python objects.
+template <typename ScanOne>
+py::object run_batch(std::size_t count, int threads, const std::string& output, ScanOne scan_one) {
+    if (output != "dicts" && output != "columns" && output != "structured") {
+        throw py::value_error("output must be 'dicts', 'columns' or 'structured', got '" + output + "'");
+    }
+    const py::ssize_t rows = static_cast<py::ssize_t>(count);
+    const unsigned workers = resolve_threads(threads, count);
+
+    if (output == "columns") {
+        py::dict columns;
+        std::vector<std::int64_t*> counts;
+        std::vector<double*> scores;
+        for (const CountField& field : COUNT_FIELDS) {
+            py::array_t<std::int64_t> column(rows);
+            counts.push_back(column.mutable_data());
+            columns[field.name] = column;
+        }
+        for (const ScoreField& field : SCORE_FIELDS) {
+            py::array_t<double> column(rows);
+            scores.push_back(column.mutable_data());
+            columns[field.name] = column;
+        }
+        {
+            py::gil_scoped_release release;
+            parallel_for(count, workers, [&](std::size_t i) {
+                const Metrics metrics = compute_metrics(scan_one(i));
+                for (std::size_t f = 0; f < counts.size(); ++f) {
+                    counts[f][i] = metrics.*COUNT_FIELDS[f].member;
+                }
+                for (std::size_t f = 0; f < scores.size(); ++f) {
+                    scores[f][i] = metrics.*SCORE_FIELDS[f].member;
+                }
+            });
+        }
+        return columns;
+    }
+
+    if (output == "structured") {
+        py::array records(metrics_dtype(), std::vector<py::ssize_t>{rows});
+        Metrics* records_data = static_cast<Metrics*>(records.mutable_data());
+        {
+            py::gil_scoped_release release;
+            parallel_for(count, workers, [&](std::size_t i) {
+                records_data[i] = compute_metrics(scan_one(i));
+            });
+        }
+        return records;
+    }
+
+    std::vector<TextStats> stats(count);
+    {
+        py::gil_scoped_release release;
+        parallel_for(count, workers, [&](std::size_t i) {
+            stats[i] = scan_one(i);
+        });
     }
+    py::list results(count);
+    for (std::size_t i = 0; i < count; ++i) {
+        results[i] = make_result(stats[i]);
+    }
+    return results;
+}
 
-    // 4. Simple Sentiment Analysis
-    std::set<std::string> positive_words = {"good", "great", "excellent", "amazing", "love", "happy", "success", "beautiful", "perfect"};
-    std::set<std::string> negative_words = {"bad", "terrible", "awful", "hate", "sad", "negative", "failure", "wrong", "problem"};
-    
-    std::string lower_text = text;
-    std::transform(lower_text.begin(), lower_text.end(), lower_text.begin(), ::tolower);
+// Files are mapped and scanned one window at a time, so only a window's
+// worth of pages is ever mapped, however large the file.
+const std::size_t MAP_WINDOW = std::size_t(64) << 20; // multiple of the mapping granularity on all platforms
 
-    std::stringstream text_stream(lower_text);
-    int positive_count = 0;
-    int negative_count = 0;
-    
-    while(text_stream >> word) {
-        // Remove punctuation from word
-        word.erase(std::remove_if(word.begin(), word.end(), ispunct), word.end());
-        if (positive_words.count(word)) positive_count++;
-        if (negative_words.count(word)) negative_count++;
+// Pipes, devices and files like /proc/self/status have no size to map by, so
+// they are read into a buffer of this size and scanned chunk by chunk.
+const std::size_t READ_CHUNK = std::size_t(1) << 20;
+
+// Memory-maps the file at path (UTF-8 / file system encoding) and scans it
+// without copying; anything that isn't a regular file with a size is read
+// instead. Returns 0 on success, or the errno (GetLastError() on Windows) of
+// the failing call. Called without the GIL.
+int scan_file(const std::string& path, const Lexicon& lexicon, TextStats& stats) {
+    Scanner scanner(lexicon);
+#ifdef _WIN32
+    int wide_length = MultiByteToWideChar(CP_UTF8, 0, path.c_str(), -1, nullptr, 0);
+    if (wide_length == 0) {
+        return static_cast<int>(GetLastError());
+    }
+    std::wstring wide_path(static_cast<std::size_t>(wide_length), L'\0');
+    MultiByteToWideChar(CP_UTF8, 0, path.c_str(), -1, &wide_path[0], wide_length);
+    HANDLE file = CreateFileW(wide_path.c_str(), GENERIC_READ, FILE_SHARE_READ | FILE_SHARE_WRITE | FILE_SHARE_DELETE,
+                              nullptr, OPEN_EXISTING, FILE_FLAG_SEQUENTIAL_SCAN, nullptr);
+    if (file == INVALID_HANDLE_VALUE) {
+        return static_cast<int>(GetLastError());
+    }
+    if (GetFileType(file) != FILE_TYPE_DISK) {
+        std::vector<char> buffer(READ_CHUNK);
+        DWORD count = 0;
+        BOOL ok;
+        while ((ok = ReadFile(file, buffer.data(), static_cast<DWORD>(buffer.size()), &count, nullptr)) && count > 0) {
+            scanner.feed(buffer.data(), count);
+        }
+        int error = ok ? 0 : static_cast<int>(GetLastError());
+        CloseHandle(file);
+        // A pipe ends with ERROR_BROKEN_PIPE once the writer closes it
+        if (error != 0 && error != ERROR_BROKEN_PIPE) {
+            return error;
+        }
+        stats = scanner.finish();
+        return 0;
+    }
+    LARGE_INTEGER size;
+    if (!GetFileSizeEx(file, &size)) {
+        int error = static_cast<int>(GetLastError());
+        CloseHandle(file);
+        return error;
+    }
+    if (size.QuadPart > 0) {
+        // Empty files can't be mapped, and don't need to be
+        HANDLE mapping = CreateFileMappingW(file, nullptr, PAGE_READONLY, 0, 0, nullptr);
+        if (mapping == nullptr) {
+            int error = static_cast<int>(GetLastError());
+            CloseHandle(file);
+            return error;
+        }
+        for (long long offset = 0; offset < size.QuadPart; offset += MAP_WINDOW) {
+            std::size_t length = static_cast<std::size_t>(std::min<long long>(MAP_WINDOW, size.QuadPart - offset));
+            const void* view = MapViewOfFile(mapping, FILE_MAP_READ, static_cast<DWORD>(offset >> 32),
+                                             static_cast<DWORD>(offset & 0xFFFFFFFF), length);
+            if (view == nullptr) {
+                int error = static_cast<int>(GetLastError());
+                CloseHandle(mapping);
+                CloseHandle(file);
+                return error;
+            }
+            scanner.feed(static_cast<const char*>(view), length);
+            UnmapViewOfFile(view);
+        }
+        CloseHandle(mapping);
+    }
+    CloseHandle(file);
+#else
+    int fd = ::open(path.c_str(), O_RDONLY | O_CLOEXEC);
+    if (fd < 0) {
+        return errno;
+    }
+    struct stat info;
+    if (::fstat(fd, &info) != 0) {
+        int error = errno;
+        ::close(fd);
+        return error;
     }
+    if (S_ISDIR(info.st_mode)) {
+        ::close(fd);
+        return EISDIR;
+    }
+    if (!S_ISREG(info.st_mode) || info.st_size == 0) {
+        // An empty regular file costs one read() that returns 0
+        std::vector<char> buffer(READ_CHUNK);
+        for (;;) {
+            ssize_t count = ::read(fd, buffer.data(), buffer.size());
+            if (count < 0 && errno == EINTR) {
+                continue;
+            }
+            if (count < 0) {
+                int error = errno;
+                ::close(fd);
+                return error;
+            }
+            if (count == 0) {
+                break;
+            }
+            scanner.feed(buffer.data(), static_cast<std::size_t>(count));
+        }
+    } else {
+        for (off_t offset = 0; offset < info.st_size; offset += static_cast<off_t>(MAP_WINDOW)) {
+            std::size_t length = static_cast<std::size_t>(std::min<off_t>(static_cast<off_t>(MAP_WINDOW), info.st_size - offset));
+            void* view = ::mmap(nullptr, length, PROT_READ, MAP_PRIVATE, fd, offset);
+            if (view == MAP_FAILED) {
+                int error = errno;
+                ::close(fd);
+                return error;
+            }
+            ::madvise(view, length, MADV_SEQUENTIAL);
+            scanner.feed(static_cast<const char*>(view), length);
+            ::munmap(view, length);
+        }
+    }
+    ::close(fd);
+#endif
+    stats = scanner.finish();
+    return 0;
+}
+
+// Raises the OSError (FileNotFoundError, PermissionError, ...) for a
+// scan_file() failure. Needs the GIL.
+[[noreturn]] void raise_file_error(int error, const std::string& path) {
+#ifdef _WIN32
+    PyErr_SetExcFromWindowsErrWithFilename(PyExc_OSError, error, path.c_str());
+#else
+    errno = error;
+    PyErr_SetFromErrnoWithFilename(PyExc_OSError, path.c_str());
+#endif
+    throw py::error_already_set();
+}
+
+// Converts a str, bytes or os.PathLike path to the bytes the OS expects.
+std::string file_system_path(py::handle path) {
+    return py::module_::import("os").attr("fsencode")(path).cast<std::string>();
+}
 
-    double sentiment_score = 0.5; // Neutral
-    if (positive_count + negative_count > 0) {
-        sentiment_score = static_cast<double>(positive_count) / (positive_count + negative_count);
+} // namespace
+
+// Terms as a list of (term, count) tuples; invalid UTF-8 is replaced.
+py::list term_list(const std::vector<std::pair<std::string, std::int64_t>>& terms) {
+    py::list result;
+    for (const auto& term : terms) {
+        PyObject* decoded = PyUnicode_DecodeUTF8(term.first.data(), static_cast<py::ssize_t>(term.first.size()), "replace");
+        if (decoded == nullptr) {
+            throw py::error_already_set();
+        }
+        result.append(py::make_tuple(py::reinterpret_steal<py::str>(decoded), term.second));
+    }
+    return result;
+}
+
+// Per-sentence metrics as a dict of NumPy columns, one row per sentence.
+// Offsets index the UTF-8 bytes of the input, or the str itself when text
+// is a str (code points are counted up to each offset; rows are in order,
+// so that is one pass over the text).
+py::dict sentence_columns(const std::vector<SentenceRow>& rows, py::handle text, const char* data) {
+    const py::ssize_t count = static_cast<py::ssize_t>(rows.size());
+    py::array_t<std::int64_t> start(count), end(count), word_count(count), syllable_count(count);
+    py::array_t<double> readability_score(count), sentiment_score(count);
+    std::int64_t* starts = start.mutable_data();
+    std::int64_t* ends = end.mutable_data();
+    std::int64_t* words = word_count.mutable_data();
+    std::int64_t* syllables = syllable_count.mutable_data();
+    double* readability = readability_score.mutable_data();
+    double* sentiment = sentiment_score.mutable_data();
+
+    const bool code_points = PyUnicode_Check(text.ptr()) && !PyUnicode_IS_ASCII(text.ptr());
+    long long byte = 0, chars = 0;
+    auto to_index = [&](long long offset) -> std::int64_t {
+        if (!code_points) {
+            return offset;
+        }
+        for (; byte < offset; ++byte) {
+            if ((static_cast<unsigned char>(data[byte]) & 0xC0) != 0x80) {
+                chars++;
+            }
+        }
+        return chars;
+    };
+    for (std::size_t i = 0; i < rows.size(); ++i) {
+        const Metrics metrics = compute_metrics(rows[i].stats);
+        starts[i] = to_index(rows[i].start);
+        ends[i] = to_index(rows[i].end);
+        words[i] = metrics.word_count;
+        syllables[i] = metrics.syllable_count;
+        readability[i] = metrics.readability_score;
+        sentiment[i] = metrics.sentiment_score;
     }
-    
-    std::map<std::string, double> result;
-    result["word_count"] = word_count;
-    result["sentence_count"] = sentence_count;
-    result["readability_score"] = readability_score;
-    result["sentiment_score"] = sentiment_score;
 
+    py::dict columns;
+    columns["start"] = start;
+    columns["end"] = end;
+    columns["word_count"] = word_count;
+    columns["syllable_count"] = syllable_count;
+    columns["readability_score"] = readability_score;
+    columns["sentiment_score"] = sentiment_score;
+    return columns;
+}
+
+// Single-pass text analysis: word, sentence, syllable and sentiment counts,
+// and from them the readability indices, are all produced by one scan over
+// the input without copying it. Accepts a str or any UTF-8 bytes-like
+// object, analyzed in place. Large inputs are scanned with the GIL released
+// so other Python threads keep running.
+py::dict analyze_text(py::object text, std::size_t top_k, bool filter_stop_words, bool per_sentence, int threads,
+                      const std::shared_ptr<Lexicon>& lexicon_arg) {
+    TextSource source(text);
+    std::shared_ptr<const Lexicon> lexicon = lexicon_or_active(lexicon_arg);
+    std::shared_ptr<const Lexicon> stop_words = active_stop_words;
+    std::unique_ptr<TermCollector> terms;
+    if (top_k > 0) {
+        terms.reset(new TermCollector(filter_stop_words ? stop_words.get() : nullptr));
+    }
+    std::unique_ptr<SentenceCollector> sentences;
+    if (per_sentence) {
+        sentences.reset(new SentenceCollector());
+    }
+    // Top terms come from bounded counters that can't be merged exactly, so
+    // they are always found in one serial pass
+    const unsigned workers = terms ? 1 : resolve_threads(threads, source.size() / PARALLEL_MIN_PIECE_BYTES);
+    TextStats stats;
+    if (source.size() < GIL_RELEASE_MIN_BYTES) {
+        stats = scan(source, *lexicon, terms.get(), sentences.get());
+    } else if (workers <= 1) {
+        py::gil_scoped_release release;
+        stats = scan(source, *lexicon, terms.get(), sentences.get());
+    } else {
+        py::gil_scoped_release release;
+        stats = scan_parallel(source.data(), source.size(), *lexicon, workers, sentences.get());
+    }
+    py::dict result = make_result(stats);
+    if (terms) {
+        result["top_terms"] = term_list(terms->words().top(top_k));
+        result["top_bigrams"] = term_list(terms->bigrams().top(top_k));
+        result["top_trigrams"] = term_list(terms->trigrams().top(top_k));
+    }
+    if (sentences) {
+        result["sentences"] = sentence_columns(sentences->rows(), text, source.data());
+    }
     return result;
 }
 
+// Batch analysis of in-memory texts; see run_batch() for the output layouts.
+py::object analyze_texts(py::iterable texts, int threads, const std::string& output,
+                         const std::shared_ptr<Lexicon>& lexicon_arg) {
+    // A deque never relocates its elements, so exported buffers stay put.
+    std::deque<TextSource> sources;
+    for (py::handle item : texts) {
+        sources.emplace_back(item);
+    }
+    std::shared_ptr<const Lexicon> lexicon = lexicon_or_active(lexicon_arg);
+    return run_batch(sources.size(), threads, output, [&](std::size_t i) {
+        return scan(sources[i], *lexicon);
+    });
+}
+
+// Analyzes a file on disk through a memory map (pipes and other unsized
+// files are read instead) with the GIL released; the content never becomes a
+// Python object.
+py::dict analyze_file(py::object path, const std::shared_ptr<Lexicon>& lexicon_arg) {
+    std::string file_path = file_system_path(path);
+    std::shared_ptr<const Lexicon> lexicon = lexicon_or_active(lexicon_arg);
+    TextStats stats;
+    int error = 0;
+    {
+        py::gil_scoped_release release;
+        error = scan_file(file_path, *lexicon, stats);
+    }
+    if (error != 0) {
+        raise_file_error(error, file_path);
+    }
+    return make_result(stats);
+}
+
+// Batch version of analyze_file(); files are spread over native threads and
+// the first file that can't be read raises OSError.
+py::object analyze_files(py::iterable paths, int threads, const std::string& output,
+                         const std::shared_ptr<Lexicon>& lexicon_arg) {
+    std::vector<std::string> file_paths;
+    for (py::handle path : paths) {
+        file_paths.push_back(file_system_path(path));
+    }
+    std::shared_ptr<const Lexicon> lexicon = lexicon_or_active(lexicon_arg);
+    std::vector<int> errors(file_paths.size(), 0);
+    py::object results = run_batch(file_paths.size(), threads, output, [&](std::size_t i) {
+        TextStats stats;
+        errors[i] = scan_file(file_paths[i], *lexicon, stats);
+        return stats;
+    });
+    for (std::size_t i = 0; i < errors.size(); ++i) {
+        if (errors[i] != 0) {
+            raise_file_error(errors[i], file_paths[i]);
+        }
+    }
+    return results;
+}
+
+// Incremental analysis for documents too large to hold in memory: feed() the
+// text in chunks of any size, then finalize(). Word and sentence state is
+// carried across chunk boundaries; only the current partial word is kept.
+class Analyzer {
+public:
+    // Uses the given lexicon for every document, or else the lexicon active
+    // when each document starts.
+    explicit Analyzer(const std::shared_ptr<Lexicon>& lexicon)
+        : fixed_lexicon_(lexicon), lexicon_(lexicon_or_active(lexicon)), scanner_(*lexicon_) {}
+
+    void feed(py::object chunk) {
+        TextSource source(chunk);
+        if (source.size() < GIL_RELEASE_MIN_BYTES) {
+            std::unique_lock<std::mutex> lock = lock_with_gil();
+            scanner_.feed(source.data(), source.size());
+            return;
+        }
+        py::gil_scoped_release release;
+        std::lock_guard<std::mutex> lock(mutex_);
+        scanner_.feed(source.data(), source.size());
+    }
+
+    // Analyzes one whole text on its own, like analyze_text(text), without
+    // disturbing the document being fed.
+    py::dict analyze(py::object text) {
+        TextSource source(text);
+        std::shared_ptr<const Lexicon> lexicon = lexicon_or_active(fixed_lexicon_);
+        if (source.size() < GIL_RELEASE_MIN_BYTES) {
+            return make_result(scan(source, *lexicon));
+        }
+        TextStats stats;
+        {
+            py::gil_scoped_release release;
+            stats = scan(source, *lexicon);
+        }
+        return make_result(stats);
+    }
+
+    // Returns the metrics for everything fed so far and resets the analyzer
+    // so it can be reused for the next document.
+    py::dict finalize() {
+        std::unique_lock<std::mutex> lock = lock_with_gil();
+        TextStats stats = scanner_.finish();
+        lexicon_ = lexicon_or_active(fixed_lexicon_);
+        scanner_ = Scanner(*lexicon_);
+        return make_result(stats);
+    }
+
+private:
+    // Locks mutex_ from a thread holding the GIL. Another thread may hold
+    // mutex_ in a large feed() with the GIL released, and needs the GIL back
+    // to return, so the GIL is released while waiting for it.
+    std::unique_lock<std::mutex> lock_with_gil() {
+        std::unique_lock<std::mutex> lock(mutex_, std::try_to_lock);
+        if (!lock.owns_lock()) {
+            py::gil_scoped_release release;
+            lock.lock();
+        }
+        return lock;
+    }
+
+    std::shared_ptr<Lexicon> fixed_lexicon_;
+    std::shared_ptr<const Lexicon> lexicon_;
+    Scanner scanner_;
+    std::mutex mutex_;
+};
+
+// Replaces the active sentiment lexicon with the terms read from one or more
+// files; later files override earlier ones. Returns the number of terms.
+std::size_t load_lexicon(const std::vector<std::string>& paths) {
+    std::unordered_map<std::string, double> terms;
+    for (const std::string& path : paths) {
+        read_lexicon_file(path, terms);
+    }
+    active_lexicon = std::make_shared<const Lexicon>(terms);
+    return active_lexicon->size();
+}
+
+std::size_t lexicon_size() {
+    return active_lexicon->size();
+}
+
+// Replaces the active stop words with the words read from one or more files.
+// Returns the number of words.
+std::size_t load_stop_words(const std::vector<std::string>& paths) {
+    std::unordered_map<std::string, double> words;
+    for (const std::string& path : paths) {
+        read_word_list_file(path, words);
+    }
+    active_stop_words = std::make_shared<const Lexicon>(words);
+    return active_stop_words->size();
+}
+
+std::string simd_level() {
+    return SIMD_LEVELS[active_simd_level.load()];
+}
+
+// Restricts the scanner to an instruction set ("scalar", "sse2", "avx2") or
+// picks the best one the CPU supports ("auto"); mainly for benchmarks.
+std::string set_simd_level(const std::string& level) {
+    const int best = best_simd_level();
+    int selected = -1;
+    if (level == "auto") {
+        selected = best;
+    }
+    for (int i = 0; i <= 2; ++i) {
+        if (level == SIMD_LEVELS[i]) {
+            selected = i;
+        }
+    }
+    if (selected < 0) {
+        throw py::value_error("unknown SIMD level '" + level + "'; expected 'auto', 'scalar', 'sse2' or 'avx2'");
+    }
+    if (selected > best) {
+        throw py::value_error("SIMD level '" + level + "' is not supported on this CPU (best: '" + SIMD_LEVELS[best] + "')");
+    }
+    active_simd_level.store(selected);
+    return SIMD_LEVELS[selected];
+}
+
+// How this module was built, so a deployment can show which build it runs.
+py::dict build_info() {
+    py::dict info;
+    info["version"] = VERSION;
+    info["variant"] = TEXT_ANALYZER_BUILD_VARIANT;
+    info["flags"] = TEXT_ANALYZER_BUILD_FLAGS;
+#if defined(__clang__)
+    info["compiler"] = std::string("clang ") + __clang_version__;
+#elif defined(__GNUC__)
+    info["compiler"] = std::string("gcc ") + __VERSION__;
+#elif defined(_MSC_VER)
+    info["compiler"] = "msvc " + std::to_string(_MSC_FULL_VER);
+#else
+    info["compiler"] = "unknown";
+#endif
+    info["cplusplus"] = static_cast<long>(__cplusplus);
+    info["simd_level"] = simd_level();
+    return info;
+}
+
+std::string sentiment_mode() {
+    return SENTIMENT_MODES[active_sentiment_mode.load()];
+}
+
+// Selects how sentiment is scored: "lexicon" sums term weights, "rules"
+// applies the negation, intensifier and punctuation rules. Scans and
+// Analyzers read it when they start.
+std::string set_sentiment_mode(const std::string& mode) {
+    for (int i = 0; i <= RULES_MODE; ++i) {
+        if (mode == SENTIMENT_MODES[i]) {
+            active_sentiment_mode.store(i);
+            return SENTIMENT_MODES[i];
+        }
+    }
+    throw py::value_error("unknown sentiment mode '" + mode + "'; expected 'lexicon' or 'rules'");
+}
+
 // Pybind11 module definition
 PYBIND11_MODULE(text_analyzer, m) {
     m.doc() = "A basic C++ text analyzer module for Python";
-    m.def("analyze_text", &analyze_text, "Analyzes a string and returns a dictionary of metrics");
-}
\ No newline at end of file
+    m.attr("__version__") = VERSION;
+    active_lexicon = default_lexicon();
+    active_stop_words = default_stop_words();
+    active_modifiers = sentiment_modifiers();
+    active_simd_level.store(best_simd_level());
+    init_result_fields();
+
+    py::class_<Lexicon, std::shared_ptr<Lexicon>>(m, "Lexicon",
+        "A compiled sentiment lexicon that can be passed to the analysis functions with lexicon=, so several "
+        "vocabularies can be used side by side without reloading the active one")
+        .def(py::init(&make_lexicon), py::arg("terms"),
+             "Compiles a mapping of words (str or UTF-8 bytes) to weights; words are normalized like lexicon files")
+        .def("__len__", &Lexicon::size);
+
+    m.def("analyze_text", &analyze_text, py::arg("text"), py::arg("top_k") = 0, py::arg("stop_words") = true,
+          py::arg("sentences") = false, py::arg("threads") = 1, py::arg("lexicon") = py::none(),
+          "Analyzes a str or UTF-8 bytes-like object in place and returns a dictionary of metrics "
+          "(the GIL is released for large inputs). With top_k > 0 the dictionary also holds the top_k most frequent "
+          "words, bigrams and trigrams as lists of (term, count) under 'top_terms', 'top_bigrams' and 'top_trigrams', "
+          "found in the same pass; stop_words=False keeps stop words in them. With sentences=True it also holds "
+          "'sentences': NumPy columns 'start', 'end' (str indices, or byte offsets for bytes input), 'word_count', "
+          "'syllable_count', 'readability_score' and 'sentiment_score' with one row per sentence. threads > 1 (0 = one "
+          "per core) splits a large text (1 MB or more per thread) at whitespace between sentences and scans the pieces "
+          "on native threads, with exactly the serial result; with top_k > 0 the text is scanned serially. "
+          "lexicon= scores sentiment with a compiled Lexicon instead of the active one");
+    m.def("analyze_texts", &analyze_texts, py::arg("texts"), py::arg("threads") = 0, py::arg("output") = "dicts",
+          py::arg("lexicon") = py::none(),
+          "Analyzes a list of str or UTF-8 bytes-like objects on native threads (0 = one per core) without holding the GIL. "
+          "Returns, in input order, a list of metric dictionaries (output='dicts'), a dict of NumPy arrays with one "
+          "column per metric (output='columns') or a NumPy structured array (output='structured')");
+    m.def("analyze_file", &analyze_file, py::arg("path"), py::arg("lexicon") = py::none(),
+          "Memory-maps (or, for pipes and devices, reads) a UTF-8 text file and analyzes it with the GIL released; returns a dictionary of metrics");
+    m.def("analyze_files", &analyze_files, py::arg("paths"), py::arg("threads") = 0, py::arg("output") = "dicts",
+          py::arg("lexicon") = py::none(),
+          "Memory-maps and analyzes several files on native threads; returns results in the same layouts as analyze_texts");
+
+    py::class_<Analyzer>(m, "Analyzer", "Incremental analyzer: feed() a document in chunks, then finalize() for the metrics")
+        .def(py::init<const std::shared_ptr<Lexicon>&>(), py::arg("lexicon") = py::none(),
+             "lexicon= scores every document with a compiled Lexicon; otherwise each document uses the active one")
+        .def("feed", &Analyzer::feed, py::arg("chunk"), "Scans the next chunk (str or UTF-8 bytes-like object) of the document")
+        .def("finalize", &Analyzer::finalize, "Returns the metrics for the whole document and resets the analyzer")
+        .def("analyze", &Analyzer::analyze, py::arg("text"),
+             "Analyzes one whole str or UTF-8 bytes-like object like analyze_text(text), with this analyzer's "
+             "lexicon; the document being fed is not affected");
+
+    m.def("load_lexicon", [](const std::string& path) { return load_lexicon({path}); }, py::arg("path"),
+          "Loads the sentiment lexicon from a file of '<word> <weight>' lines; returns the number of terms");
+    m.def("load_lexicon", &load_lexicon, py::arg("paths"),
+          "Loads the sentiment lexicon from several files, later files overriding earlier ones; returns the number of terms");
+    m.def("lexicon_size", &lexicon_size, "Returns the number of terms in the active sentiment lexicon");
+    m.def("load_stop_words", [](const std::string& path) { return load_stop_words({path}); }, py::arg("path"),
+          "Loads the stop words left out of top terms from a file with one word per line; returns the number of words");
+    m.def("load_stop_words", &load_stop_words, py::arg("paths"),
+          "Loads stop words from several files, combining their words; returns the number of words");
+
+    m.def("simd_level", &simd_level, "Returns the instruction set the scanner uses: 'scalar', 'sse2' or 'avx2'");
+    m.def("set_simd_level", &set_simd_level, py::arg("level"),
+          "Selects the scanner's instruction set ('auto', 'scalar', 'sse2', 'avx2'); returns the level now in use");
+
+    m.def("build_info", &build_info,
+          "Returns how the module was built: 'version', 'variant' ('default', 'optimized', 'native', 'pgo' or "
+          "'pgo-generate'), compiler 'flags', 'compiler', 'cplusplus' (the C++ standard) and the 'simd_level' in use");
+
+    m.def("sentiment_mode", &sentiment_mode, "Returns how sentiment is scored: 'lexicon' or 'rules'");
+    m.def("set_sentiment_mode", &set_sentiment_mode, py::arg("mode"),
+          "Selects the sentiment scoring: 'lexicon' sums term weights; 'rules' also applies negation, "
+          "intensifiers, ALL CAPS, 'but' and '!'/'?' emphasis per sentence. Returns the mode now in use");
+}
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the AI Text Analyzer
+Times the text_analyzer C++ module (single text, batch and streaming) and the
+pure Python fallback on deterministic corpora, reports throughput, p50/p99
+latency and peak RSS, and saves the results as JSON so builds can be compared.
+Runs offline; no API keys are needed.
+
+Usage:
+    python benchmark_analyzer.py                          # all variants, default sizes
+    python benchmark_analyzer.py --output new.json --compare old.json
+    python benchmark_analyzer.py --variants cpp_text --simd all
+    python benchmark_analyzer.py --sentiment-mode all   # lexicon and rules
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+try:
+    import text_analyzer
+    CPP_MODULE_AVAILABLE = True
+except ImportError:
+    CPP_MODULE_AVAILABLE = False
+
+# Words/second reference figures from docs/PERFORMANCE_METRICS.md
+REFERENCE_WORDS_PER_SECOND = {
+    100: 50000,
+    1000: 66667,
+    10000: 83333,
+    100000: 90909,
+}
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000, 1000000]
+VARIANTS = ["cpp_text", "cpp_parallel", "cpp_batch", "cpp_stream", "python_text", "python_batch", "python_stream"]
+# Every case runs in the sentiment mode it is given, so the C++ module and the
+# fallback are always compared on the same scoring
+SENTIMENT_MODES = ["lexicon", "rules"]
+# Batch variants analyze the same corpus split into documents of this many words
+BATCH_DOCUMENT_WORDS = 100
+# Streaming variants feed the corpus in chunks of this many bytes
+STREAM_CHUNK_BYTES = 64 * 1024
+MIN_ITERATIONS = 5
+# A slower result than this fraction of the compared run is flagged
+REGRESSION_THRESHOLD = 0.9
+
+VOCABULARY = [
+    "the", "analysis", "of", "text", "is", "good", "and", "results", "were",
+    "excellent", "but", "some", "parts", "felt", "bad", "or", "even", "awful",
+    "Performance", "matters", "a", "lot", "in", "production", "systems,",
+    "latency", "throughput", "happy", "users", "wonderful", "experience",
+]
+
+def make_text(word_count, seed=42):
+    """Build a deterministic English-like text with sentences of 8-20 words"""
+    rng = random.Random(seed)
+    sentences = []
+    remaining = word_count
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        words = [rng.choice(VOCABULARY) for _ in range(length)]
+        sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", "!", "?"]))
+        remaining -= length
+    return " ".join(sentences)
+
+def make_documents(word_count):
+    """Split a corpus of word_count words into BATCH_DOCUMENT_WORDS-word documents"""
+    return [make_text(min(BATCH_DOCUMENT_WORDS, word_count - start), seed=start)
+            for start in range(0, word_count, BATCH_DOCUMENT_WORDS)]
+
+def available_simd_levels():
+    """Return the SIMD levels this CPU supports, scalar first"""
+    levels = []
+    for level in ("scalar", "sse2", "avx2"):
+        try:
+            text_analyzer.set_simd_level(level)
+            levels.append(level)
+        except ValueError:
+            pass
+    text_analyzer.set_simd_level("auto")
+    return levels
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def build_workload(variant, word_count, sentiment_mode):
+    """Return (callable, corpus bytes) for one benchmark case"""
+    text = make_text(word_count)
+    data = text.encode("utf-8")
+    chunks = [data[i:i + STREAM_CHUNK_BYTES] for i in range(0, len(data), STREAM_CHUNK_BYTES)]
+    documents = make_documents(word_count) if variant.endswith("_batch") else None
+
+    if variant.startswith("cpp_"):
+        text_analyzer.set_sentiment_mode(sentiment_mode)
+        analyze_text, analyze_texts, create_analyzer = (
+            text_analyzer.analyze_text, text_analyzer.analyze_texts, text_analyzer.Analyzer)
+    else:
+        # main reads its sentiment mode when imported; each case runs in a fresh process
+        os.environ["SENTIMENT_MODE"] = sentiment_mode
+        # main prints its startup status; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main
+        analyze_text, analyze_texts, create_analyzer = (
+            main.python_text_analysis, main.python_analyze_texts, main.PythonTextAnalyzer)
+
+    def stream():
+        analyzer = create_analyzer()
+        for chunk in chunks:
+            analyzer.feed(chunk)
+        return analyzer.finalize()
+
+    if variant.endswith("_batch"):
+        return (lambda: analyze_texts(documents)), len(data)
+    if variant.endswith("_stream"):
+        return stream, len(data)
+    if variant == "cpp_parallel":
+        # One document split across all cores
+        return (lambda: analyze_text(text, threads=0)), len(data)
+    return (lambda: analyze_text(text)), len(data)
+
+def run_case(variant, word_count, simd_level, sentiment_mode, max_iterations, time_budget):
+    """Time one variant on one corpus size; runs in its own process so peak RSS is per case"""
+    if variant.startswith("cpp_"):
+        text_analyzer.set_simd_level(simd_level)
+    workload, corpus_bytes = build_workload(variant, word_count, sentiment_mode)
+
+    workload()  # Warm-up
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_iterations and (
+            len(samples) < MIN_ITERATIONS or time.perf_counter() - started < time_budget):
+        start = time.perf_counter()
+        workload()
+        samples.append(time.perf_counter() - start)
+
+    p50 = percentile(samples, 0.50)
+    return {
+        "variant": variant,
+        "simd_level": text_analyzer.simd_level() if variant.startswith("cpp_") else None,
+        "sentiment_mode": sentiment_mode,
+        "words": word_count,
+        "bytes": corpus_bytes,
+        "iterations": len(samples),
+        "words_per_second": word_count / p50,
+        "gb_per_second": corpus_bytes / p50 / 1e9,
+        "latency_ms": {
+            "p50": p50 * 1000,
+            "p99": percentile(samples, 0.99) * 1000,
+            "mean": sum(samples) / len(samples) * 1000,
+            "min": min(samples) * 1000,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def case_key(result):
+    """Identify a result across runs"""
+    # Results saved before modes were recorded don't match any case
+    return result["variant"], result["simd_level"], result.get("sentiment_mode"), result["words"]
+
+def load_previous(path):
+    """Index a saved results file by case"""
+    with open(path, encoding="utf-8") as f:
+        return {case_key(result): result for result in json.load(f)["results"]}
+
+def format_row(result, previous):
+    """One line of the results table"""
+    name = result["variant"] + (f"[{result['simd_level']}]" if result["simd_level"] else "")
+    reference = REFERENCE_WORDS_PER_SECOND.get(result["words"])
+    rss = result["peak_rss_mb"]
+    row = (f"{name:<20}{result['sentiment_mode']:<9}{result['words']:>10,}{result['words_per_second']:>16,.0f}"
+           f"{format(reference, ',') if reference else '-':>12}{result['gb_per_second']:>9.3f}"
+           f"{result['latency_ms']['p50']:>11.3f}{result['latency_ms']['p99']:>11.3f}"
+           f"{format(rss, '.1f') if rss is not None else '-':>10}")
+    before = previous.get(case_key(result)) if previous else None
+    if before:
+        ratio = result["words_per_second"] / before["words_per_second"]
+        row += f"  {ratio:>5.2f}x" + ("  ⚠️ regression" if ratio < REGRESSION_THRESHOLD else "")
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text_analyzer and the Python fallback")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated corpus sizes in words")
+    parser.add_argument("--variants", default=",".join(VARIANTS),
+                        help=f"comma-separated subset of {', '.join(VARIANTS)}")
+    parser.add_argument("--simd", default="auto",
+                        help="SIMD level for C++ variants: auto, scalar, sse2, avx2 or all")
+    parser.add_argument("--sentiment-mode", choices=SENTIMENT_MODES + ["all"], default="lexicon",
+                        help="sentiment mode every case runs in: lexicon (default), rules or all")
+    parser.add_argument("--iterations", type=int, default=200, help="maximum timed runs per case")
+    parser.add_argument("--time-budget", type=float, default=2.0,
+                        help="seconds per case after the first %d runs" % MIN_ITERATIONS)
+    parser.add_argument("--output", default="benchmark_results.json", help="where to save the JSON results")
+    parser.add_argument("--compare", help="previous results JSON to compare throughput against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    variants = [variant for variant in args.variants.split(",") if variant]
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"unknown variants: {', '.join(sorted(unknown))}")
+    if not CPP_MODULE_AVAILABLE:
+        print("⚠️ C++ 'text_analyzer' module not found; only the Python fallback is benchmarked.")
+        variants = [variant for variant in variants if not variant.startswith("cpp_")]
+        simd_levels = ["auto"]
+    elif args.simd == "all":
+        simd_levels = available_simd_levels()
+    else:
+        simd_levels = [args.simd]
+    sentiment_modes = SENTIMENT_MODES if args.sentiment_mode == "all" else [args.sentiment_mode]
+    previous = load_previous(args.compare) if args.compare else None
+
+    cases = []
+    for sentiment_mode in sentiment_modes:
+        for variant in variants:
+            for simd_level in (simd_levels if variant.startswith("cpp_") else ["auto"]):
+                for size in sizes:
+                    cases.append((variant, size, simd_level, sentiment_mode))
+
+    print("🚀 AI Text Analyzer benchmark")
+    print(f"{'Variant':<20}{'Mode':<9}{'Words':>10}{'Words/s':>16}{'Reference':>12}{'GB/s':>9}"
+          f"{'p50 ms':>11}{'p99 ms':>11}{'Peak MB':>10}" + ("  vs old" if previous else ""))
+    results = []
+    # Spawned workers start clean, so each case's peak RSS is its own
+    context = multiprocessing.get_context("spawn")
+    for variant, size, simd_level, sentiment_mode in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_case, variant, size, simd_level, sentiment_mode,
+                                 args.iterations, args.time_budget).result()
+        results.append(result)
+        print(format_row(result, previous), flush=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "cpp_module_available": CPP_MODULE_AVAILABLE,
+        "build": text_analyzer.build_info() if CPP_MODULE_AVAILABLE else None,
+        "simd_levels": available_simd_levels() if CPP_MODULE_AVAILABLE else [],
+        "sentiment_modes": sentiment_modes,
+        "reference_words_per_second": REFERENCE_WORDS_PER_SECOND,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {args.output}")
+
+    if previous:
+        regressions = [result for result in results if case_key(result) in previous
+                       and result["words_per_second"] < REGRESSION_THRESHOLD * previous[case_key(result)]["words_per_second"]]
+        if regressions:
+            print(f"⚠️ {len(regressions)} case(s) more than {1 - REGRESSION_THRESHOLD:.0%} slower than {args.compare}")
+            sys.exit(1)
+        print(f"✅ No regressions against {args.compare}")
+
+if __name__ == "__main__":
+    main()
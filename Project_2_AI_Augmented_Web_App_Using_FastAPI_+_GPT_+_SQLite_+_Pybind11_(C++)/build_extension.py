@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Build pipeline for the text_analyzer extension
+Builds the module in place as one of the variants defined in setup.py and
+prints the build_info() of the result. The "pgo" variant is built twice: an
+instrumented build is trained on pgo_corpus.txt with the workloads the app
+runs, then the module is rebuilt with the recorded profile.
+
+Usage:
+    python build_extension.py                      # optimized (-O3, LTO)
+    python build_extension.py --variant native     # also -march=native
+    python build_extension.py --variant pgo       # profile-guided
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+VARIANTS = ["default", "optimized", "native", "pgo"]
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+PGO_DIR = os.path.join(PROJECT_DIR, "build", "pgo-profile")
+TRAINING_CORPUS = os.path.join(PROJECT_DIR, "pgo_corpus.txt")
+# The corpus is repeated up to about this many bytes per training document
+TRAINING_BYTES = 4 << 20
+
+def build(variant, pgo_phase=None):
+    """Run setup.py build_ext --inplace for a variant, rebuilding from scratch"""
+    env = dict(os.environ, TEXT_ANALYZER_BUILD=variant, TEXT_ANALYZER_PGO_DIR=PGO_DIR)
+    if pgo_phase:
+        env["TEXT_ANALYZER_PGO_PHASE"] = pgo_phase
+    subprocess.run([sys.executable, "setup.py", "build_ext", "--inplace", "--force"],
+                   cwd=PROJECT_DIR, env=env, check=True)
+
+def run_module(code):
+    """Run Python code against the module just built, in a fresh interpreter"""
+    subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, check=True)
+
+def train():
+    """Exercise the instrumented module the way main.py uses it, so the profile covers the hot paths"""
+    import text_analyzer
+    with open(TRAINING_CORPUS, encoding="utf-8") as f:
+        corpus = f.read()
+    paragraphs = [line for line in corpus.splitlines() if line.strip()]
+    document = corpus * max(1, TRAINING_BYTES // len(corpus.encode("utf-8")))
+    text_analyzer.load_lexicon(os.path.join(PROJECT_DIR, "sentiment_lexicon.tsv"))
+    text_analyzer.load_stop_words(os.path.join(PROJECT_DIR, "stop_words.txt"))
+
+    for mode in ("lexicon", "rules"):
+        text_analyzer.set_sentiment_mode(mode)
+        for _ in range(3):
+            text_analyzer.analyze_text(document)
+            text_analyzer.analyze_text(document.encode("utf-8"))
+        text_analyzer.analyze_text(document, top_k=10)
+        text_analyzer.analyze_text(document, sentences=True)
+        for paragraph in paragraphs * 20:
+            text_analyzer.analyze_text(paragraph)
+        text_analyzer.analyze_texts(paragraphs * 200, output="columns")
+        analyzer = text_analyzer.Analyzer()
+        data = document.encode("utf-8")
+        for start in range(0, len(data), 64 * 1024):
+            analyzer.feed(data[start:start + 64 * 1024])
+        analyzer.finalize()
+
+def merge_clang_profiles():
+    """Clang writes raw profiles that must be merged into one file; GCC reads its .gcda files directly"""
+    raw_profiles = glob.glob(os.path.join(PGO_DIR, "*.profraw"))
+    if raw_profiles:
+        subprocess.run(["llvm-profdata", "merge", "-output=" + os.path.join(PGO_DIR, "default.profdata")]
+                       + raw_profiles, check=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the text_analyzer extension as one of its build variants")
+    parser.add_argument("--variant", choices=VARIANTS, default="optimized", help="build variant (default: optimized)")
+    parser.add_argument("--train", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.train:
+        train()
+        return
+
+    if args.variant == "pgo":
+        # Old profiles from a different source or compiler would mislead the optimizer
+        shutil.rmtree(PGO_DIR, ignore_errors=True)
+        os.makedirs(PGO_DIR)
+        print("🔧 Building the instrumented module...")
+        build("pgo", "generate")
+        print(f"🏋️ Training on {os.path.basename(TRAINING_CORPUS)}...")
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--train"], cwd=PROJECT_DIR, check=True)
+        merge_clang_profiles()
+        print("🔧 Rebuilding with the profile...")
+        build("pgo", "use")
+    else:
+        print(f"🔧 Building the '{args.variant}' variant...")
+        build(args.variant)
+
+    run_module("import text_analyzer; print('✅ Built text_analyzer', text_analyzer.build_info())")
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,76 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse
-from pydantic import BaseModel
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import hashlib
+import heapq
+import hmac
+import importlib.util
+import math
+import re
 import sqlite3
+import string
+import threading
+import time
 import json
 import os
+from collections import Counter, OrderedDict
 from datetime import datetime
-from typing import Optional, Literal, List, Dict, Any
+from functools import lru_cache
+from typing import Optional, Literal, List, Dict, Tuple, Any, AsyncIterator
 from dotenv import load_dotenv
 
 # Load environment variables first
 load_dotenv()
 
-app = FastAPI(title="AI Text Analyzer", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if gemini_provider is not None and GEMINI_HEALTH_PROBE:
+        gemini_provider.start_probe()
+    yield
+    # Shutdown
+    if gemini_provider is not None:
+        gemini_provider.stop_probe()
+    if _analysis_executor is not None:
+        _analysis_executor.shutdown(wait=False, cancel_futures=True)
+    if OPENAI_AVAILABLE:
+        await openai_client.close()
+
+app = FastAPI(title="AI Text Analyzer", version="1.0.0", lifespan=lifespan)
 
 # Initialize OpenAI client
+# One async client for the app, so GPT calls are awaited instead of blocking
+# the event loop. Its connection pool is bounded and keeps connections alive
+# between calls; calls beyond OPENAI_MAX_CONNECTIONS wait for a free one.
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+# Seconds per call (connect: to open a connection); retries get their own
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
 try:
-    from openai import OpenAI
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
     openai_api_key = os.getenv("OPENAI_API_KEY")
     openai_base_url = os.getenv("OPENAI_BASE_URL")
 
     if openai_api_key:
-        openai_client = OpenAI(api_key=openai_api_key, base_url=openai_base_url if openai_base_url else None)
+        openai_client = AsyncOpenAI(
+            api_key=openai_api_key,
+            base_url=openai_base_url if openai_base_url else None,
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+            ))
+        )
         OPENAI_AVAILABLE = True
     else:
         OPENAI_AVAILABLE = False
@@ -30,59 +80,609 @@ except ImportError:
     print("⚠️ Warning: 'openai' library not installed. Run 'pip install openai'.")
 
 # Initialize Gemini client
-try:
-    import google.generativeai as genai
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
+# Nothing is imported or probed at startup: google.generativeai is imported
+# and configured on first use, model handles are created once per worker
+# process and reused, and a background health probe started with the app
+# picks the first of GEMINI_MODELS the API key can use.
+GEMINI_MODELS = [name.strip() for name in
+                 os.getenv("GEMINI_MODELS", "gemini-1.5-flash,gemini-1.5-pro,gemini-pro").split(",") if name.strip()]
+GEMINI_HEALTH_PROBE = os.getenv("GEMINI_HEALTH_PROBE", "true").lower() in ("1", "true", "yes")
+
+class GeminiProvider:
+    """Lazily initialized Gemini client with cached model handles.
+
+    Used from the event loop; the import, the model handles and the probe's
+    API calls are run in worker threads so they never block it. The lazy
+    setup is guarded by a lock, since several threads may start it at once.
+    """
 
-    if gemini_api_key:
-        genai.configure(api_key=gemini_api_key)
-        # Test the connection with a simple model initialization
-        try:
-            # Try the newer model names first
-            test_model = genai.GenerativeModel('gemini-1.5-flash')
-            GEMINI_AVAILABLE = True
-            GEMINI_MODEL_NAME = 'gemini-1.5-flash'
-            print("✅ Gemini client initialized successfully with gemini-1.5-flash")
-        except Exception as model_error:
+    def __init__(self, api_key: str, model_names: List[str]):
+        self.api_key = api_key
+        self.model_names = model_names
+        # Used until the health probe finds out which model works
+        self.model_name = model_names[0]
+        self.status = "unchecked"
+        self.last_error = None
+        self._genai = None
+        self._models = {}
+        self._lock = threading.Lock()
+        self._probe_task = None
+
+    def _client(self):
+        with self._lock:
+            if self._genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._genai = genai
+            return self._genai
+
+    def _model(self, name: str):
+        genai = self._client()
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._models[name] = genai.GenerativeModel(name)
+            return model
+
+    async def get_model(self):
+        """Return the cached handle of the current model, creating it on first use."""
+        model = self._models.get(self.model_name)
+        if model is None:
+            model = await asyncio.to_thread(self._model, self.model_name)
+        return model
+
+    async def probe(self):
+        """Use the first configured model the API key can reach."""
+        errors = []
+        for name in self.model_names:
             try:
-                # Fallback to gemini-1.5-pro
-                test_model = genai.GenerativeModel('gemini-1.5-pro')
-                GEMINI_AVAILABLE = True
-                GEMINI_MODEL_NAME = 'gemini-1.5-pro'
-                print("✅ Gemini client initialized successfully with gemini-1.5-pro")
-            except Exception as fallback_error:
-                try:
-                    # Last fallback to gemini-pro (legacy)
-                    test_model = genai.GenerativeModel('gemini-pro')
-                    GEMINI_AVAILABLE = True
-                    GEMINI_MODEL_NAME = 'gemini-pro'
-                    print("✅ Gemini client initialized successfully with gemini-pro (legacy)")
-                except Exception as legacy_error:
-                    GEMINI_AVAILABLE = False
-                    GEMINI_MODEL_NAME = None
-                    print(f"⚠️ Warning: Gemini API key found but model initialization failed.")
-                    print(f"   Model errors: {str(model_error)[:100]}...")
-                    print(f"   This might be due to API key restrictions or regional limitations.")
-    else:
-        GEMINI_AVAILABLE = False
-        GEMINI_MODEL_NAME = None
-        print("⚠️ Warning: Gemini API key not found in .env. Gemini features will be disabled.")
+                await asyncio.to_thread(lambda: self._client().get_model(f"models/{name}"))
+            except Exception as e:
+                errors.append(f"{name}: {str(e)[:100]}")
+                continue
+            self.model_name = name
+            self.status = "ready"
+            self.last_error = None
+            print(f"✅ Gemini health probe: using {name}")
+            return
+        # Requests still try the first model; the probe only reports
+        self.status = "unreachable"
+        self.last_error = "; ".join(errors)
+        print(f"⚠️ Warning: Gemini health probe failed for every model: {self.last_error}")
+
+    def start_probe(self):
+        """Run the health probe in the background; startup doesn't wait for it."""
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self.probe())
+
+    def stop_probe(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+
+try:
+    # Only checks that the library is installed; importing it is deferred
+    GEMINI_LIBRARY_INSTALLED = importlib.util.find_spec("google.generativeai") is not None
 except ImportError:
-    GEMINI_AVAILABLE = False
-    GEMINI_MODEL_NAME = None
+    GEMINI_LIBRARY_INSTALLED = False
+
+gemini_api_key = os.getenv("GEMINI_API_KEY")
+gemini_provider = None
+if not GEMINI_LIBRARY_INSTALLED:
     print("⚠️ Warning: 'google-generativeai' library not installed. Run 'pip install google-generativeai'.")
+elif not gemini_api_key:
+    print("⚠️ Warning: Gemini API key not found in .env. Gemini features will be disabled.")
+elif not GEMINI_MODELS:
+    print("⚠️ Warning: GEMINI_MODELS is empty. Gemini features will be disabled.")
+else:
+    gemini_provider = GeminiProvider(gemini_api_key, GEMINI_MODELS)
+    print(f"✅ Gemini configured (models: {', '.join(GEMINI_MODELS)}); connects on first use")
+GEMINI_AVAILABLE = gemini_provider is not None
 
 # Try to import C++ module, with a clear fallback
 try:
     import text_analyzer  # Our C++ module compiled via setup.py
     CPP_MODULE_AVAILABLE = True
     print("✅ C++ 'text_analyzer' module loaded successfully.")
+    # Which build is running: default, optimized, native, pgo (see build_extension.py)
+    TEXT_ANALYZER_BUILD_INFO = text_analyzer.build_info()
+    print(f"   Build: {TEXT_ANALYZER_BUILD_INFO['variant']} v{TEXT_ANALYZER_BUILD_INFO['version']} "
+          f"({TEXT_ANALYZER_BUILD_INFO['compiler']}, {TEXT_ANALYZER_BUILD_INFO['simd_level']}; "
+          f"flags: {TEXT_ANALYZER_BUILD_INFO['flags'] or 'compiler defaults'})")
 except ImportError:
     CPP_MODULE_AVAILABLE = False
+    TEXT_ANALYZER_BUILD_INFO = None
     print("🛑 CRITICAL: C++ 'text_analyzer' module not found.")
     print("   Please run the build script: 'pip install .'")
     print("   Using pure Python fallback for now.")
 
+# Try to import NumPy for columnar batch results from the Python fallback
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# --- Word Splitting & Normalization ---
+# The Python fallback works on UTF-8 bytes with the C++ scanner's rules, so
+# results don't depend on whether the extension is built: bytes.split() breaks
+# words on ASCII whitespace only, every '.', '!' or '?' counts as a sentence
+# end, and words are looked up with ASCII letters lowercased and ASCII
+# punctuation removed.
+ASCII_WHITESPACE = b' \t\n\v\f\r'
+ASCII_LOWERCASE = bytes.maketrans(string.ascii_uppercase.encode(), string.ascii_lowercase.encode())
+ASCII_PUNCTUATION = string.punctuation.encode()
+# Longest lexicon key, in bytes, the C++ scanner looks up
+MAX_KEY_BYTES = 64
+
+def normalize_words(data: bytes) -> bytes:
+    """Lowercase ASCII letters and drop ASCII punctuation; whitespace is untouched."""
+    return data.translate(ASCII_LOWERCASE, ASCII_PUNCTUATION)
+
+def as_utf8(text) -> bytes:
+    """Return str or bytes-like input as UTF-8 bytes, the form the C++ module scans."""
+    if isinstance(text, str):
+        return text.encode('utf-8')
+    return bytes(text)
+
+# --- Syllables ---
+# Syllable and letter counts for the readability formulas, estimated from
+# normalized words exactly like word_shape() in analyzer.cpp.
+VOWELS = frozenset(b'aeiouy')
+CONSONANTS = frozenset(string.ascii_lowercase.encode()) - VOWELS
+
+@lru_cache(maxsize=65536)
+def word_shape(key: bytes) -> Tuple[int, int]:
+    """Return (syllables, letters) of a normalized word.
+
+    Syllables are vowel groups (a leading 'y' is a consonant), less a silent
+    final "e" and "-ed"/"-es" endings that don't add one; any word with a
+    letter has at least one. Letters are ASCII letters plus non-ASCII
+    characters, counted once per UTF-8 lead byte.
+    """
+    syllables = letters = 0
+    after_vowel = False
+    for i, c in enumerate(key):
+        vowel = c in VOWELS and (c != ord('y') or i > 0)
+        if vowel and not after_vowel:
+            syllables += 1
+        after_vowel = vowel
+        if ord('a') <= c <= ord('z') or c >= 0xC0:
+            letters += 1
+    if syllables > 1:
+        last, before, third = key[-1:], key[-2], key[-3]
+        consonant_le = before == ord('l') and third in CONSONANTS
+        if last == b'e' and before in CONSONANTS and not consonant_le:
+            syllables -= 1
+        elif last == b'd' and before == ord('e') and third in CONSONANTS and third not in b'td':
+            syllables -= 1
+        elif (last == b's' and before == ord('e') and third in CONSONANTS and third not in b'sxzcgh'
+              and not (third == ord('l') and len(key) >= 4 and key[-4] in CONSONANTS)):
+            syllables -= 1
+    if syllables == 0 and letters > 0:
+        syllables = 1
+    return syllables, letters
+
+def _shape_totals(keys) -> tuple:
+    """Return (syllables, complex_words, letters) for normalized words.
+
+    Words longer than MAX_KEY_BYTES (URLs, hashes, ...) add nothing, as in the
+    C++ scanner. Complex words have three or more syllables.
+    """
+    syllables = complex_words = letters = 0
+    # Each distinct word is looked at once
+    for key, count in Counter(keys).items():
+        if len(key) <= MAX_KEY_BYTES:
+            word_syllables, word_letters = word_shape(key)
+            syllables += word_syllables * count
+            letters += word_letters * count
+            if word_syllables >= 3:
+                complex_words += count
+    return syllables, complex_words, letters
+
+# --- Sentiment Lexicon ---
+# Word lists shared by the C++ module and the Python fallback. Several files
+# can be given, separated by os.pathsep; later files override earlier ones.
+SENTIMENT_LEXICON_PATHS = os.getenv(
+    "SENTIMENT_LEXICON",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "sentiment_lexicon.tsv")
+).split(os.pathsep)
+
+def load_sentiment_lexicon(paths: List[str]) -> Dict[bytes, float]:
+    """Read '<word> <weight>' lines, skipping blanks and '#' comments (same format as the C++ loader).
+
+    Returns a normalized UTF-8 word -> weight mapping.
+    """
+    terms = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            for line_no, line in enumerate(f, 1):
+                fields = line.split()
+                if not fields or fields[0].startswith(b'#'):
+                    continue
+                try:
+                    word, weight = fields
+                    weight = float(weight)
+                except ValueError:
+                    raise ValueError(f"{path}:{line_no}: expected '<word> <weight>'") from None
+                key = normalize_words(word)
+                # The C++ scanner never looks up longer keys
+                if 0 < len(key) <= MAX_KEY_BYTES:
+                    terms[key] = weight
+    return terms
+
+SENTIMENT_LEXICON = load_sentiment_lexicon(SENTIMENT_LEXICON_PATHS)
+if CPP_MODULE_AVAILABLE:
+    text_analyzer.load_lexicon(SENTIMENT_LEXICON_PATHS)
+print(f"✅ Sentiment lexicon loaded: {len(SENTIMENT_LEXICON)} terms")
+
+# --- Lexicon Registry ---
+# Requests can name a lexicon; "<name>.tsv" in LEXICON_DIR is compiled on
+# first use and kept in an LRU, so switching vocabularies per request only
+# costs a dictionary lookup. "default" is the SENTIMENT_LEXICON files. The
+# admin endpoints reload a lexicon from disk or change which one requests
+# get when they don't name one, without a restart.
+LEXICON_DIR = os.getenv("LEXICON_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicons"))
+LEXICON_CACHE_SIZE = int(os.getenv("LEXICON_CACHE_SIZE", "16"))
+DEFAULT_LEXICON_NAME = "default"
+LEXICON_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+class CompiledLexicon:
+    """A lexicon compiled for both analyzers: a dict for the Python fallback, a text_analyzer.Lexicon for C++."""
+
+    def __init__(self, name: str, terms: Dict[bytes, float], paths: Tuple[str, ...] = (),
+                 digest: Optional[str] = None):
+        self.name = name
+        self.terms = terms
+        self.paths = tuple(paths)
+        self.native = text_analyzer.Lexicon(terms) if CPP_MODULE_AVAILABLE else None
+        # Shared by all threads: the module keeps its scan buffers per thread
+        self.analyzer = text_analyzer.Analyzer(self.native) if CPP_MODULE_AVAILABLE else None
+        # Part of the result cache key, so results scored with other terms are never reused
+        self.digest = digest or hashlib.sha256(repr(sorted(terms.items())).encode()).hexdigest()[:12]
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+
+    def __reduce__(self):
+        # The native table can't be pickled; a worker process compiles its own
+        # from the terms, once per lexicon rather than once per call
+        return (unpickle_lexicon, (self.name, self.digest, self.terms, self.paths))
+
+    def info(self) -> Dict[str, Any]:
+        return {"name": self.name, "terms": len(self.terms), "digest": self.digest,
+                "paths": list(self.paths), "loaded_at": self.loaded_at}
+
+# Lexicons compiled from pickles by a process-pool worker, by (name, digest).
+# Bounded like the registry, so reloaded lexicons don't pile up
+_unpickled_lexicons = OrderedDict()
+
+def unpickle_lexicon(name: str, digest: str, terms: Dict[bytes, float], paths: Tuple[str, ...]) -> CompiledLexicon:
+    """Return this process's compiled copy of a pickled lexicon, compiling it on first use."""
+    key = (name, digest)
+    lexicon = _unpickled_lexicons.get(key)
+    if lexicon is None:
+        lexicon = _unpickled_lexicons[key] = CompiledLexicon(name, terms, paths, digest)
+        while len(_unpickled_lexicons) > LEXICON_CACHE_SIZE + 1:
+            _unpickled_lexicons.popitem(last=False)
+    _unpickled_lexicons.move_to_end(key)
+    return lexicon
+
+class LexiconRegistry:
+    """Bounded LRU of compiled lexicons by name, plus the built-in and current default ones.
+
+    Only used from the event loop, so it needs no locking; lexicons are
+    compiled on a worker thread. A lexicon that is reloaded or evicted stays
+    alive for the analyses still holding it.
+    """
+
+    def __init__(self, directory: str, max_entries: int, builtin: CompiledLexicon):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._builtin = builtin
+        # Held here rather than in the LRU, so it is never evicted
+        self._default = builtin
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.compiles = 0
+        self.evictions = 0
+
+    @property
+    def default_name(self) -> str:
+        return self._default.name
+
+    def paths(self, name: str) -> Tuple[str, ...]:
+        """The files a lexicon is read from; KeyError if there is no lexicon by that name."""
+        if name == DEFAULT_LEXICON_NAME:
+            return tuple(SENTIMENT_LEXICON_PATHS)
+        path = os.path.join(self.directory, f"{name}.tsv")
+        # The pattern keeps names from reaching outside LEXICON_DIR
+        if not LEXICON_NAME_PATTERN.fullmatch(name) or not os.path.isfile(path):
+            raise KeyError(name)
+        return (path,)
+
+    async def get(self, name: Optional[str] = None) -> CompiledLexicon:
+        """Return a compiled lexicon, or the default one if name is None.
+
+        KeyError if unknown; OSError or ValueError if its file can't be read or parsed.
+        """
+        if name is None or name == self._default.name:
+            lexicon = self._default
+        elif name == DEFAULT_LEXICON_NAME:
+            lexicon = self._builtin
+        else:
+            lexicon = self._entries.get(name)
+            if lexicon is None:
+                return await self.reload(name)
+            self._entries.move_to_end(name)
+        self.hits += 1
+        return lexicon
+
+    async def reload(self, name: str) -> CompiledLexicon:
+        """Compile a lexicon from its files and swap it in for new requests.
+
+        KeyError if unknown; OSError or ValueError if its file can't be read or parsed.
+        """
+        paths = self.paths(name)
+        # Reading, hashing and building the native table would stall every other request
+        lexicon = await asyncio.to_thread(lambda: CompiledLexicon(name, load_sentiment_lexicon(paths), paths))
+        self.compiles += 1
+        if name == DEFAULT_LEXICON_NAME:
+            self._builtin = lexicon
+        else:
+            self._entries[name] = lexicon
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if name == self._default.name:
+            self._default = lexicon
+        return lexicon
+
+    async def set_default(self, name: str) -> CompiledLexicon:
+        """Make a lexicon the one used by requests that don't name one; errors as for get()."""
+        self._default = await self.get(name)
+        return self._default
+
+    def available(self) -> List[str]:
+        """Names requests can use: "default" and the .tsv files in the lexicon directory."""
+        names = []
+        if os.path.isdir(self.directory):
+            names = sorted(entry[:-4] for entry in os.listdir(self.directory)
+                           if entry.endswith(".tsv") and LEXICON_NAME_PATTERN.fullmatch(entry[:-4]))
+        return [DEFAULT_LEXICON_NAME] + [name for name in names if name != DEFAULT_LEXICON_NAME]
+
+    def stats(self) -> Dict[str, Any]:
+        loaded = {lexicon.name: lexicon for lexicon in (self._builtin, self._default, *self._entries.values())}
+        return {
+            "default": self.default_name,
+            "available": self.available(),
+            "loaded": [lexicon.info() for lexicon in loaded.values()],
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "compiles": self.compiles,
+            "evictions": self.evictions
+        }
+
+lexicon_registry = LexiconRegistry(
+    LEXICON_DIR, LEXICON_CACHE_SIZE,
+    CompiledLexicon(DEFAULT_LEXICON_NAME, SENTIMENT_LEXICON, SENTIMENT_LEXICON_PATHS)
+)
+
+# --- Stop Words ---
+# Words left out of top terms and n-grams, shared by the C++ module and the
+# Python fallback. Several files can be given, separated by os.pathsep.
+STOP_WORDS_PATHS = os.getenv(
+    "STOP_WORDS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "stop_words.txt")
+).split(os.pathsep)
+
+def load_stop_words(paths: List[str]) -> frozenset:
+    """Read one word per line, skipping blanks and '#' comments (same format as the C++ loader)."""
+    words = set()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for line_no, line in enumerate(f, 1):
+                fields = line.split()
+                if not fields or fields[0].startswith(b'#'):
+                    continue
+                if len(fields) != 1:
+                    raise ValueError(f"{path}:{line_no}: expected one word per line")
+                key = normalize_words(fields[0])
+                if key:
+                    words.add(key)
+    return frozenset(words)
+
+STOP_WORDS = load_stop_words(STOP_WORDS_PATHS)
+if CPP_MODULE_AVAILABLE:
+    text_analyzer.load_stop_words(STOP_WORDS_PATHS)
+
+# --- Sentiment Mode ---
+# "lexicon" sums the weights of the lexicon terms in a text; "rules" applies
+# VADER-style heuristics per sentence on top of them: negations, intensifiers
+# and dampeners in the three words before a term, ALL CAPS, "but", and '!'/'?'
+# emphasis. Both the C++ module and the Python fallback implement each mode.
+SENTIMENT_MODES = ("lexicon", "rules")
+# "lexicon" stays the default so stored sentiment scores keep their meaning
+SENTIMENT_MODE = os.getenv("SENTIMENT_MODE", "lexicon")
+if SENTIMENT_MODE not in SENTIMENT_MODES:
+    raise ValueError(f"SENTIMENT_MODE must be 'lexicon' or 'rules', got '{SENTIMENT_MODE}'")
+if CPP_MODULE_AVAILABLE:
+    text_analyzer.set_sentiment_mode(SENTIMENT_MODE)
+
+# The same constants and word lists as the rule-based sentiment in analyzer.cpp
+BOOSTER_INCREMENT = 0.293
+CAPS_INCREMENT = 0.733
+NEGATION_SCALAR = -0.74
+WINDOW_DECAY = (1.0, 0.95, 0.9)  # Modifier one, two and three words back
+BEFORE_BUT_SCALAR = 0.5
+AFTER_BUT_SCALAR = 1.5
+EXCLAMATION_INCREMENT = 0.292
+MAX_EXCLAMATIONS = 4
+QUESTION_INCREMENT = 0.18
+MAX_QUESTION_EMPHASIS = 0.96
+MAX_SENTENCE_HITS = 4096
+
+NEGATION_WORDS = (
+    b"aint", b"arent", b"cannot", b"cant", b"couldnt", b"darent", b"didnt", b"doesnt", b"dont", b"hadnt",
+    b"hasnt", b"havent", b"isnt", b"mightnt", b"mustnt", b"neither", b"never", b"none", b"nope", b"nor",
+    b"not", b"nothing", b"nowhere", b"oughtnt", b"shant", b"shouldnt", b"wasnt", b"werent", b"without",
+    b"wont", b"wouldnt", b"rarely", b"seldom", b"despite"
+)
+INTENSIFIER_WORDS = (
+    b"absolutely", b"amazingly", b"awfully", b"completely", b"considerably", b"decidedly", b"deeply",
+    b"enormously", b"entirely", b"especially", b"exceptionally", b"extremely", b"fabulously", b"fully",
+    b"greatly", b"highly", b"hugely", b"incredibly", b"intensely", b"majorly", b"more", b"most",
+    b"particularly", b"purely", b"quite", b"really", b"remarkably", b"so", b"substantially", b"thoroughly",
+    b"totally", b"tremendously", b"uber", b"unbelievably", b"unusually", b"utterly", b"very"
+)
+DAMPENER_WORDS = (
+    b"almost", b"barely", b"hardly", b"less", b"little", b"marginally", b"occasionally", b"partly",
+    b"scarcely", b"slightly", b"somewhat"
+)
+# Negations map to NEGATION_SCALAR, the others to the increment they add to the next terms
+SENTIMENT_MODIFIERS = {
+    **dict.fromkeys(INTENSIFIER_WORDS, BOOSTER_INCREMENT),
+    **dict.fromkeys(DAMPENER_WORDS, -BOOSTER_INCREMENT),
+    **dict.fromkeys(NEGATION_WORDS, NEGATION_SCALAR),
+}
+
+# Words that need more than a position in the sentence under the rules
+RULE_WORDS = frozenset(SENTIMENT_MODIFIERS) | {b'but'}
+# Deleted to leave only the '.', '!' and '?' of each word
+NON_TERMINATOR_BYTES = bytes(c for c in range(256) if c not in b'.!? ')
+
+def _is_all_caps(word: bytes) -> bool:
+    """True for a raw word with ASCII capitals and no ASCII lowercase letters."""
+    return word.upper() == word != word.lower()
+
+def _compact_word(word: bytes) -> bytes:
+    """A short stand-in for a long raw word that scores the same under the rules.
+
+    Keeps its case and its '.', '!' and '?'; no sentence has more '!' or '?'
+    than the word ending it, and more than four of either count as four.
+    """
+    return ((b'A' if word.lower() != word else b'') + (b'a' if word.upper() != word else b'') +
+            b'!' * min(word.count(b'!'), 4) + b'?' * min(word.count(b'?'), 4) + (b'.' if b'.' in word else b''))
+
+class SentimentRules:
+    """Rule-based sentiment of a text, one sentence at a time, like SentimentRules in analyzer.cpp.
+
+    A sentence's terms are resolved at its end, once it is known whether it
+    holds "but", mixed case, '!' or '?'. Sentences with more than
+    MAX_SENTENCE_HITS terms are scored in parts.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._hits = []  # (valence, caps increment, after "but")
+        self._position = 0  # Words seen in the sentence
+        self._window = []  # (position, weight) of up to three latest modifiers
+        self._but_seen = False
+        self._mixed_case = False
+
+    def add_word(self, key: Optional[bytes], weight: Optional[float], word: bytes):
+        """Add the next word: its normalized key (None if longer than MAX_KEY_BYTES),
+        lexicon weight (None if it isn't a term) and raw form."""
+        self._position += 1
+        if not self._mixed_case and not _is_all_caps(word):
+            self._mixed_case = True
+        if weight is None and key not in RULE_WORDS:
+            return
+        modifier = SENTIMENT_MODIFIERS.get(key)
+        # Intensifiers and dampeners only modify other terms
+        if weight and (modifier is None or modifier == NEGATION_SCALAR):
+            valence = weight
+            caps = (CAPS_INCREMENT if weight > 0 else -CAPS_INCREMENT) if _is_all_caps(word) else 0.0
+            for position, prior in reversed(self._window):
+                distance = self._position - position
+                if distance > len(WINDOW_DECAY):
+                    break
+                if prior == NEGATION_SCALAR:
+                    valence *= NEGATION_SCALAR
+                    caps *= NEGATION_SCALAR
+                else:
+                    valence += (-prior if valence < 0 else prior) * WINDOW_DECAY[distance - 1]
+            self._hits.append((valence, caps, self._but_seen))
+        if modifier is not None:
+            self._window = self._window[-2:] + [(self._position, modifier)]
+        if key == b'but':
+            self._but_seen = True
+
+    def full(self) -> bool:
+        return len(self._hits) >= MAX_SENTENCE_HITS
+
+    def end_sentence(self, exclamations: int = 0, questions: int = 0) -> Tuple[float, float]:
+        """Resolve the sentence so far into (positive, negative) scores and start a new one.
+
+        Only the word ending a sentence can hold '!' or '?'; pass their counts in it.
+        """
+        positive = negative = total = 0.0
+        for valence, caps, after_but in self._hits:
+            value = valence + (caps if self._mixed_case else 0.0)
+            if self._but_seen:
+                value *= AFTER_BUT_SCALAR if after_but else BEFORE_BUT_SCALAR
+            if value > 0:
+                positive += value
+            elif value < 0:
+                negative -= value
+            total += value
+        emphasis = min(exclamations, MAX_EXCLAMATIONS) * EXCLAMATION_INCREMENT
+        if questions > 1:
+            emphasis += questions * QUESTION_INCREMENT if questions <= 3 else MAX_QUESTION_EMPHASIS
+        if total > 0:
+            positive += emphasis
+        elif total < 0:
+            negative += emphasis
+        self._reset()
+        return positive, negative
+
+    def score_words(self, keys, words, lexicon, positive: float = 0.0, negative: float = 0.0) -> tuple:
+        """Add words (normalized keys with their raw forms) and return the
+        positive and negative totals with each sentence they end added."""
+        words = list(words)
+        terminators = b' '.join(words).translate(None, NON_TERMINATOR_BYTES).split(b' ')
+        for key, word, ends in zip(keys, words, terminators):
+            # Other words only move the position once the sentence is known to
+            # be mixed case. Keys longer than MAX_KEY_BYTES are never terms or modifiers.
+            if key in lexicon or key in RULE_WORDS or not self._mixed_case:
+                self.add_word(key, lexicon.get(key), word)
+            else:
+                self._position += 1
+            if ends or len(self._hits) >= MAX_SENTENCE_HITS:
+                sentence_positive, sentence_negative = self.end_sentence(ends.count(b'!'), ends.count(b'?'))
+                positive += sentence_positive
+                negative += sentence_negative
+        return positive, negative
+
+    def finish(self, positive: float, negative: float) -> tuple:
+        """Add the last, unterminated sentence to the totals."""
+        sentence_positive, sentence_negative = self.end_sentence()
+        return positive + sentence_positive, negative + sentence_negative
+
+# --- Analysis Worker Pool ---
+# Texts with at least this many characters are analyzed in a worker pool so a
+# large paste doesn't freeze the event loop; smaller ones run inline.
+ANALYZE_OFFLOAD_THRESHOLD = int(os.getenv("ANALYZE_OFFLOAD_THRESHOLD", "100000"))
+ANALYZE_MAX_WORKERS = int(os.getenv("ANALYZE_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# "thread" suits the C++ module, which releases the GIL while it scans; the
+# pure Python fallback holds the GIL and needs "process" to run in parallel.
+ANALYZE_POOL = os.getenv("ANALYZE_POOL", "thread" if CPP_MODULE_AVAILABLE else "process")
+# Native threads the C++ module splits one large text across (0 = one per
+# core); the Python fallback always scans a text serially
+ANALYZE_TEXT_THREADS = int(os.getenv("ANALYZE_TEXT_THREADS", "1"))
+
+_analysis_executor: Optional[Executor] = None
+
+def get_analysis_executor() -> Executor:
+    """Create the bounded analysis pool on first use."""
+    global _analysis_executor
+    if _analysis_executor is None:
+        if ANALYZE_POOL == "process":
+            _analysis_executor = ProcessPoolExecutor(max_workers=ANALYZE_MAX_WORKERS)
+        else:
+            _analysis_executor = ThreadPoolExecutor(max_workers=ANALYZE_MAX_WORKERS, thread_name_prefix="analyzer")
+    return _analysis_executor
+
 # --- Database Setup ---
 DB_FILE = 'analyzer.db'
 
@@ -99,51 +699,837 @@ def init_db():
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            cache_key TEXT PRIMARY KEY,
+            analysis_id INTEGER NOT NULL REFERENCES analyses(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS suggestion_cache (
+            cache_key TEXT PRIMARY KEY,
+            ai_provider TEXT NOT NULL,
+            model TEXT NOT NULL,
+            suggestions TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_suggestion_cache_last_used ON suggestion_cache (last_used_at)")
     conn.commit()
     conn.close()
 
 init_db()
 
+# --- Analysis Result Cache ---
+# Resubmitted texts (templates, retries, tabbing back) are answered from a
+# cache keyed by a hash of the text, the analyzer version and the AI provider
+# instead of re-running the analysis, calling the LLM and storing another row.
+# Recent results are kept in memory; with ANALYSIS_CACHE_PERSIST the
+# analysis_cache table maps keys to stored analyses, so hits survive restarts.
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))  # 0 disables the cache
+ANALYSIS_CACHE_PERSIST = os.getenv("ANALYSIS_CACHE_PERSIST", "true").lower() in ("1", "true", "yes")
+# The fallback gives the same metrics as this version of the C++ module
+PYTHON_ANALYZER_VERSION = "1.3"
+# Results computed by a different analyzer, sentiment mode or stop words are
+# never reused; the lexicon's digest is part of each key
+ANALYZER_VERSION = "{}-{}-{}-{}".format(
+    "cpp" if CPP_MODULE_AVAILABLE else "python",
+    text_analyzer.__version__ if CPP_MODULE_AVAILABLE else PYTHON_ANALYZER_VERSION,
+    SENTIMENT_MODE,
+    hashlib.sha256(repr(sorted(STOP_WORDS)).encode()).hexdigest()[:12]
+)
+
+class AnalysisCache:
+    """Bounded LRU of /analyze results, optionally backed by the analysis_cache table.
+
+    Only used from the event loop, so it needs no locking.
+    """
+
+    def __init__(self, max_entries: int, persist: bool):
+        self.max_entries = max_entries
+        self.persist = persist
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(text: str, ai_provider: Optional[str], top_k: int = 0, sentences: bool = False,
+                 lexicon_digest: str = "") -> str:
+        digest = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+        key = f"{digest}:{ANALYZER_VERSION}:{lexicon_digest}:{ai_provider or 'none'}"
+        if top_k:
+            key += f":top{top_k}"
+        return f"{key}:sentences" if sentences else key
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        if self.persist:
+            entry = self._load(key)
+            if entry is not None:
+                self.persistent_hits += 1
+                self._remember(key, entry)
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, entry: Dict[str, Any], cursor: sqlite3.Cursor):
+        """Cache a result; cursor is the transaction that stored its analysis row."""
+        if not self.enabled:
+            return
+        self._remember(key, entry)
+        if self.persist:
+            cursor.execute(
+                "INSERT OR REPLACE INTO analysis_cache (cache_key, analysis_id) VALUES (?, ?)",
+                (key, entry["analysis_id"])
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "persistent": self.persist,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+            "analyzer_version": ANALYZER_VERSION
+        }
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            conn = sqlite3.connect(DB_FILE)
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                """SELECT a.id, a.cpp_result, a.ai_suggestions, a.ai_provider
+                   FROM analysis_cache c JOIN analyses a ON a.id = c.analysis_id
+                   WHERE c.cache_key = ?""",
+                (key,)
+            ).fetchone()
+            conn.close()
+            if row is None:
+                return None
+            cpp_analysis = json.loads(row["cpp_result"])
+            return {
+                "cpp_analysis": cpp_analysis,
+                "top_terms": cpp_analysis.pop("top_terms", None),
+                "sentences": cpp_analysis.pop("sentences", None),
+                "ai_suggestions": row["ai_suggestions"],
+                "ai_provider": row["ai_provider"],
+                "analysis_id": row["id"]
+            }
+        except (sqlite3.Error, json.JSONDecodeError, TypeError) as e:
+            print(f"⚠️ Warning: analysis cache lookup failed: {e}")
+            return None
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_PERSIST)
+
+def is_ai_fallback_message(suggestions: Optional[str]) -> bool:
+    """True for the mock/error text returned when an AI provider can't be used; it isn't cached."""
+    return bool(suggestions) and ("API Error" in suggestions or "not available" in suggestions)
+
+# --- AI Suggestion Cache ---
+# LLM suggestions are the slowest and only paid part of a request, so they
+# are cached on their own, independently of the analysis options: keyed by
+# provider, model, prompt version, a hash of the text with whitespace
+# collapsed, and the metric values as the prompt shows them. Recent entries
+# are kept in memory in front of the suggestion_cache table; entries expire
+# after SUGGESTION_CACHE_TTL seconds, and the table keeps at most
+# SUGGESTION_CACHE_MAX_ROWS, dropping the least recently used.
+SUGGESTION_CACHE_SIZE = int(os.getenv("SUGGESTION_CACHE_SIZE", "1024"))  # 0 disables the cache
+SUGGESTION_CACHE_TTL = float(os.getenv("SUGGESTION_CACHE_TTL", str(7 * 24 * 3600)))
+SUGGESTION_CACHE_MAX_ROWS = int(os.getenv("SUGGESTION_CACHE_MAX_ROWS", "100000"))  # 0 keeps them in memory only
+# Bump when a prompt changes, so suggestions for the old one are not reused
+PROMPT_VERSION = "1"
+
+def prompt_metrics(cpp_result: dict) -> tuple:
+    """The metrics the suggestion prompts include, formatted as they show them."""
+    return (
+        f"{cpp_result.get('word_count', 0)}",
+        f"{cpp_result.get('sentence_count', 0)}",
+        f"{cpp_result.get('readability_score', 0):.2f}",
+        f"{cpp_result.get('flesch_kincaid_grade', 0):.1f}",
+        f"{cpp_result.get('sentiment_score', 0):.2f}"
+    )
+
+class SuggestionCache:
+    """TTL-bounded LRU of AI suggestions backed by the suggestion_cache table.
+
+    Only used from the event loop, so it needs no locking.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_rows: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # key -> (suggestions, created_at)
+        # Rows added since the table was last trimmed to max_rows
+        self._rows_added = max_rows
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(ai_provider: str, model: str, text: str, cpp_result: dict) -> str:
+        text_digest = hashlib.sha256(" ".join(text.split()).encode('utf-8', 'surrogatepass')).hexdigest()
+        fields = (PROMPT_VERSION, ai_provider, model, text_digest) + prompt_metrics(cpp_result)
+        return hashlib.sha256("\0".join(fields).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached suggestions for key, or None if missing or expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            del self._entries[key]
+            self.expired += 1
+        elif self.max_rows > 0:
+            entry = self._load(key, now)
+            if entry is not None:
+                self.persistent_hits += 1
+                self._remember(key, entry)
+                return entry[0]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, ai_provider: str, model: str, suggestions: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        self._remember(key, (suggestions, now))
+        if self.max_rows > 0:
+            self._store(key, ai_provider, model, suggestions, now)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_rows": self.max_rows,
+            "ttl_seconds": self.ttl,
+            "prompt_version": PROMPT_VERSION,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0
+        }
+
+    def _remember(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str, now: float) -> Optional[tuple]:
+        try:
+            conn = sqlite3.connect(DB_FILE)
+            row = conn.execute("SELECT suggestions, created_at FROM suggestion_cache WHERE cache_key = ?",
+                               (key,)).fetchone()
+            if row is not None and now - row[1] >= self.ttl:
+                conn.execute("DELETE FROM suggestion_cache WHERE cache_key = ?", (key,))
+                self.expired += 1
+                row = None
+            elif row is not None:
+                conn.execute("UPDATE suggestion_cache SET last_used_at = ? WHERE cache_key = ?", (now, key))
+            conn.commit()
+            conn.close()
+            return row
+        except sqlite3.Error as e:
+            print(f"⚠️ Warning: suggestion cache lookup failed: {e}")
+            return None
+
+    def _store(self, key: str, ai_provider: str, model: str, suggestions: str, now: float):
+        try:
+            conn = sqlite3.connect(DB_FILE)
+            conn.execute(
+                """INSERT OR REPLACE INTO suggestion_cache
+                   (cache_key, ai_provider, model, suggestions, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)""",
+                (key, ai_provider, model, suggestions, now, now)
+            )
+            self._rows_added += 1
+            # Counting rows costs a table scan, so the table is only checked
+            # once enough rows may have been added to overflow it
+            if self._rows_added > self.max_rows // 10:
+                self._rows_added = 0
+                conn.execute("DELETE FROM suggestion_cache WHERE created_at <= ?", (now - self.ttl,))
+                excess = conn.execute("SELECT COUNT(*) FROM suggestion_cache").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    conn.execute(
+                        """DELETE FROM suggestion_cache WHERE cache_key IN
+                           (SELECT cache_key FROM suggestion_cache ORDER BY last_used_at LIMIT ?)""",
+                        (excess,)
+                    )
+                    self.evictions += excess
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Warning: suggestion cache update failed: {e}")
+
+suggestion_cache = SuggestionCache(SUGGESTION_CACHE_SIZE, SUGGESTION_CACHE_TTL, SUGGESTION_CACHE_MAX_ROWS)
+
+# --- Request Coalescing ---
+# Identical requests that arrive while the first is still being computed
+# (a shared document pasted by many users at once) join that computation
+# instead of starting their own: one analysis, one LLM call and one stored
+# row, whose result every request gets. Requests are identical when they
+# have the same result cache key. Streaming requests that join receive the
+# suggestions generated so far, then the rest as they arrive.
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() in ("1", "true", "yes")
+
+class AnalysisFlight:
+    """One in-flight /analyze computation, shared by the requests waiting on it.
+
+    The computation runs in its own task, so a request that goes away doesn't
+    cancel it for the others; it is cancelled once no request waits on it.
+    Requests count as waiting from the moment they join; each then calls
+    wait() or follow() once.
+    """
+
+    def __init__(self):
+        # ("metrics", data) and ("token", text) events, in the order published
+        self.published = []
+        self.result = asyncio.get_running_loop().create_future()
+        self.waiters = 0
+        # Cancelled because every request went away
+        self.abandoned = False
+        self._changed = asyncio.Event()
+        self._task = None
+        self._on_finished = None
+        self._finished = False
+
+    def start(self, compute, on_finished):
+        self._on_finished = on_finished
+        self._task = asyncio.create_task(self._run(compute))
+        self._task.add_done_callback(lambda task: self._finish())
+
+    def publish(self, event: str, data):
+        self.published.append((event, data))
+        self._notify()
+
+    async def wait(self) -> Dict[str, Any]:
+        """Return the stored result, or raise the computation's error."""
+        try:
+            # Unlike awaiting the future, doesn't cancel it if this request is cancelled
+            await asyncio.wait((self.result,))
+            return self._outcome()
+        finally:
+            self._leave()
+
+    async def follow(self) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield the published events, then ("done", ...) once the result is stored."""
+        try:
+            sent = 0
+            while True:
+                # Taken before checking, so a publish made while we yield isn't missed
+                changed = self._changed
+                while sent < len(self.published):
+                    yield self.published[sent]
+                    sent += 1
+                if self.result.done():
+                    break
+                await changed.wait()
+            result = self._outcome()
+            yield "done", {"analysis_id": result["analysis_id"], "ai_suggestions": result["ai_suggestions"]}
+        finally:
+            self._leave()
+
+    async def _run(self, compute):
+        try:
+            self.result.set_result(await compute(self))
+        except Exception as e:
+            self.result.set_exception(e)
+            # Marks the error as retrieved even if every request has gone
+            self.result.exception()
+
+    def _outcome(self) -> Dict[str, Any]:
+        # A cancelled computation is an error for its requests, not a
+        # CancelledError that would look like the request itself was cancelled
+        if self.result.cancelled():
+            raise RuntimeError("The analysis was cancelled before it finished")
+        return self.result.result()
+
+    def _finish(self, abandoned: bool = False):
+        if self._finished:
+            return
+        self._finished = True
+        self.abandoned = abandoned
+        # Cancelled, possibly before it even started
+        if not self.result.done():
+            self.result.cancel()
+        self._on_finished()
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _leave(self):
+        self.waiters -= 1
+        if self.waiters == 0 and not self.result.done():
+            # Unregistered first, so an identical request arriving while the
+            # task unwinds starts a new computation instead of joining this one
+            self._finish(abandoned=True)
+            self._task.cancel()
+
+class AnalysisFlights:
+    """Registry of in-flight computations by result cache key, with coalescing counters.
+
+    Only used from the event loop, so it needs no locking.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._flights = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def join(self, key: str, compute, shared: bool = True) -> AnalysisFlight:
+        """Return the in-flight computation for key, starting compute(flight) if there is none.
+
+        The caller is counted as waiting on it, and must call its wait() or
+        follow(). shared=False always starts a new computation that no other
+        request joins.
+        """
+        self.requests += 1
+        shared = shared and self.enabled
+        flight = self._flights.get(key) if shared else None
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            flight = AnalysisFlight()
+            if shared:
+                self._flights[key] = flight
+            flight.start(compute, lambda: self._finished(key, flight))
+        flight.waiters += 1
+        return flight
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "requests": self.requests,
+            "computations": self.requests - self.coalesced,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": self.coalesced / self.requests if self.requests else 0.0,
+            "abandoned": self.abandoned
+        }
+
+    def _finished(self, key: str, flight: AnalysisFlight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.abandoned:
+            self.abandoned += 1
+
+analysis_flights = AnalysisFlights(REQUEST_COALESCING)
+
 # --- Fallback & Helper Functions ---
 
-def python_text_analysis(text: str) -> dict:
-    """Python fallback for text analysis when C++ module is not available."""
-    import re
-    words = text.split()
-    word_count = len(words)
-    sentences = re.split(r'[.!?]+', text)
-    sentence_count = len([s for s in sentences if s.strip()])
-    
-    if sentence_count > 0:
-        avg_words_per_sentence = word_count / sentence_count
-        readability_score = max(0, min(1, (20 - avg_words_per_sentence) / 20))
+def _sentiment_totals(keys, lexicon, positive: float = 0.0, negative: float = 0.0) -> tuple:
+    """Add the positive and negative weights of normalized words to the totals, in text order like the C++ scanner."""
+    # filter/map keep the per-word loop in C; only lexicon hits reach Python
+    for weight in map(lexicon.__getitem__, filter(lexicon.__contains__, keys)):
+        if weight > 0:
+            positive += weight
+        elif weight < 0:
+            negative -= weight
+    return positive, negative
+
+def _scan_text(data: bytes, lexicon, rules: bool = False) -> tuple:
+    """Return (word_count, sentence_count, syllable_count, complex_word_count,
+    letter_count, positive, negative) for a whole UTF-8 text; rules selects
+    the rule-based sentiment."""
+    sentence_count = data.count(b'.') + data.count(b'!') + data.count(b'?')
+    if rules:
+        words = data.split()
+        # One key per word, punctuation-only words included, so keys line up with words
+        keys = normalize_words(b' '.join(words)).split(b' ') if words else []
+        scorer = SentimentRules()
+        positive, negative = scorer.finish(*scorer.score_words(keys, words, lexicon))
+        return (len(words), sentence_count, *_shape_totals(keys), positive, negative)
+    word_count = len(data.split())
+    # Normalizing never adds or removes whitespace, so the normalized text
+    # splits into the same words (minus punctuation-only ones, which have no
+    # letters and can't match)
+    keys = normalize_words(data).split()
+    positive, negative = _sentiment_totals(keys, lexicon)
+    return (word_count, sentence_count, *_shape_totals(keys), positive, negative)
+
+# Batch result columns and their NumPy types, in text_analyzer's order
+METRIC_DTYPE = [('word_count', '<i8'), ('sentence_count', '<i8'), ('syllable_count', '<i8'),
+                ('readability_score', '<f8'), ('sentiment_score', '<f8'), ('flesch_reading_ease', '<f8'),
+                ('flesch_kincaid_grade', '<f8'), ('gunning_fog', '<f8'), ('smog_index', '<f8'),
+                ('coleman_liau_index', '<f8')]
+
+def _readability(words, sentences, syllables, complex_words, letters, sqrt=math.sqrt) -> dict:
+    """Standard readability indices from the raw counts of a text with words.
+
+    Evaluates the same expressions in the same order as the C++ module, so
+    results match to the last bit. words and sentences are floats; pass
+    NumPy arrays and sqrt=np.sqrt to compute a whole batch at once.
+    """
+    words_per_sentence = words / sentences
+    syllables_per_word = syllables / words
+    return {
+        'flesch_reading_ease': 206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word,
+        'flesch_kincaid_grade': 0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59,
+        'gunning_fog': 0.4 * (words_per_sentence + 100.0 * complex_words / words),
+        'smog_index': 1.0430 * sqrt(complex_words * 30.0 / sentences) + 3.1291,
+        'coleman_liau_index': 0.0588 * (100.0 * letters / words) - 0.296 * (100.0 * sentences / words) - 15.8,
+    }
+
+def _metrics(empty: bool, word_count: int, sentence_count: int, syllable_count: int, complex_word_count: int,
+             letter_count: int, positive: float, negative: float) -> dict:
+    """Turn raw counts into the metrics dictionary returned by text_analyzer."""
+    if sentence_count == 0 and word_count > 0:
+        sentence_count = 1  # Assume at least one sentence if there's text
+
+    result = {
+        'word_count': float(word_count),
+        'sentence_count': float(sentence_count),
+        'syllable_count': float(syllable_count),
+        'readability_score': 0.0 if empty else 0.5,
+        'sentiment_score': 0.5
+    }
+    if word_count > 0:
+        indices = _readability(float(word_count), float(sentence_count), syllable_count,
+                               complex_word_count, letter_count)
+        result.update(indices)
+        # Flesch Reading Ease on a 0-1 scale: 1.0 is very easy (100+), 0.0 very hard (0 or below)
+        result['readability_score'] = max(0.0, min(1.0, indices['flesch_reading_ease'] / 100.0))
     else:
-        readability_score = 0.5
-
-    positive_words = {'good', 'great', 'excellent', 'amazing', 'love', 'happy', 'success'}
-    negative_words = {'bad', 'terrible', 'awful', 'hate', 'sad', 'negative', 'failure'}
-    
-    positive_count = sum(1 for word in words if word.lower() in positive_words)
-    negative_count = sum(1 for word in words if word.lower() in negative_words)
-    
-    sentiment_score = 0.5
-    if positive_count + negative_count > 0:
-        sentiment_score = positive_count / (positive_count + negative_count)
+        result.update(dict.fromkeys(('flesch_reading_ease', 'flesch_kincaid_grade', 'gunning_fog',
+                                     'smog_index', 'coleman_liau_index'), 0.0))
+    if positive + negative > 0:
+        result['sentiment_score'] = positive / (positive + negative)
+    return result
+
+class PythonTextAnalyzer:
+    """Pure Python counterpart of text_analyzer.Analyzer.
+
+    feed() a document in chunks of any size, then call finalize() for the
+    metrics. Only the current partial word is kept between chunks, so memory
+    use doesn't depend on the document size.
+    """
+
+    def __init__(self, lexicon: Optional[Dict[bytes, float]] = None):
+        self._fixed_lexicon = lexicon
+        self.reset()
+
+    def reset(self):
+        # The lexicon and sentiment mode active when a document starts are used for all of it
+        self._lexicon = SENTIMENT_LEXICON if self._fixed_lexicon is None else self._fixed_lexicon
+        self._rules = SentimentRules() if SENTIMENT_MODE == "rules" else None
+        self._empty = True
+        self._word_count = 0
+        self._sentence_count = 0
+        self._syllable_count = 0
+        self._complex_word_count = 0
+        self._letter_count = 0
+        self._positive_score = 0.0
+        self._negative_score = 0.0
+        self._in_word = False
+        self._partial_key = b''
+        self._partial_word = b''
+
+    def feed(self, chunk):
+        """Scan the next chunk (str or UTF-8 bytes-like object) of the document."""
+        data = as_utf8(chunk)
+        if data:
+            self._empty = False
+            self._scan_chunk(data)
+
+    def finalize(self) -> dict:
+        """Return the metrics for the whole document and reset the analyzer."""
+        if self._in_word:
+            self._score_keys([self._partial_key], [self._partial_word])
+        if self._rules is not None:
+            self._positive_score, self._negative_score = self._rules.finish(
+                self._positive_score, self._negative_score)
+        result = _metrics(self._empty, self._word_count, self._sentence_count, self._syllable_count,
+                          self._complex_word_count, self._letter_count, self._positive_score, self._negative_score)
+        self.reset()
+        return result
+
+    def _scan_chunk(self, data: bytes):
+        self._sentence_count += data.count(b'.') + data.count(b'!') + data.count(b'?')
+        if self._in_word and data[0] in ASCII_WHITESPACE:
+            self._score_keys([self._partial_key], [self._partial_word])
+            self._in_word = False
+
+        words = data.split()
+        if not words:
+            return
+        # One key per word, punctuation-only words included, so keys line up with words
+        keys = normalize_words(b' '.join(words)).split(b' ')
+        self._word_count += len(words)
+        if self._in_word:
+            # The first word continues the one left open by the previous chunk
+            keys[0] = self._partial_key + keys[0]
+            words[0] = self._partial_word + words[0]
+            self._word_count -= 1
+
+        self._in_word = data[-1] not in ASCII_WHITESPACE
+        if self._in_word:
+            # A partial word too long to be looked up or measured is
+            # truncated rather than kept whole
+            self._partial_key = keys.pop()[:MAX_KEY_BYTES + 1]
+            self._partial_word = words.pop()
+            if len(self._partial_word) > MAX_KEY_BYTES:
+                self._partial_word = _compact_word(self._partial_word)
+        self._score_keys(keys, words)
+
+    def _score_keys(self, keys, words):
+        if self._rules is not None:
+            self._positive_score, self._negative_score = self._rules.score_words(
+                keys, words, self._lexicon, self._positive_score, self._negative_score)
+        else:
+            self._positive_score, self._negative_score = _sentiment_totals(
+                keys, self._lexicon, self._positive_score, self._negative_score)
+        syllables, complex_words, letters = _shape_totals(keys)
+        self._syllable_count += syllables
+        self._complex_word_count += complex_words
+        self._letter_count += letters
+
+def _top_terms(words: List[bytes], keys: List[bytes], top_k: int, stop_words) -> dict:
+    """Most frequent words, bigrams and trigrams, counted like the C++ module.
+
+    Stop words, punctuation-only and over-long words are not counted and break
+    n-grams, as does a word ending a sentence. Ties are listed alphabetically.
+    """
+    counters = (Counter(), Counter(), Counter())
+    history = []  # Up to two preceding counted words
+    for word, key in zip(words, keys):
+        if not key or len(key) > MAX_KEY_BYTES or key in stop_words:
+            history = []
+            continue
+        counters[0][key] += 1
+        if history:
+            counters[1][history[-1] + b' ' + key] += 1
+        if len(history) == 2:
+            counters[2][history[0] + b' ' + history[1] + b' ' + key] += 1
+        if b'.' in word or b'!' in word or b'?' in word:
+            history = []
+        else:
+            history = history[-1:] + [key]
+    return {
+        f'top_{name}': [(term.decode('utf-8', 'replace'), count) for term, count in
+                        heapq.nsmallest(top_k, counter.items(), key=lambda item: (-item[1], item[0]))]
+        for name, counter in zip(('terms', 'bigrams', 'trigrams'), counters)
+    }
+
+# Whitespace-delimited words with their offsets; the str pattern gives str indices
+WORD_PATTERN = re.compile(rb'[^ \t\n\v\f\r]+')
+STR_WORD_PATTERN = re.compile(r'[^ \t\n\v\f\r]+')
 
+def _sentence_columns(text, lexicon, rules: bool = False) -> dict:
+    """Per-sentence NumPy columns, like text_analyzer.analyze_text(text, sentences=True).
+
+    A sentence ends after each word containing '.', '!' or '?'; words after
+    the last one form a final sentence. Offsets are str indices for str input
+    and byte offsets otherwise. rules selects the rule-based sentiment.
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("sentences=True requires NumPy. Run 'pip install numpy'.")
+    is_str = isinstance(text, str)
+    scorer = SentimentRules() if rules else None
+    rows = []
+    row = None
+    for match in (STR_WORD_PATTERN if is_str else WORD_PATTERN).finditer(text if is_str else as_utf8(text)):
+        word = match.group().encode('utf-8') if is_str else match.group()
+        if row is None:
+            # start, end, words, syllables, complex words, letters, positive, negative
+            row = [match.start(), 0, 0, 0, 0, 0, 0.0, 0.0]
+            rows.append(row)
+        row[1] = match.end()
+        row[2] += 1
+        key = normalize_words(word)
+        if len(key) > MAX_KEY_BYTES:
+            key = None
+        else:
+            syllables, letters = word_shape(key)
+            row[3] += syllables
+            row[4] += syllables >= 3
+            row[5] += letters
+        ends_sentence = b'.' in word or b'!' in word or b'?' in word
+        if scorer is not None:
+            scorer.add_word(key, lexicon.get(key), word)
+            if ends_sentence or scorer.full():
+                positive, negative = scorer.end_sentence(word.count(b'!'), word.count(b'?'))
+                row[6] += positive
+                row[7] += negative
+        else:
+            weight = lexicon.get(key, 0.0)
+            if weight > 0:
+                row[6] += weight
+            elif weight < 0:
+                row[7] -= weight
+        if ends_sentence:
+            row = None
+    if scorer is not None and rows:
+        positive, negative = scorer.end_sentence()
+        rows[-1][6] += positive
+        rows[-1][7] += negative
+
+    metrics = [_metrics(False, row[2], 1, *row[3:]) for row in rows]
     return {
+        'start': np.array([row[0] for row in rows], dtype=np.int64),
+        'end': np.array([row[1] for row in rows], dtype=np.int64),
+        'word_count': np.array([row[2] for row in rows], dtype=np.int64),
+        'syllable_count': np.array([row[3] for row in rows], dtype=np.int64),
+        'readability_score': np.array([m['readability_score'] for m in metrics], dtype=np.float64),
+        'sentiment_score': np.array([m['sentiment_score'] for m in metrics], dtype=np.float64)
+    }
+
+def python_text_analysis(text: str, top_k: int = 0, stop_words: bool = True, sentences: bool = False,
+                         lexicon: Optional[Dict[bytes, float]] = None) -> dict:
+    """Python fallback for text analysis when C++ module is not available.
+
+    Follows the C++ scanner's rules, so both give the same metrics. With
+    top_k > 0 the result also holds the most frequent words, bigrams and
+    trigrams, like text_analyzer.analyze_text(text, top_k), and with
+    sentences=True the per-sentence columns under 'sentences'. lexicon
+    replaces SENTIMENT_LEXICON for this text.
+    """
+    data = as_utf8(text)
+    rules = SENTIMENT_MODE == "rules"
+    if lexicon is None:
+        lexicon = SENTIMENT_LEXICON
+    result = _metrics(not data, *_scan_text(data, lexicon, rules))
+    if top_k > 0:
+        words = data.split()
+        keys = normalize_words(b' '.join(words)).split(b' ')
+        result.update(_top_terms(words, keys, top_k, STOP_WORDS if stop_words else frozenset()))
+    if sentences:
+        result['sentences'] = _sentence_columns(text, lexicon, rules)
+    return result
+
+def python_analyze_texts(texts: List, output: str = 'dicts', lexicon: Optional[Dict[bytes, float]] = None):
+    """Batch counterpart of text_analyzer.analyze_texts() for the Python fallback.
+
+    Returns a list of metric dictionaries (output='dicts'), a dict of NumPy
+    columns (output='columns') or a NumPy structured array (output='structured').
+    """
+    if output not in ('dicts', 'columns', 'structured'):
+        raise ValueError(f"output must be 'dicts', 'columns' or 'structured', got '{output}'")
+    if lexicon is None:
+        lexicon = SENTIMENT_LEXICON
+    rules = SENTIMENT_MODE == "rules"
+    documents = [as_utf8(text) for text in texts]
+    if output == 'dicts':
+        return [_metrics(not data, *_scan_text(data, lexicon, rules)) for data in documents]
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError(f"output='{output}' requires NumPy. Run 'pip install numpy'.")
+
+    # The metrics are computed for the whole batch at once from the raw counts
+    counts = np.array([_scan_text(data, lexicon, rules) for data in documents], dtype=np.float64).reshape(-1, 7)
+    empty = np.array([not data for data in documents], dtype=bool)
+    word_count = counts[:, 0].astype(np.int64)
+    sentence_count = counts[:, 1].astype(np.int64)
+    syllable_count = counts[:, 2].astype(np.int64)
+    complex_words, letters, positive, negative = counts[:, 3], counts[:, 4], counts[:, 5], counts[:, 6]
+    # Assume at least one sentence if there's text
+    sentence_count[(sentence_count == 0) & (word_count > 0)] = 1
+    has_words = word_count > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        indices = _readability(word_count.astype(np.float64), sentence_count.astype(np.float64),
+                               syllable_count, complex_words, letters, sqrt=np.sqrt)
+        sentiment_score = np.where(positive + negative > 0, positive / (positive + negative), 0.5)
+    readability_score = np.where(has_words, np.clip(indices['flesch_reading_ease'] / 100.0, 0.0, 1.0), 0.5)
+    readability_score[empty] = 0.0
+
+    columns = {
         'word_count': word_count,
         'sentence_count': sentence_count,
+        'syllable_count': syllable_count,
         'readability_score': readability_score,
         'sentiment_score': sentiment_score
     }
-
-async def get_openai_suggestions(text: str, cpp_result: dict) -> str:
-    """Get suggestions from OpenAI GPT."""
-    if not OPENAI_AVAILABLE:
-        return "OpenAI not available. Mock suggestion: To improve this text, consider adding more descriptive adjectives and varying sentence length."
-
-    try:
-        prompt = f"""Analyze the following text and provide 3 specific, actionable suggestions to improve its clarity, engagement, and readability.
+    columns.update((name, np.where(has_words, index, 0.0)) for name, index in indices.items())
+    if output == 'columns':
+        return columns
+    records = np.empty(len(documents), dtype=METRIC_DTYPE)
+    for name, _ in METRIC_DTYPE:
+        records[name] = columns[name]
+    return records
+
+def create_analyzer(lexicon: Optional[CompiledLexicon] = None):
+    """Return an incremental analyzer from the C++ module, or the Python fallback."""
+    if CPP_MODULE_AVAILABLE:
+        return text_analyzer.Analyzer(lexicon.native if lexicon else None)
+    return PythonTextAnalyzer(lexicon.terms if lexicon else None)
+
+def run_text_analysis(text: str, top_k: int = 0, sentences: bool = False,
+                      lexicon: Optional[CompiledLexicon] = None) -> dict:
+    """Analyze text with the C++ module, or the Python fallback if it isn't built."""
+    if CPP_MODULE_AVAILABLE:
+        if lexicon and not top_k and not sentences and ANALYZE_TEXT_THREADS == 1:
+            # Plain metrics: the lexicon's reusable analyzer skips analyze_text's option handling
+            return lexicon.analyzer.analyze(text)
+        return text_analyzer.analyze_text(text, top_k, sentences=sentences, threads=ANALYZE_TEXT_THREADS,
+                                          lexicon=lexicon.native if lexicon else None)
+    return python_text_analysis(text, top_k, sentences=sentences, lexicon=lexicon.terms if lexicon else None)
+
+async def analyze_text_async(text: str, top_k: int = 0, sentences: bool = False,
+                             lexicon: Optional[CompiledLexicon] = None) -> dict:
+    """Run the analysis inline for small texts and in the worker pool for large ones."""
+    if len(text) < ANALYZE_OFFLOAD_THRESHOLD:
+        return run_text_analysis(text, top_k, sentences, lexicon)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_analysis_executor(), run_text_analysis, text, top_k, sentences, lexicon)
+
+def split_top_terms(result: dict) -> Optional[Dict[str, list]]:
+    """Move the top_terms/top_bigrams/top_trigrams lists out of an analysis result."""
+    if "top_terms" not in result:
+        return None
+    return {name: result.pop(f"top_{name}") for name in ("terms", "bigrams", "trigrams")}
+
+def split_sentences(result: dict) -> Optional[Dict[str, list]]:
+    """Move the per-sentence NumPy columns out of an analysis result as JSON-ready lists."""
+    columns = result.pop("sentences", None)
+    if columns is None:
+        return None
+    return {name: column.tolist() for name, column in columns.items()}
+
+def openai_messages(text: str, cpp_result: dict) -> List[Dict[str, str]]:
+    """The chat messages asking OpenAI GPT for suggestions."""
+    prompt = f"""Analyze the following text and provide 3 specific, actionable suggestions to improve its clarity, engagement, and readability.
 Base your suggestions on the provided metrics.
 
 Text:
@@ -153,30 +1539,54 @@ Metrics:
 - Word count: {cpp_result.get('word_count', 0)}
 - Sentence count: {cpp_result.get('sentence_count', 0)}
 - Readability score (0-1): {cpp_result.get('readability_score', 0):.2f}
+- Flesch-Kincaid grade level: {cpp_result.get('flesch_kincaid_grade', 0):.1f}
 - Sentiment score (0-1): {cpp_result.get('sentiment_score', 0):.2f}
 
 Your suggestions:"""
-        
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a professional writing coach. Provide concise, actionable feedback."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=200, temperature=0.7
+    return [
+        {"role": "system", "content": "You are a professional writing coach. Provide concise, actionable feedback."},
+        {"role": "user", "content": prompt}
+    ]
+
+def openai_error_message(error: Exception) -> str:
+    return f"OpenAI API Error. Mock Suggestion: Refine sentence structure for better flow. (Error: {str(error)})"
+
+async def get_openai_suggestions(text: str, cpp_result: dict, timeout: Optional[float] = None) -> str:
+    """Get suggestions from OpenAI GPT; timeout (seconds) overrides OPENAI_TIMEOUT for this call."""
+    if not OPENAI_AVAILABLE:
+        return "OpenAI not available. Mock suggestion: To improve this text, consider adding more descriptive adjectives and varying sentence length."
+
+    try:
+        client = openai_client if timeout is None else openai_client.with_options(timeout=timeout)
+        response = await client.chat.completions.create(
+            model=OPENAI_MODEL, messages=openai_messages(text, cpp_result), max_tokens=200, temperature=0.7
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
-        return f"OpenAI API Error. Mock Suggestion: Refine sentence structure for better flow. (Error: {str(e)})"
+        return openai_error_message(e)
 
-async def get_gemini_suggestions(text: str, cpp_result: dict) -> str:
-    """Get suggestions from Google Gemini."""
-    if not GEMINI_AVAILABLE or not GEMINI_MODEL_NAME:
-        return "Gemini not available. Mock suggestion: To enhance this text, try using more vivid verbs and checking for repetitive phrasing."
+async def stream_openai_suggestions(text: str, cpp_result: dict) -> AsyncIterator[str]:
+    """Yield suggestions from OpenAI GPT as they are generated."""
+    if not OPENAI_AVAILABLE:
+        yield await get_openai_suggestions(text, cpp_result)
+        return
 
     try:
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        prompt = f"""As a writing coach, analyze this text and provide 3 concise, actionable improvement suggestions based on the metrics.
+        stream = await openai_client.chat.completions.create(
+            model=OPENAI_MODEL, messages=openai_messages(text, cpp_result), max_tokens=200, temperature=0.7,
+            stream=True
+        )
+        # Closes the connection if the client goes away mid-stream
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+    except Exception as e:
+        yield openai_error_message(e)
+
+def gemini_prompt(text: str, cpp_result: dict) -> str:
+    """The prompt asking Google Gemini for suggestions."""
+    return f"""As a writing coach, analyze this text and provide 3 concise, actionable improvement suggestions based on the metrics.
 
 Text: "{text}"
 
@@ -184,27 +1594,123 @@ Metrics:
 - Word count: {cpp_result.get('word_count', 0)}
 - Sentence count: {cpp_result.get('sentence_count', 0)}
 - Readability (0-1): {cpp_result.get('readability_score', 0):.2f}
+- Grade level: {cpp_result.get('flesch_kincaid_grade', 0):.1f}
 - Sentiment (0-1): {cpp_result.get('sentiment_score', 0):.2f}
 
 Suggestions:"""
 
+def gemini_error_message(error: Exception) -> str:
+    error_msg = str(error)
+    if "User location is not supported" in error_msg:
+        return "Gemini API Error: Your location may not be supported for Gemini API access. Mock Suggestion: Consider varying sentence structure and using more descriptive language."
+    elif "API key" in error_msg.lower():
+        return "Gemini API Error: Invalid API key. Mock Suggestion: Focus on clarity and conciseness in your writing."
+    else:
+        return f"Gemini API Error. Mock Suggestion: Strengthen the introduction to grab the reader's attention. (Error: {error_msg[:100]})"
+
+async def get_gemini_suggestions(text: str, cpp_result: dict) -> str:
+    """Get suggestions from Google Gemini."""
+    if not GEMINI_AVAILABLE:
+        return "Gemini not available. Mock suggestion: To enhance this text, try using more vivid verbs and checking for repetitive phrasing."
+
+    try:
+        model = await gemini_provider.get_model()
+        prompt = gemini_prompt(text, cpp_result)
+
         # Try async first, fallback to sync if not available
         try:
             response = await model.generate_content_async(prompt)
         except AttributeError:
-            # Some versions might not have async support
-            response = model.generate_content(prompt)
+            # Some versions might not have async support; keep the event loop free
+            response = await asyncio.to_thread(model.generate_content, prompt)
 
         return response.text.strip()
     except Exception as e:
-        error_msg = str(e)
-        if "User location is not supported" in error_msg:
-            return "Gemini API Error: Your location may not be supported for Gemini API access. Mock Suggestion: Consider varying sentence structure and using more descriptive language."
-        elif "API key" in error_msg.lower():
-            return "Gemini API Error: Invalid API key. Mock Suggestion: Focus on clarity and conciseness in your writing."
-        else:
-            return f"Gemini API Error. Mock Suggestion: Strengthen the introduction to grab the reader's attention. (Error: {error_msg[:100]})"
+        return gemini_error_message(e)
+
+async def stream_gemini_suggestions(text: str, cpp_result: dict) -> AsyncIterator[str]:
+    """Yield suggestions from Google Gemini as they are generated."""
+    if not GEMINI_AVAILABLE:
+        yield await get_gemini_suggestions(text, cpp_result)
+        return
+
+    try:
+        model = await gemini_provider.get_model()
+        if not hasattr(model, "generate_content_async"):
+            # No async support in this version: the whole answer arrives at once
+            yield await get_gemini_suggestions(text, cpp_result)
+            return
+        response = await model.generate_content_async(gemini_prompt(text, cpp_result), stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        yield gemini_error_message(e)
+
+def ai_provider_model(ai_provider: str) -> Optional[str]:
+    """The model a provider's suggestions come from, or None for an unknown provider."""
+    if ai_provider == "openai":
+        return OPENAI_MODEL
+    if ai_provider == "gemini":
+        return gemini_provider.model_name if gemini_provider else "none"
+    return None
 
+async def get_ai_suggestions(ai_provider: str, text: str, cpp_result: dict, use_cache: bool = True) -> str:
+    """Get suggestions from a provider through the suggestion cache.
+
+    use_cache=False skips the lookup; the fresh suggestions still replace the cached ones.
+    """
+    model = ai_provider_model(ai_provider)
+    if model is None:
+        return "Unknown AI provider specified."
+    fetch = get_openai_suggestions if ai_provider == "openai" else get_gemini_suggestions
+
+    key = suggestion_cache.make_key(ai_provider, model, text, cpp_result)
+    if use_cache:
+        cached = suggestion_cache.get(key)
+        if cached is not None:
+            return cached
+    else:
+        suggestion_cache.bypassed += 1
+    suggestions = await fetch(text, cpp_result)
+    # Mock suggestions from an unavailable or failing provider are not cached
+    if not is_ai_fallback_message(suggestions):
+        suggestion_cache.put(key, ai_provider, model, suggestions)
+    return suggestions
+
+async def stream_ai_suggestions(ai_provider: str, text: str, cpp_result: dict,
+                                use_cache: bool = True) -> AsyncIterator[str]:
+    """Yield suggestions from a provider as they are generated, through the suggestion cache.
+
+    Cached suggestions are yielded whole; generated ones are cached once the
+    provider has finished. The pieces joined and stripped are the suggestions.
+    """
+    model = ai_provider_model(ai_provider)
+    if model is None:
+        yield "Unknown AI provider specified."
+        return
+    stream = stream_openai_suggestions if ai_provider == "openai" else stream_gemini_suggestions
+
+    key = suggestion_cache.make_key(ai_provider, model, text, cpp_result)
+    if use_cache:
+        cached = suggestion_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    else:
+        suggestion_cache.bypassed += 1
+    pieces = []
+    async for piece in stream(text, cpp_result):
+        if not pieces:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+        pieces.append(piece)
+        yield piece
+    # Not reached if the client disconnects mid-stream, so partial answers aren't cached
+    suggestions = "".join(pieces).strip()
+    if not is_ai_fallback_message(suggestions):
+        suggestion_cache.put(key, ai_provider, model, suggestions)
 
 # --- Pydantic Models ---
 
@@ -212,9 +1718,20 @@ class TextInput(BaseModel):
     text: str
     use_ai: Optional[bool] = True
     ai_provider: Optional[Literal["openai", "gemini"]] = "openai"
+    # Also return the top_k most frequent words, bigrams and trigrams
+    top_k: Optional[int] = Field(0, ge=0, le=100)
+    # Also return per-sentence offsets and metrics (e.g. for highlighting)
+    include_sentences: Optional[bool] = False
+    # Sentiment lexicon to score with (see GET /admin/lexicons); None uses the default one
+    lexicon: Optional[str] = None
+    # Skip the result and suggestion caches; the fresh result replaces the cached one
+    bypass_cache: Optional[bool] = False
 
 class AnalysisResult(BaseModel):
     cpp_analysis: Dict[str, float]
+    top_terms: Optional[Dict[str, List[Tuple[str, int]]]] = None
+    # One list per column (start, end, word_count, ...), one entry per sentence
+    sentences: Optional[Dict[str, list]] = None
     ai_suggestions: Optional[str] = None
     ai_provider: Optional[str] = None
     analysis_id: int
@@ -524,6 +2041,20 @@ async def home():
                 color: var(--text-primary);
             }
 
+            .sentence-heatmap {
+                margin-bottom: 1.5rem;
+                padding: 1rem;
+                border: 1px solid var(--border);
+                border-radius: 0.75rem;
+                line-height: 1.8;
+                white-space: pre-wrap;
+            }
+
+            .sentence-heatmap span {
+                border-radius: 0.25rem;
+                padding: 0.1rem 0;
+            }
+
             .result-badge {
                 padding: 0.25rem 0.75rem;
                 border-radius: 9999px;
@@ -911,13 +2442,15 @@ async def home():
                 setLoadingState(true);
 
                 try {
-                    const response = await fetch('/analyze', {
+                    // The metrics arrive right away; the AI suggestions follow as they are generated
+                    const response = await fetch('/analyze/stream', {
                         method: 'POST',
                         headers: {'Content-Type': 'application/json'},
                         body: JSON.stringify({
                             text: text,
                             use_ai: useAI,
-                            ai_provider: aiProvider
+                            ai_provider: aiProvider,
+                            include_sentences: true
                         })
                     });
 
@@ -925,9 +2458,33 @@ async def home():
                         throw new Error(`HTTP ${response.status}: ${response.statusText}`);
                     }
 
-                    const result = await response.json();
-                    displayResults(result);
-                    updateQuickStats(result);
+                    let result = null;
+                    await readEvents(response, (event, data) => {
+                        if (event === 'metrics') {
+                            result = Object.assign(data, {
+                                ai_suggestions: data.ai_provider ? '' : null,
+                                analysis_id: null
+                            });
+                            displayResults(result, text);
+                            updateQuickStats(result);
+                        } else if (event === 'token') {
+                            result.ai_suggestions += data.text;
+                            document.getElementById('aiSuggestions').textContent = result.ai_suggestions;
+                        } else if (event === 'done') {
+                            result.analysis_id = data.analysis_id;
+                            if (data.ai_suggestions !== null) {
+                                document.getElementById('aiSuggestions').textContent = data.ai_suggestions;
+                            }
+                            document.getElementById('analysisId').textContent = data.analysis_id;
+                            document.getElementById('resultActions').innerHTML = resultActions(data.analysis_id);
+                        } else if (event === 'error') {
+                            throw new Error(data.detail);
+                        }
+                    });
+
+                    if (result === null || result.analysis_id === null) {
+                        throw new Error('The analysis stream ended unexpectedly');
+                    }
                     showNotification('Analysis completed successfully!', 'success');
 
                 } catch (error) {
@@ -939,8 +2496,62 @@ async def home():
                 }
             }
 
-            // Display analysis results
-            function displayResults(result) {
+            // Read a Server-Sent Events response, calling onEvent(event, data) with each event's JSON data
+            async function readEvents(response, onEvent) {
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) {
+                        break;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+                    let end;
+                    while ((end = buffer.indexOf('\\n\\n')) !== -1) {
+                        let event = 'message';
+                        let data = '';
+                        buffer.slice(0, end).split('\\n').forEach(line => {
+                            if (line.startsWith('event: ')) {
+                                event = line.slice(7);
+                            } else if (line.startsWith('data: ')) {
+                                data += line.slice(6);
+                            }
+                        });
+                        buffer = buffer.slice(end + 2);
+                        onEvent(event, JSON.parse(data));
+                    }
+                }
+            }
+
+            function escapeHtml(text) {
+                const div = document.createElement('div');
+                div.textContent = text;
+                return div.innerHTML;
+            }
+
+            // Color each sentence of the analyzed text by its sentiment (red
+            // to green); hovering shows its metrics. Offsets count code points.
+            function renderSentenceHeatmap(text, sentences) {
+                const chars = Array.from(text);
+                let html = '';
+                let position = 0;
+                sentences.start.forEach((start, i) => {
+                    const end = sentences.end[i];
+                    const hue = Math.round(sentences.sentiment_score[i] * 120);
+                    const title = `Sentiment ${sentences.sentiment_score[i].toFixed(2)} | ` +
+                        `Readability ${sentences.readability_score[i].toFixed(2)} | ${sentences.word_count[i]} words`;
+                    html += escapeHtml(chars.slice(position, start).join(''));
+                    html += `<span style="background: hsla(${hue}, 70%, 50%, 0.25);" title="${title}">` +
+                        `${escapeHtml(chars.slice(start, end).join(''))}</span>`;
+                    position = end;
+                });
+                html += escapeHtml(chars.slice(position).join(''));
+                return `<div class="sentence-heatmap">${html}</div>`;
+            }
+
+            // Display analysis results; text, if given, is shown as a sentence heatmap
+            function displayResults(result, text) {
                 const resultsDiv = document.getElementById('results');
                 const aiProviderBadge = result.ai_provider ?
                     `<span class="result-badge badge-${result.ai_provider}">${result.ai_provider.toUpperCase()}</span>` :
@@ -953,7 +2564,7 @@ async def home():
                             <div style="display: flex; align-items: center; gap: 1rem;">
                                 ${aiProviderBadge}
                                 <span style="font-size: 0.875rem; color: var(--text-secondary);">
-                                    ID: ${result.analysis_id}
+                                    ID: <span id="analysisId">${result.analysis_id ?? '...'}</span>
                                 </span>
                             </div>
                         </div>
@@ -971,19 +2582,25 @@ async def home():
                                 <div class="metric-value">${(result.cpp_analysis.readability_score || 0).toFixed(2)}</div>
                                 <div class="metric-label">Readability</div>
                             </div>
+                            <div class="metric-card">
+                                <div class="metric-value">${(result.cpp_analysis.flesch_kincaid_grade || 0).toFixed(1)}</div>
+                                <div class="metric-label">Grade Level</div>
+                            </div>
                             <div class="metric-card">
                                 <div class="metric-value">${(result.cpp_analysis.sentiment_score || 0).toFixed(2)}</div>
                                 <div class="metric-label">Sentiment</div>
                             </div>
                         </div>
 
-                        ${result.ai_suggestions ? `
+                        ${result.sentences && text ? renderSentenceHeatmap(text, result.sentences) : ''}
+
+                        ${result.ai_suggestions != null ? `
                             <div class="suggestions">
                                 <div class="suggestions-header">
                                     <i class="fas fa-lightbulb"></i>
                                     AI Suggestions (${result.ai_provider.toUpperCase()})
                                 </div>
-                                <div style="white-space: pre-wrap; line-height: 1.6;">${result.ai_suggestions}</div>
+                                <div id="aiSuggestions" style="white-space: pre-wrap; line-height: 1.6;">${result.ai_suggestions}</div>
                             </div>
                         ` : `
                             <div style="text-align: center; padding: 2rem; color: var(--text-secondary);">
@@ -992,15 +2609,8 @@ async def home():
                             </div>
                         `}
 
-                        <div style="margin-top: 1.5rem; padding-top: 1.5rem; border-top: 1px solid var(--border); display: flex; gap: 1rem;">
-                            <button class="btn btn-secondary" onclick="copyResults(${result.analysis_id})">
-                                <i class="fas fa-copy"></i>
-                                Copy Results
-                            </button>
-                            <button class="btn btn-secondary" onclick="shareResults(${result.analysis_id})">
-                                <i class="fas fa-share"></i>
-                                Share
-                            </button>
+                        <div id="resultActions" style="margin-top: 1.5rem; padding-top: 1.5rem; border-top: 1px solid var(--border); display: flex; gap: 1rem;">
+                            ${result.analysis_id != null ? resultActions(result.analysis_id) : ''}
                         </div>
                     </div>
                 `;
@@ -1009,6 +2619,20 @@ async def home():
                 resultsDiv.scrollIntoView({ behavior: 'smooth', block: 'start' });
             }
 
+            // Copy/share buttons of a stored analysis
+            function resultActions(analysisId) {
+                return `
+                    <button class="btn btn-secondary" onclick="copyResults(${analysisId})">
+                        <i class="fas fa-copy"></i>
+                        Copy Results
+                    </button>
+                    <button class="btn btn-secondary" onclick="shareResults(${analysisId})">
+                        <i class="fas fa-share"></i>
+                        Share
+                    </button>
+                `;
+            }
+
             // Show error message
             function showError(message) {
                 const resultsDiv = document.getElementById('results');
@@ -1311,12 +2935,14 @@ async def home():
                     updateCharCount();
 
                     // Display the results
+                    const cppResult = JSON.parse(data.cpp_result);
                     displayResults({
                         analysis_id: data.id,
-                        cpp_analysis: JSON.parse(data.cpp_result),
+                        cpp_analysis: cppResult,
+                        sentences: cppResult.sentences,
                         ai_suggestions: data.ai_suggestions,
                         ai_provider: data.ai_provider
-                    });
+                    }, data.text);
 
                     showNotification('Analysis loaded successfully!', 'success');
                 } catch (error) {
@@ -1387,51 +3013,143 @@ async def home():
     </html>
     """
 
-@app.post("/analyze", response_model=AnalysisResult)
-async def analyze_text_endpoint(input_data: TextInput):
+async def analysis_cache_key(input_data: TextInput) -> Tuple[CompiledLexicon, str]:
+    """Resolve the request's lexicon and its result cache key; an unknown or broken lexicon is a 400."""
     try:
-        # Step 1: Perform text analysis using C++ module or Python fallback
-        if CPP_MODULE_AVAILABLE:
-            cpp_result = text_analyzer.analyze_text(input_data.text)
-        else:
-            cpp_result = python_text_analysis(input_data.text)
-        
-        cpp_result_json = json.dumps(cpp_result)
-
-        # Step 2: Get AI enhancement if requested
-        ai_suggestions = None
-        ai_provider_used = None
-        if input_data.use_ai:
-            ai_provider_used = input_data.ai_provider
-            if ai_provider_used == "openai":
-                ai_suggestions = await get_openai_suggestions(input_data.text, cpp_result)
-            elif ai_provider_used == "gemini":
-                ai_suggestions = await get_gemini_suggestions(input_data.text, cpp_result)
-            else:
-                ai_suggestions = "Unknown AI provider specified."
+        lexicon = await lexicon_registry.get(input_data.lexicon)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown lexicon '{input_data.lexicon}'")
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not load lexicon '{input_data.lexicon}': {e}")
+    cache_key = analysis_cache.make_key(input_data.text, input_data.ai_provider if input_data.use_ai else None,
+                                        input_data.top_k or 0, bool(input_data.include_sentences), lexicon.digest)
+    return lexicon, cache_key
+
+def store_analysis_result(text: str, result: Dict[str, Any], cache_key: str) -> Dict[str, Any]:
+    """Store an analysis row, cache the result and fill in its analysis_id."""
+    # Top terms are stored with the metrics so cached results can include them.
+    # Sentence columns grow with the text, so they are neither stored nor
+    # cached; a cache hit rescans the text for them
+    extras = {"top_terms": result["top_terms"]} if result["top_terms"] is not None else {}
+    cpp_result_json = json.dumps(dict(result["cpp_analysis"], **extras))
 
-        # Step 3: Store the result in the database
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO analyses (text, cpp_result, ai_suggestions, ai_provider) VALUES (?, ?, ?, ?)",
-            (input_data.text, cpp_result_json, ai_suggestions, ai_provider_used)
-        )
-        analysis_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO analyses (text, cpp_result, ai_suggestions, ai_provider) VALUES (?, ?, ?, ?)",
+        (text, cpp_result_json, result["ai_suggestions"], result["ai_provider"])
+    )
+    result["analysis_id"] = cursor.lastrowid
+    # Mock suggestions from an unavailable or failing provider are not
+    # cached, so the next request tries the provider again
+    if not is_ai_fallback_message(result["ai_suggestions"]):
+        analysis_cache.put(cache_key, dict(result, sentences=None), cursor)
+    conn.commit()
+    conn.close()
+    return result
 
-        return AnalysisResult(
-            cpp_analysis=cpp_result,
-            ai_suggestions=ai_suggestions,
-            ai_provider=ai_provider_used,
-            analysis_id=analysis_id
-        )
+async def compute_analysis(flight: AnalysisFlight, input_data: TextInput, lexicon: CompiledLexicon,
+                           cache_key: str, use_cache: bool, stream: bool) -> Dict[str, Any]:
+    """Analyze, get the AI suggestions and store the result, publishing progress to the flight.
+
+    With stream, the suggestions are published piece by piece as the provider
+    generates them; otherwise they are published whole.
+    """
+    # Step 1: Perform text analysis using C++ module or Python fallback
+    cpp_result = await analyze_text_async(input_data.text, input_data.top_k or 0,
+                                          bool(input_data.include_sentences), lexicon)
+    result = {
+        "cpp_analysis": cpp_result,
+        "top_terms": split_top_terms(cpp_result),
+        "sentences": split_sentences(cpp_result),
+        "ai_suggestions": None,
+        "ai_provider": input_data.ai_provider if input_data.use_ai else None
+    }
+    flight.publish("metrics", {name: result[name] for name in ("cpp_analysis", "top_terms", "sentences", "ai_provider")})
+
+    # Step 2: Get AI enhancement if requested
+    if input_data.use_ai and stream:
+        pieces = []
+        async for piece in stream_ai_suggestions(result["ai_provider"], input_data.text, cpp_result, use_cache):
+            pieces.append(piece)
+            flight.publish("token", piece)
+        result["ai_suggestions"] = "".join(pieces).strip()
+    elif input_data.use_ai:
+        result["ai_suggestions"] = await get_ai_suggestions(result["ai_provider"], input_data.text, cpp_result, use_cache)
+        flight.publish("token", result["ai_suggestions"])
+
+    # Step 3: Store the result in the database
+    return store_analysis_result(input_data.text, result, cache_key)
+
+async def join_analysis(input_data: TextInput, stream: bool) -> Tuple[Optional[Dict[str, Any]], Optional[AnalysisFlight]]:
+    """Return (cached result, None) on a cache hit, else (None, the computation to wait on)."""
+    # Step 0: Return the stored result if this exact request was analyzed before
+    lexicon, cache_key = await analysis_cache_key(input_data)
+    use_cache = not input_data.bypass_cache
+    cached = analysis_cache.get(cache_key) if use_cache else None
+    if cached is not None:
+        if input_data.include_sentences:
+            cpp_result = await analyze_text_async(input_data.text, 0, True, lexicon)
+            cached = dict(cached, sentences=split_sentences(cpp_result))
+        return cached, None
+    # Otherwise wait on an identical request's computation, or start one;
+    # requests that bypass the cache always get their own
+    return None, analysis_flights.join(
+        cache_key, lambda flight: compute_analysis(flight, input_data, lexicon, cache_key, use_cache, stream),
+        shared=use_cache
+    )
+
+@app.post("/analyze", response_model=AnalysisResult)
+async def analyze_text_endpoint(input_data: TextInput):
+    try:
+        cached, flight = await join_analysis(input_data, stream=False)
+        if cached is not None:
+            return AnalysisResult(**cached)
+        return AnalysisResult(**await flight.wait())
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in /analyze endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {str(e)}")
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/analyze/stream")
+async def analyze_text_stream_endpoint(input_data: TextInput):
+    """
+    Streaming variant of /analyze, as Server-Sent Events: a "metrics" event
+    with the analysis as soon as it is done, "token" events with the AI
+    suggestions as the provider generates them, then "done" with the
+    analysis_id once the result is stored. Failures after the stream has
+    started are sent as an "error" event.
+    """
+    cached, flight = await join_analysis(input_data, stream=True)
+
+    async def events():
+        if cached is not None:
+            yield sse_event("metrics", {name: cached[name] for name in
+                                        ("cpp_analysis", "top_terms", "sentences", "ai_provider")})
+            if cached["ai_suggestions"] is not None:
+                yield sse_event("token", {"text": cached["ai_suggestions"]})
+            yield sse_event("done", {"analysis_id": cached["analysis_id"], "ai_suggestions": cached["ai_suggestions"]})
+            return
+
+        try:
+            # If every client waiting on the computation disconnects, it is
+            # cancelled and nothing is stored
+            async for event, data in flight.follow():
+                yield sse_event(event, {"text": data} if event == "token" else data)
+        except Exception as e:
+            print(f"Error in /analyze/stream endpoint: {e}")
+            yield sse_event("error", {"detail": f"An internal server error occurred: {str(e)}"})
+
+    # X-Accel-Buffering stops nginx-style proxies from holding back the events
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/store")
 async def store_analysis(input_data: TextInput):
     """(As per original prompt) Alternative endpoint for storing analysis results."""
@@ -1509,10 +3227,64 @@ async def get_analysis_by_id(analysis_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters of the analysis result and AI suggestion caches, and request coalescing counters."""
+    return dict(analysis_cache.stats(), suggestions=suggestion_cache.stats(), coalescing=analysis_flights.stats())
+
+# --- Lexicon Administration ---
+# These endpoints require ADMIN_TOKEN in the X-Admin-Token header, and are
+# disabled when it isn't set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+if not ADMIN_TOKEN:
+    print("⚠️ Warning: ADMIN_TOKEN not set. The /admin endpoints are disabled.")
+
+def check_admin_token(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+class DefaultLexiconRequest(BaseModel):
+    name: str
+
+@app.get("/admin/lexicons")
+async def list_lexicons(x_admin_token: Optional[str] = Header(None)):
+    """Available and loaded lexicons, the default one and the registry counters."""
+    check_admin_token(x_admin_token)
+    return lexicon_registry.stats()
+
+@app.post("/admin/lexicons/{name}/reload")
+async def reload_lexicon(name: str, x_admin_token: Optional[str] = Header(None)):
+    """Recompile a lexicon from its file; new requests use it, analyses in progress finish with the old one."""
+    check_admin_token(x_admin_token)
+    try:
+        lexicon = await lexicon_registry.reload(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown lexicon '{name}'")
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not load lexicon '{name}': {e}")
+    return lexicon.info()
+
+@app.put("/admin/lexicons/default")
+async def set_default_lexicon(request: DefaultLexiconRequest, x_admin_token: Optional[str] = Header(None)):
+    """Switch the lexicon used by requests that don't name one."""
+    check_admin_token(x_admin_token)
+    try:
+        lexicon = await lexicon_registry.set_default(request.name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown lexicon '{request.name}'")
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not load lexicon '{request.name}': {e}")
+    return lexicon.info()
+
 # Endpoints for testing and the UI - these are great additions from your original code
 class TestAIRequest(BaseModel):
     ai_provider: Literal["openai", "gemini"]
 
+# A connection test should fail fast rather than wait out OPENAI_TIMEOUT
+AI_TEST_TIMEOUT = 10.0
+
 @app.post("/test-ai")
 async def test_ai_connection(request: TestAIRequest):
     """Test AI provider connectivity."""
@@ -1520,7 +3292,7 @@ async def test_ai_connection(request: TestAIRequest):
     test_text = "This is a connection test."
     try:
         if request.ai_provider == "openai":
-            suggestions = await get_openai_suggestions(test_text, mock_cpp_result)
+            suggestions = await get_openai_suggestions(test_text, mock_cpp_result, timeout=AI_TEST_TIMEOUT)
         else: # Gemini
             suggestions = await get_gemini_suggestions(test_text, mock_cpp_result)
 
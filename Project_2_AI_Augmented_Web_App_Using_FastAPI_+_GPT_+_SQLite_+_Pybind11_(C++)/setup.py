@@ -1,7 +1,62 @@
 # setup.py
+import os
 from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
 import pybind11
 
+# Build variant, chosen with TEXT_ANALYZER_BUILD (see build_extension.py):
+#   default    the compiler's default flags
+#   optimized  -O3 with link-time optimization
+#   native     optimized and tuned for the build machine's CPU (-march=native);
+#              the module then only runs on CPUs with the same features
+#   pgo        optimized with profile-guided optimization; built in two phases,
+#              "generate" (instrumented) and "use", by build_extension.py
+# The flags are for GCC and Clang; other compilers always get the default
+# build. text_analyzer.build_info() reports the variant at runtime.
+BUILD_VARIANT = os.getenv("TEXT_ANALYZER_BUILD", "default")
+PGO_PHASE = os.getenv("TEXT_ANALYZER_PGO_PHASE", "use")
+PGO_DIR = os.path.abspath(os.getenv("TEXT_ANALYZER_PGO_DIR", os.path.join("build", "pgo-profile")))
+
+# No FMA contraction: a fused a*b+c rounds the readability formulas
+# differently from the Python fallback
+OPTIMIZED_FLAGS = ['-O3', '-flto', '-ffp-contract=off']
+
+def variant_flags(variant, phase):
+    """Return (variant name, compile flags, link flags) for a build variant."""
+    if variant == 'default':
+        return variant, [], []
+    if variant == 'optimized':
+        return variant, OPTIMIZED_FLAGS, ['-flto']
+    if variant == 'native':
+        return variant, OPTIMIZED_FLAGS + ['-march=native'], ['-flto']
+    if variant == 'pgo':
+        if phase == 'generate':
+            profile = ['-fprofile-generate=' + PGO_DIR]
+            return 'pgo-generate', OPTIMIZED_FLAGS + profile, ['-flto'] + profile
+        if phase == 'use':
+            # Clang reads one merged .profdata file, GCC a directory of .gcda files
+            merged = os.path.join(PGO_DIR, 'default.profdata')
+            profile = ['-fprofile-use=' + (merged if os.path.exists(merged) else PGO_DIR)]
+            return variant, OPTIMIZED_FLAGS + profile + ['-Wno-missing-profile'], ['-flto'] + profile
+        raise ValueError(f"TEXT_ANALYZER_PGO_PHASE must be 'generate' or 'use', got '{phase}'")
+    raise ValueError(f"TEXT_ANALYZER_BUILD must be 'default', 'optimized', 'native' or 'pgo', got '{variant}'")
+
+class VariantBuildExt(build_ext):
+    """Adds the selected variant's flags, and records them in the module, once the compiler is known."""
+
+    def build_extensions(self):
+        variant, compile_flags, link_flags = 'default', [], []
+        if self.compiler.compiler_type == 'unix':
+            variant, compile_flags, link_flags = variant_flags(BUILD_VARIANT, PGO_PHASE)
+        for ext in self.extensions:
+            ext.extra_compile_args += compile_flags
+            ext.extra_link_args += link_flags
+            ext.define_macros += [
+                ('TEXT_ANALYZER_BUILD_VARIANT', '"%s"' % variant),
+                ('TEXT_ANALYZER_BUILD_FLAGS', '"%s"' % ' '.join(ext.extra_compile_args)),
+            ]
+        super().build_extensions()
+
 # Define the C++ extension module
 ext_modules = [
     Extension(
@@ -17,8 +72,9 @@ ext_modules = [
 
 setup(
     name='text_analyzer',
-    version='1.0',
+    version='1.3',
     author='Paul Ikeadim',
     description='A basic C++ text analyzer exposed with Pybind11',
     ext_modules=ext_modules,
+    cmdclass={'build_ext': VariantBuildExt},
 )
\ No newline at end of file
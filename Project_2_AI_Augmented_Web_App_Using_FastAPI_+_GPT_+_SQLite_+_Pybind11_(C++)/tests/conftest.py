@@ -0,0 +1,111 @@
+"""
+Shared fixtures for the AI Text Analyzer tests
+main is imported from a temporary working directory, so its analyzer.db is
+created there, with the AI providers disabled. Tests that need the C++ module
+are skipped when it isn't built.
+"""
+
+import json
+import os
+import random
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# Words the scanner treats specially: lexicon terms, negations, intensifiers,
+# "but", ALL CAPS, sentence ends, non-ASCII letters and over-long words
+VOCABULARY = [
+    "good", "Bad!", "GREAT.", "terrible?", "happy", "Sad", "not", "NOT", "very", "hardly", "never!",
+    "but", "BUT", "isn't", "don't", "GOOD!!", "bad??", "extremely", "slightly", "without", "so",
+    "the", "a", "of", "analysis", "results", "e.g.", "wow...", "!!", "?", "2024", "café", "naïve",
+    "Ünïcode", "😀", "rhythm", "beautiful", "communication.", "extraordinarily", "x" * 70,
+]
+SEPARATORS = [" ", " ", " ", "  ", "\n", "\t", "\r\n", "\xa0", ""]
+
+# What the fake OpenAI provider of the client fixture generates
+SUGGESTION_PIECES = ["  Use ", "shorter ", "sentences."]
+
+def make_text(rng, word_count):
+    """A deterministic text of word_count vocabulary words with mixed separators"""
+    return "".join(rng.choice(VOCABULARY) + rng.choice(SEPARATORS) for _ in range(word_count))
+
+def read_events(response):
+    """The (event, data) pairs of an SSE response"""
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.split("\n\n"):
+        if not block:
+            continue
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    """The app module, imported once with no API keys from a temporary directory"""
+    os.environ["OPENAI_API_KEY"] = ""
+    os.environ["GEMINI_API_KEY"] = ""
+    os.environ["SENTIMENT_MODE"] = "lexicon"
+    os.chdir(tmp_path_factory.mktemp("app"))
+    import main
+    return main
+
+@pytest.fixture(scope="session")
+def text_analyzer(main):
+    """The C++ module, set up by main with the same lexicon and stop words as the fallback"""
+    if not main.CPP_MODULE_AVAILABLE:
+        pytest.skip("C++ 'text_analyzer' module not built")
+    return main.text_analyzer
+
+@pytest.fixture(scope="session")
+def random_texts():
+    """Random texts of 0 to 300 words, plus edge cases"""
+    rng = random.Random(42)
+    texts = [make_text(rng, rng.randint(0, 300)) for _ in range(200)]
+    return texts + ["", " ", ".", "a", "!!!", "\x00\x1c", "x" * 5000]
+
+@pytest.fixture(params=["lexicon", "rules"])
+def sentiment_mode(request, main, monkeypatch):
+    """Score with the given mode in both the C++ module and the fallback"""
+    monkeypatch.setattr(main, "SENTIMENT_MODE", request.param)
+    if not main.CPP_MODULE_AVAILABLE:
+        yield request.param
+        return
+    previous = main.text_analyzer.sentiment_mode()
+    main.text_analyzer.set_sentiment_mode(request.param)
+    yield request.param
+    main.text_analyzer.set_sentiment_mode(previous)
+
+@pytest.fixture
+def fresh_db(main, tmp_path, monkeypatch):
+    """Point main at a new, empty database"""
+    monkeypatch.setattr(main, "DB_FILE", str(tmp_path / "analyzer.db"))
+    main.init_db()
+    return main.DB_FILE
+
+@pytest.fixture
+def client(main, fresh_db, monkeypatch):
+    """A client of the app with empty caches and a fake OpenAI provider; client.calls lists the texts sent to it"""
+    monkeypatch.setattr(main, "analysis_cache", main.AnalysisCache(max_entries=16, persist=True))
+    monkeypatch.setattr(main, "suggestion_cache", main.SuggestionCache(max_entries=16, ttl=60, max_rows=100))
+    monkeypatch.setattr(main, "analysis_flights", main.AnalysisFlights(True))
+    calls = []
+
+    async def get_openai_suggestions(text, cpp_result, timeout=None):
+        calls.append(text)
+        return "".join(SUGGESTION_PIECES).strip()
+
+    async def stream_openai_suggestions(text, cpp_result):
+        calls.append(text)
+        for piece in SUGGESTION_PIECES:
+            yield piece
+
+    monkeypatch.setattr(main, "get_openai_suggestions", get_openai_suggestions)
+    monkeypatch.setattr(main, "stream_openai_suggestions", stream_openai_suggestions)
+    client = TestClient(main.app)
+    client.calls = calls
+    return client
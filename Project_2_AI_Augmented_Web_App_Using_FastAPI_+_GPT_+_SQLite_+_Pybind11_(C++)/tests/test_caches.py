@@ -0,0 +1,140 @@
+"""Hits, misses, eviction, persistence and expiry of the result and AI suggestion caches"""
+
+import sqlite3
+
+import pytest
+
+METRICS = {"word_count": 3, "sentence_count": 1, "readability_score": 0.5,
+           "flesch_kincaid_grade": 4.0, "sentiment_score": 0.7}
+
+def store_result(main, cache, key, text="Some text."):
+    """Store an analysis row and cache it the way /analyze does"""
+    conn = sqlite3.connect(main.DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO analyses (text, cpp_result, ai_suggestions, ai_provider) VALUES (?, ?, ?, ?)",
+                   (text, '{"word_count": 2.0}', "Be concise.", "openai"))
+    entry = {"cpp_analysis": {"word_count": 2.0}, "top_terms": None, "sentences": None,
+             "ai_suggestions": "Be concise.", "ai_provider": "openai", "analysis_id": cursor.lastrowid}
+    cache.put(key, entry, cursor)
+    conn.commit()
+    conn.close()
+    return entry
+
+def table_rows(main, table):
+    conn = sqlite3.connect(main.DB_FILE)
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(main, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(main.time, "time", clock.time)
+    return clock
+
+def test_analysis_cache_key(main):
+    key = main.AnalysisCache.make_key("text", "openai")
+    assert key == main.AnalysisCache.make_key("text", "openai")
+    assert key != main.AnalysisCache.make_key("text ", "openai")
+    assert key != main.AnalysisCache.make_key("text", None)
+    assert key != main.AnalysisCache.make_key("text", "openai", top_k=5)
+    assert key != main.AnalysisCache.make_key("text", "openai", sentences=True)
+    assert key != main.AnalysisCache.make_key("text", "openai", lexicon_digest="abc")
+
+def test_analysis_cache_hit_and_miss(main, fresh_db):
+    cache = main.AnalysisCache(max_entries=2, persist=False)
+    assert cache.get("a") is None
+    entry = store_result(main, cache, "a")
+    assert cache.get("a") == entry
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+def test_analysis_cache_evicts_least_recently_used(main, fresh_db):
+    cache = main.AnalysisCache(max_entries=2, persist=False)
+    for key in ("a", "b"):
+        store_result(main, cache, key)
+    cache.get("a")
+    store_result(main, cache, "c")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+def test_analysis_cache_disabled(main, fresh_db):
+    cache = main.AnalysisCache(max_entries=0, persist=True)
+    store_result(main, cache, "a")
+    assert cache.get("a") is None
+    assert table_rows(main, "analysis_cache") == 0
+
+def test_analysis_cache_persists(main, fresh_db):
+    entry = store_result(main, main.AnalysisCache(max_entries=4, persist=True), "a")
+    # A new process starts with an empty memory tier
+    cache = main.AnalysisCache(max_entries=4, persist=True)
+    assert cache.get("a") == entry
+    assert cache.get("a") == entry
+    stats = cache.stats()
+    assert (stats["persistent_hits"], stats["hits"], stats["misses"]) == (1, 1, 0)
+
+def test_suggestion_cache_key(main):
+    key = main.SuggestionCache.make_key("openai", "gpt-3.5-turbo", "Some  text.\n", METRICS)
+    # Whitespace and metrics the prompt doesn't show don't matter
+    assert key == main.SuggestionCache.make_key("openai", "gpt-3.5-turbo", " Some text. ", METRICS)
+    assert key == main.SuggestionCache.make_key("openai", "gpt-3.5-turbo", "Some text.",
+                                                dict(METRICS, sentiment_score=0.7001, letter_count=9))
+    assert key != main.SuggestionCache.make_key("gemini", "gpt-3.5-turbo", "Some text.", METRICS)
+    assert key != main.SuggestionCache.make_key("openai", "gpt-4", "Some text.", METRICS)
+    assert key != main.SuggestionCache.make_key("openai", "gpt-3.5-turbo", "Some text!", METRICS)
+    assert key != main.SuggestionCache.make_key("openai", "gpt-3.5-turbo", "Some text.", dict(METRICS, word_count=4))
+
+def test_suggestion_cache_hit_and_miss(main, fresh_db, clock):
+    cache = main.SuggestionCache(max_entries=8, ttl=60, max_rows=0)
+    assert cache.get("k") is None
+    cache.put("k", "openai", "gpt-3.5-turbo", "Be concise.")
+    assert cache.get("k") == "Be concise."
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    # max_rows=0 keeps suggestions in memory only
+    assert table_rows(main, "suggestion_cache") == 0
+
+def test_suggestion_cache_expires(main, fresh_db, clock):
+    cache = main.SuggestionCache(max_entries=8, ttl=60, max_rows=100)
+    cache.put("k", "openai", "gpt-3.5-turbo", "Be concise.")
+    clock.now += 59
+    assert cache.get("k") == "Be concise."
+    clock.now += 1
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+    # The expired row isn't served after a restart either
+    assert main.SuggestionCache(max_entries=8, ttl=60, max_rows=100).get("k") is None
+
+def test_suggestion_cache_persists(main, fresh_db, clock):
+    main.SuggestionCache(max_entries=8, ttl=60, max_rows=100).put("k", "openai", "gpt-3.5-turbo", "Be concise.")
+    cache = main.SuggestionCache(max_entries=8, ttl=60, max_rows=100)
+    clock.now += 30
+    assert cache.get("k") == "Be concise."
+    assert cache.stats()["persistent_hits"] == 1
+    clock.now += 30
+    assert cache.get("k") is None
+
+def test_suggestion_cache_trims_rows(main, fresh_db, clock):
+    cache = main.SuggestionCache(max_entries=100, ttl=60, max_rows=5)
+    for i in range(20):
+        clock.now += 1
+        cache.put(f"k{i}", "openai", "gpt-3.5-turbo", f"Suggestion {i}")
+    assert table_rows(main, "suggestion_cache") == 5
+    assert cache.stats()["evictions"] == 15
+    # The most recently used rows are kept
+    restarted = main.SuggestionCache(max_entries=100, ttl=60, max_rows=5)
+    assert restarted.get("k19") == "Suggestion 19"
+    assert restarted.get("k0") is None
+
+def test_suggestion_cache_disabled(main, fresh_db):
+    cache = main.SuggestionCache(max_entries=0, ttl=60, max_rows=100)
+    cache.put("k", "openai", "gpt-3.5-turbo", "Be concise.")
+    assert cache.get("k") is None
+    assert table_rows(main, "suggestion_cache") == 0
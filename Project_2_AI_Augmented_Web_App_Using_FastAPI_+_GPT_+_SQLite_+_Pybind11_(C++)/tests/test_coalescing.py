@@ -0,0 +1,120 @@
+"""Identical in-flight requests share one computation, which is cancelled once no request waits on it"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from conftest import read_events
+
+class Computation:
+    """compute() for AnalysisFlights.join: publishes metrics, then waits for release"""
+
+    def __init__(self):
+        self.runs = 0
+        self.release = None
+
+    async def __call__(self, flight):
+        self.runs += 1
+        run = self.runs
+        if self.release is None:
+            self.release = asyncio.Event()
+        flight.publish("metrics", {"run": run})
+        await self.release.wait()
+        return {"analysis_id": run, "ai_suggestions": None}
+
+async def follow(flight):
+    return [(event, data) async for event, data in flight.follow()]
+
+async def until_published(flight):
+    while not flight.published:
+        await asyncio.sleep(0)
+
+def test_rejoin_after_last_follower_leaves(main):
+    async def scenario():
+        flights = main.AnalysisFlights(True)
+        compute = Computation()
+        first = flights.join("key", compute)
+        follower = asyncio.create_task(follow(first))
+        await until_published(first)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+
+        # Joined before the cancelled computation has unwound
+        second = flights.join("key", compute)
+        assert second is not first
+        compute.release.set()
+        assert (await second.wait())["analysis_id"] == 2
+        await asyncio.sleep(0)
+        assert first.result.cancelled()
+        return flights.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["computations"], stats["coalesced"], stats["abandoned"], stats["in_flight"]) == (2, 0, 1, 0)
+
+def test_joined_stream_keeps_computation(main):
+    async def scenario():
+        flights = main.AnalysisFlights(True)
+        compute = Computation()
+        first = flights.join("key", compute)
+        # A streaming request that has joined but not started iterating yet
+        second = flights.join("key", compute)
+        assert second is first
+        waiter = asyncio.create_task(first.wait())
+        await until_published(first)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        compute.release.set()
+        events = await follow(second)
+        return events, flights.stats()
+
+    events, stats = asyncio.run(scenario())
+    assert events == [("metrics", {"run": 1}), ("done", {"analysis_id": 1, "ai_suggestions": None})]
+    assert (stats["computations"], stats["coalesced"], stats["abandoned"]) == (1, 1, 0)
+
+def test_concurrent_requests_share_one_call(main, client, monkeypatch):
+    calls = []
+
+    async def get_openai_suggestions(text, cpp_result, timeout=None):
+        calls.append(text)
+        await asyncio.sleep(0.2)
+        return "Use shorter sentences."
+
+    monkeypatch.setattr(main, "get_openai_suggestions", get_openai_suggestions)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(http.post("/analyze", json={"text": "A shared document."})
+                                          for _ in range(20)))
+
+    responses = asyncio.run(scenario())
+    assert [response.status_code for response in responses] == [200] * 20
+    assert len({response.json()["analysis_id"] for response in responses}) == 1
+    assert len(calls) == 1
+    stats = main.analysis_flights.stats()
+    assert (stats["computations"], stats["coalesced"], stats["in_flight"]) == (1, 19, 0)
+
+def test_cancelled_computation_is_an_error(main, client, monkeypatch):
+    async def get_openai_suggestions(text, cpp_result, timeout=None):
+        raise asyncio.CancelledError()
+
+    async def stream_openai_suggestions(text, cpp_result):
+        raise asyncio.CancelledError()
+        yield
+
+    monkeypatch.setattr(main, "get_openai_suggestions", get_openai_suggestions)
+    monkeypatch.setattr(main, "stream_openai_suggestions", stream_openai_suggestions)
+
+    response = client.post("/analyze", json={"text": "Good."})
+    assert response.status_code == 500
+    assert "cancelled" in response.json()["detail"]
+
+    events = read_events(client.post("/analyze/stream", json={"text": "Good."}))
+    assert [event for event, _ in events] == ["metrics", "error"]
+    assert "cancelled" in events[-1][1]["detail"]
+    # Not counted as abandoned: the requests were still waiting
+    assert main.analysis_flights.stats()["abandoned"] == 0
@@ -0,0 +1,118 @@
+"""Per-request lexicons: compiling, errors and the admin endpoints"""
+
+import asyncio
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from conftest import read_events
+
+ADMIN_TOKEN = "secret"
+
+@pytest.fixture
+def lexicon_dir(main, tmp_path, monkeypatch):
+    """An empty LEXICON_DIR with its own registry"""
+    builtin = main.CompiledLexicon(main.DEFAULT_LEXICON_NAME, main.SENTIMENT_LEXICON, main.SENTIMENT_LEXICON_PATHS)
+    monkeypatch.setattr(main, "lexicon_registry", main.LexiconRegistry(str(tmp_path), 4, builtin))
+    return tmp_path
+
+def test_request_lexicon(main, client, lexicon_dir):
+    (lexicon_dir / "finance.tsv").write_text("# Market terms\nbullish 2.0\nbearish -2.0\n")
+    request = {"text": "Analysts are bullish.", "use_ai": False}
+    default = client.post("/analyze", json=request).json()
+    finance = client.post("/analyze", json=dict(request, lexicon="finance")).json()
+    assert default["cpp_analysis"]["sentiment_score"] == 0.5
+    assert finance["cpp_analysis"]["sentiment_score"] == 1.0
+    assert finance["analysis_id"] != default["analysis_id"]
+    client.post("/analyze", json=dict(request, lexicon="finance", top_k=1))
+    stats = main.lexicon_registry.stats()
+    assert (stats["compiles"], stats["hits"]) == (1, 2)
+
+def test_compiled_off_the_event_loop(main, client, lexicon_dir, monkeypatch):
+    (lexicon_dir / "finance.tsv").write_text("bullish 2.0\n")
+    load = main.load_sentiment_lexicon
+    on_loop = []
+
+    def load_sentiment_lexicon(paths):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return load(paths)
+
+    monkeypatch.setattr(main, "load_sentiment_lexicon", load_sentiment_lexicon)
+    assert client.post("/analyze", json={"text": "Bullish.", "use_ai": False, "lexicon": "finance"}).status_code == 200
+    assert on_loop == [False]
+
+def test_unknown_lexicon(client, lexicon_dir):
+    response = client.post("/analyze", json={"text": "Good.", "lexicon": "missing"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown lexicon 'missing'"
+
+def test_malformed_lexicon(client, lexicon_dir):
+    (lexicon_dir / "broken.tsv").write_text("bullish 2.0\nbearish\n")
+    for path in ("/analyze", "/analyze/stream"):
+        response = client.post(path, json={"text": "Good.", "lexicon": "broken"})
+        assert response.status_code == 400
+        assert "broken.tsv:2" in response.json()["detail"]
+
+def test_unreadable_lexicon(main, client, lexicon_dir, monkeypatch):
+    (lexicon_dir / "locked.tsv").write_text("bullish 2.0\n")
+
+    def load_sentiment_lexicon(paths):
+        raise PermissionError(13, "Permission denied", paths[0])
+
+    monkeypatch.setattr(main, "load_sentiment_lexicon", load_sentiment_lexicon)
+    for path in ("/analyze", "/analyze/stream"):
+        response = client.post(path, json={"text": "Good.", "lexicon": "locked"})
+        assert response.status_code == 400
+        assert "Permission denied" in response.json()["detail"]
+
+def test_fixed_lexicon_loads(client, lexicon_dir):
+    path = lexicon_dir / "finance.tsv"
+    path.write_text("bullish\n")
+    assert client.post("/analyze", json={"text": "Bullish.", "use_ai": False, "lexicon": "finance"}).status_code == 400
+    path.write_text("bullish 2.0\n")
+    events = read_events(client.post("/analyze/stream", json={"text": "Bullish.", "use_ai": False, "lexicon": "finance"}))
+    assert events[0][1]["cpp_analysis"]["sentiment_score"] == 1.0
+
+def test_admin_disabled_without_token(main, client, lexicon_dir, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "")
+    for token in (None, "", "anything"):
+        headers = {"X-Admin-Token": token} if token is not None else {}
+        assert client.get("/admin/lexicons", headers=headers).status_code == 403
+
+def test_admin_endpoints(main, client, lexicon_dir, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", ADMIN_TOKEN)
+    (lexicon_dir / "finance.tsv").write_text("bullish 2.0\n")
+    assert client.get("/admin/lexicons", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    assert client.get("/admin/lexicons", headers=headers).json()["available"] == ["default", "finance"]
+
+    response = client.put("/admin/lexicons/default", json={"name": "finance"}, headers=headers)
+    assert response.status_code == 200 and response.json()["terms"] == 1
+    analysis = client.post("/analyze", json={"text": "Bullish.", "use_ai": False}).json()
+    assert analysis["cpp_analysis"]["sentiment_score"] == 1.0
+
+    (lexicon_dir / "finance.tsv").write_text("bullish two\n")
+    assert client.post("/admin/lexicons/finance/reload", headers=headers).status_code == 400
+    assert client.post("/admin/lexicons/missing/reload", headers=headers).status_code == 404
+
+def test_pickled_lexicon_compiled_once(main):
+    lexicon = main.CompiledLexicon("finance", {b"bullish": 2.0}, digest="feedface")
+    copy = pickle.loads(pickle.dumps(lexicon))
+    assert copy is not lexicon
+    # The digest is passed on rather than recomputed from the terms
+    assert (copy.name, copy.digest, copy.terms) == ("finance", "feedface", {b"bullish": 2.0})
+    assert pickle.loads(pickle.dumps(lexicon)) is copy
+    reloaded = main.CompiledLexicon("finance", {b"bullish": 3.0})
+    assert pickle.loads(pickle.dumps(reloaded)) is not copy
+
+def test_process_pool_analysis(main):
+    lexicon = main.CompiledLexicon("finance", {b"bullish": 2.0, b"bearish": -1.0})
+    texts = ["Bullish.", "Bullish, not bearish.", "Bearish! " * 1000]
+    expected = [main.run_text_analysis(text, 0, False, lexicon) for text in texts]
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        assert list(pool.map(main.run_text_analysis, texts, [0] * 3, [False] * 3, [lexicon] * 3)) == expected
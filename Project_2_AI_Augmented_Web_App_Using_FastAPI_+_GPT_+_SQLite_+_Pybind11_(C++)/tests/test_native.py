@@ -0,0 +1,91 @@
+"""SIMD levels, multi-threaded scans and file scans of the C++ module give the serial scalar results"""
+
+import os
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import make_text
+
+SIMD_LEVELS = ["scalar", "sse2", "avx2"]
+# The parallel scan needs at least 1 MB per thread
+THREADS = [2, 3, 8, 0]
+
+@pytest.fixture
+def simd_level(text_analyzer):
+    """Restores automatic SIMD selection after the test"""
+    yield
+    text_analyzer.set_simd_level("auto")
+
+@pytest.fixture(scope="module")
+def large_texts():
+    """Multi-MB texts: with sentence ends, without any, and without whitespace"""
+    rng = random.Random(11)
+    text = make_text(rng, 700000)
+    return [text, text.replace(".", " ").replace("!", " ").replace("?", " "), "x" * (3 << 20)]
+
+def without_sentences(result):
+    result = dict(result)
+    return result.pop("sentences"), result
+
+@pytest.mark.parametrize("level", SIMD_LEVELS)
+def test_forced_simd_level(text_analyzer, sentiment_mode, simd_level, random_texts, level):
+    # str offsets count characters and bytes offsets count bytes, so both are compared
+    sources = random_texts + [text.encode("utf-8") for text in random_texts]
+    text_analyzer.set_simd_level("scalar")
+    expected = [text_analyzer.analyze_text(source, 5, sentences=True) for source in sources]
+    expected_batch = text_analyzer.analyze_texts(random_texts, output="columns")
+    try:
+        text_analyzer.set_simd_level(level)
+    except ValueError:
+        pytest.skip(f"{level} is not supported by this CPU")
+    assert text_analyzer.simd_level() == level
+    for source, scalar in zip(sources, expected):
+        scalar_sentences, scalar_metrics = without_sentences(scalar)
+        sentences, metrics = without_sentences(text_analyzer.analyze_text(source, 5, sentences=True))
+        assert metrics == scalar_metrics, source[:80]
+        for name in scalar_sentences:
+            assert np.array_equal(sentences[name], scalar_sentences[name]), name
+    batch = text_analyzer.analyze_texts(random_texts, output="columns")
+    assert batch.keys() == expected_batch.keys()
+    for name in expected_batch:
+        assert np.array_equal(batch[name], expected_batch[name]), name
+
+def test_unsupported_simd_level(text_analyzer, simd_level):
+    with pytest.raises(ValueError):
+        text_analyzer.set_simd_level("sse9")
+
+@pytest.mark.parametrize("threads", THREADS)
+def test_parallel_scan(text_analyzer, sentiment_mode, large_texts, threads):
+    for text in large_texts:
+        for source in (text, text.encode("utf-8")):
+            expected_sentences, expected = without_sentences(text_analyzer.analyze_text(source, sentences=True))
+            sentences, metrics = without_sentences(text_analyzer.analyze_text(source, sentences=True, threads=threads))
+            assert metrics == expected
+            for name in expected_sentences:
+                assert np.array_equal(sentences[name], expected_sentences[name]), name
+
+def write_fifo(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+def test_files_without_a_size(text_analyzer, sentiment_mode, tmp_path):
+    # Larger than one read, so the scan spans chunks
+    data = make_text(random.Random(5), 300000).encode("utf-8")
+    expected = text_analyzer.analyze_text(data)
+    fifo = tmp_path / "pipe"
+    os.mkfifo(fifo)
+    writer = threading.Thread(target=write_fifo, args=(fifo, data))
+    writer.start()
+    assert text_analyzer.analyze_file(fifo) == expected
+    writer.join()
+
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    assert text_analyzer.analyze_file(empty) == text_analyzer.analyze_text("")
+    if os.path.exists("/proc/version"):
+        with open("/proc/version", "rb") as f:
+            assert text_analyzer.analyze_file("/proc/version") == text_analyzer.analyze_text(f.read())
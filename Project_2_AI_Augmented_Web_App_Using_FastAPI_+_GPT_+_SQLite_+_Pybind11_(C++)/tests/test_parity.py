@@ -0,0 +1,61 @@
+"""The Python fallback gives exactly the C++ module's results"""
+
+import random
+
+import numpy as np
+
+def assert_same_columns(expected, got):
+    assert expected.keys() == got.keys()
+    for name in expected:
+        assert np.array_equal(expected[name], got[name]), name
+
+def test_metrics(main, text_analyzer, sentiment_mode, random_texts):
+    for text in random_texts:
+        assert main.python_text_analysis(text) == text_analyzer.analyze_text(text), text[:80]
+
+def test_bytes(main, text_analyzer, sentiment_mode, random_texts):
+    for text in random_texts[:50]:
+        data = text.encode("utf-8")
+        assert main.python_text_analysis(data) == text_analyzer.analyze_text(data)
+    # Invalid UTF-8 is scanned byte for byte by both
+    for data in (b"good\xffbad", b"\xc3", b"caf\xc3\xa9 \xe9t\xe9!"):
+        assert main.python_text_analysis(data) == text_analyzer.analyze_text(data)
+
+def test_top_terms(main, text_analyzer, sentiment_mode, random_texts):
+    for text in random_texts:
+        for top_k in (1, 5):
+            expected = text_analyzer.analyze_text(text, top_k)
+            got = main.python_text_analysis(text, top_k)
+            for name in ("top_terms", "top_bigrams", "top_trigrams"):
+                assert [tuple(term) for term in got[name]] == [tuple(term) for term in expected[name]], name
+            assert {k: v for k, v in got.items() if not k.startswith("top_")} == \
+                {k: v for k, v in expected.items() if not k.startswith("top_")}
+
+def test_sentence_columns(main, text_analyzer, sentiment_mode, random_texts):
+    for text in random_texts:
+        expected = text_analyzer.analyze_text(text, sentences=True)
+        got = main.python_text_analysis(text, sentences=True)
+        assert_same_columns(expected.pop("sentences"), got.pop("sentences"))
+        assert got == expected
+
+def test_streaming(main, text_analyzer, sentiment_mode, random_texts):
+    rng = random.Random(7)
+    for text in random_texts[:50]:
+        data = text.encode("utf-8")
+        analyzer = main.PythonTextAnalyzer()
+        native = text_analyzer.Analyzer()
+        start = 0
+        while start < len(data):
+            # Chunks end anywhere, also inside a multi-byte character
+            end = start + rng.randint(1, 40)
+            analyzer.feed(data[start:end])
+            native.feed(data[start:end])
+            start = end
+        expected = text_analyzer.analyze_text(text)
+        assert analyzer.finalize() == expected
+        assert native.finalize() == expected
+
+def test_batch(main, text_analyzer, sentiment_mode, random_texts):
+    assert main.python_analyze_texts(random_texts) == text_analyzer.analyze_texts(random_texts)
+    expected = text_analyzer.analyze_texts(random_texts, output="columns")
+    assert_same_columns(expected, main.python_analyze_texts(random_texts, output="columns"))
@@ -0,0 +1,85 @@
+"""The events /analyze/stream sends, and their order"""
+
+import json
+import sqlite3
+
+from conftest import read_events
+
+def stream(client, **request):
+    return read_events(client.post("/analyze/stream", json=dict({"text": "This is good. It is not bad!"}, **request)))
+
+def test_event_order(main, client):
+    events = stream(client)
+    assert [event for event, _ in events] == ["metrics", "token", "token", "token", "done"]
+    metrics, done = events[0][1], events[-1][1]
+    assert metrics["cpp_analysis"]["sentence_count"] == 2
+    assert metrics["ai_provider"] == "openai"
+    # The leading whitespace of the first piece is dropped
+    assert [data["text"] for _, data in events[1:-1]] == ["Use ", "shorter ", "sentences."]
+    assert done["ai_suggestions"] == "Use shorter sentences."
+
+    conn = sqlite3.connect(main.DB_FILE)
+    row = conn.execute("SELECT text, ai_suggestions, ai_provider FROM analyses WHERE id = ?",
+                       (done["analysis_id"],)).fetchone()
+    conn.close()
+    assert row == ("This is good. It is not bad!", "Use shorter sentences.", "openai")
+
+def test_cached_result(client):
+    first = stream(client)
+    events = stream(client)
+    assert [event for event, _ in events] == ["metrics", "token", "done"]
+    assert events[1][1]["text"] == "Use shorter sentences."
+    assert events[-1][1] == first[-1][1]
+    assert events[0][1]["cpp_analysis"] == first[0][1]["cpp_analysis"]
+    assert len(client.calls) == 1
+
+def test_cached_suggestions(client):
+    stream(client)
+    # A new result cache key, but the same prompt
+    events = stream(client, top_k=2)
+    assert [event for event, _ in events] == ["metrics", "token", "done"]
+    assert events[1][1]["text"] == "Use shorter sentences."
+    assert len(client.calls) == 1
+    # bypass_cache skips the suggestion cache too
+    assert [event for event, _ in stream(client, bypass_cache=True)].count("token") == 3
+    assert len(client.calls) == 2
+
+def test_top_terms_and_sentences(client):
+    metrics = stream(client, top_k=2, include_sentences=True)[0][1]
+    assert len(metrics["top_terms"]["terms"]) == 2
+    assert len(metrics["sentences"]["start"]) == 2
+
+def test_sentences_not_stored(main, client):
+    first = stream(client, top_k=2, include_sentences=True)
+    conn = sqlite3.connect(main.DB_FILE)
+    cpp_result = json.loads(conn.execute("SELECT cpp_result FROM analyses").fetchone()[0])
+    conn.close()
+    assert "top_terms" in cpp_result and "sentences" not in cpp_result
+    assert all(entry["sentences"] is None for entry in main.analysis_cache._entries.values())
+
+    # A cache hit rescans the text for them
+    for result in (client.post("/analyze", json={"text": "This is good. It is not bad!", "top_k": 2,
+                                                  "include_sentences": True}).json(),
+                    stream(client, top_k=2, include_sentences=True)[0][1]):
+        assert result["sentences"] == first[0][1]["sentences"]
+    assert len(client.calls) == 1
+
+def test_without_ai(client):
+    events = stream(client, use_ai=False)
+    assert [event for event, _ in events] == ["metrics", "done"]
+    assert events[0][1]["ai_provider"] is None
+    assert events[-1][1]["ai_suggestions"] is None
+    assert client.calls == []
+
+def test_error_event(main, client, monkeypatch):
+    def store_analysis_result(text, result, cache_key):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(main, "store_analysis_result", store_analysis_result)
+    events = stream(client)
+    assert [event for event, _ in events] == ["metrics", "token", "token", "token", "error"]
+    assert "database is locked" in events[-1][1]["detail"]
+
+def test_unknown_lexicon(client):
+    response = client.post("/analyze/stream", json={"text": "Good.", "lexicon": "missing"})
+    assert response.status_code == 400